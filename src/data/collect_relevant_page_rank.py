@@ -3,10 +3,9 @@ import logging
 import os
 
 import click
-from elasticsearch import Elasticsearch
 from tqdm import tqdm
 
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 from src.strategy.open_book.ranking.source.source_re_ranker import extract_host
 from src.strategy.open_book.retrieval.query_by_entity import QueryByEntity
 
@@ -20,7 +19,7 @@ def collect_relevant_page_ranks(schema_org_class, step_size, level):
 
     strategy = QueryByEntity(schema_org_class)
 
-    _es = Elasticsearch([{'host': os.environ['ES_INSTANCE'], 'port': 9200}])
+    _es = get_es_client()
     entity_index_name = determine_es_index_name(schema_org_class)
     no_entities = int(_es.cat.count(entity_index_name, params={"format": "json"})[0]['count'])
     final_step = int(no_entities / step_size) + 1
@@ -35,7 +34,8 @@ def collect_relevant_page_ranks(schema_org_class, step_size, level):
             end = no_entities
 
         # Retrieve entities
-        entities = strategy.query_tables_index_by_id(range(start, end), entity_index_name)
+        entities = strategy.query_tables_index_by_id(range(start, end), entity_index_name,
+                                                     source_includes=['table'])
         if len(entities['hits']['hits']) != end - start:
             logger.warning('Did not receive all entities from {}!'.format(entity_index_name))
         start += step_size
@@ -1,16 +1,14 @@
 import json
 import logging
-import os
 
 import click
-from elasticsearch import Elasticsearch
 from tqdm import tqdm
 
 from src.data.localbusiness.load_clusters import load_clusters
 from src.model.evidence import Evidence
 from src.model.evidence_new import RetrievalEvidence
 from src.model.querytable_new import RetrievalQueryTable
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 from src.strategy.open_book.retrieval.query_by_entity import QueryByEntity
 
 
@@ -27,7 +25,7 @@ def determine_cluster_hits(records, schema_org_class):
 
 
 def determine_ooc_hits(excluded_ids, schema_org_class, table, country, all_attributes):
-    _es = Elasticsearch([{'host': os.environ['ES_INSTANCE'], 'port': 9200}])
+    _es = get_es_client()
     query_body = {
         'size': 1000,
         'query': {
@@ -1,19 +1,16 @@
 import json
 import logging
-import os
 
-from elasticsearch import Elasticsearch
 from tqdm import tqdm
 
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 
 
 def calculate_densities():
     logger = logging.getLogger()
 
     es_index = determine_es_index_name('localbusiness')
-    elastic_instance = os.environ['ES_INSTANCE']
-    _es = Elasticsearch([{'host': elastic_instance, 'port': 9200}])
+    _es = get_es_client()
 
     no_entities = int(_es.cat.count(es_index, params={"format": "json"})[0]['count'])
     step_size = 1000
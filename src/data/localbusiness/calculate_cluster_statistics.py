@@ -3,10 +3,9 @@ import logging
 import os
 
 import click
-from elasticsearch import Elasticsearch
 from tqdm import tqdm
 
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 
 @click.command()
 @click.option('--cluster_size', type=int)
@@ -14,8 +13,7 @@ def calculate_cluster_statistics(cluster_size):
     logger = logging.getLogger()
 
     es_index = determine_es_index_name('localbusiness')
-    elastic_instance = os.environ['ES_INSTANCE']
-    _es = Elasticsearch([{'host': elastic_instance, 'port': 9200}])
+    _es = get_es_client()
 
     path_to_cluster = '{}/cluster/localbusiness/telephone_geo_cluster_summary.json'.format(os.environ['DATA_DIR'])
     clusters = load_cluster(path_to_cluster)
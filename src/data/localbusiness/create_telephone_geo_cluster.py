@@ -6,20 +6,18 @@ import json
 import time
 from multiprocessing import Pool
 
-from elasticsearch import Elasticsearch
 from tqdm import tqdm
 
 from src.preprocessing.value_normalizer import parse_coordinate
 from src.similarity.coordinate import haversine
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 
 
 def calculate_telephone_geo_cluster():
     logger = logging.getLogger()
 
     es_index = determine_es_index_name('localbusiness')
-    elastic_instance = os.environ['ES_INSTANCE']
-    _es = Elasticsearch([{'host': elastic_instance, 'port': 9200}])
+    _es = get_es_client()
 
     # Load Telephone clusters/ Initialize telephone geo clusters
     cluster_summary_file_path = '{}/cluster/localbusiness/telephone_cluster_summary.json'.format(os.environ['DATA_DIR'])
@@ -257,8 +255,7 @@ def aggregate_telephone_geo_cluster(telephone_geo_cluster, id_table_assignments)
 
 def retrieve_unique_tables(ids):
     es_index = determine_es_index_name('localbusiness')
-    elastic_instance = os.environ['ES_INSTANCE']
-    _es = Elasticsearch([{'host': elastic_instance, 'port': 9200}])
+    _es = get_es_client()
 
     query_body = {
         'size': len(ids),
@@ -1,11 +1,12 @@
 import gzip
-import json
 import logging
 import os
 from collections import defaultdict
 
 from tqdm import tqdm
 
+from src.preprocessing.corpus_reader import CorpusFileReader
+
 
 def aggregate_product_clusters():
     logger = logging.getLogger()
@@ -15,9 +16,8 @@ def aggregate_product_clusters():
     path_to_lspc_table_corpus_mappings = '{}/cluster/product/lspc2020_to_tablecorpus'.format(os.environ['DATA_DIR'])
     cluster_file_path = '{}_filtered/{}'.format(path_to_lspc_table_corpus_mappings, 'filtered_product_clusters.json.gz')
     try:
-        with gzip.open(cluster_file_path, 'rb') as file:
-            for line in tqdm(file.readlines()):
-                raw_mapping = json.loads(line)
+        with CorpusFileReader(cluster_file_path) as reader:
+            for raw_mapping in tqdm(reader):
                 for record in raw_mapping['records']:
                     table_counts[record['table_id']] += 1
 
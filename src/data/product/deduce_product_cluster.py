@@ -9,6 +9,7 @@ from multiprocessing import Pool
 import click
 from tqdm import tqdm
 
+from src.preprocessing.corpus_reader import CorpusFileReader
 from src.strategy.open_book.es_helper import determine_es_index_name
 from src.strategy.open_book.retrieval.query_by_entity import QueryByEntity
 
@@ -27,9 +28,8 @@ def filter_product_clusters(worker):
     for filename in tqdm(os.listdir(path_to_lspc_table_corpus_mappings)):
         input_file_path = '{}/{}'.format(path_to_lspc_table_corpus_mappings, filename)
         try:
-            with gzip.open(input_file_path, 'rb') as file:
-                for line in file.readlines():
-                    raw_mapping = json.loads(line)
+            with CorpusFileReader(input_file_path) as reader:
+                for raw_mapping in reader:
                     clusters[raw_mapping['cluster_id']].append({'row_id': raw_mapping['row_id'], 'table_id': raw_mapping['table_id'].lower()})
 
         except gzip.BadGzipFile as e:
@@ -1,9 +1,10 @@
 import gzip
-import json
 import logging
 
 from tqdm import tqdm
 
+from src.preprocessing.corpus_reader import CorpusFileReader
+
 
 def load_clusters(path, table):
     """Load cluster
@@ -14,10 +15,9 @@ def load_clusters(path, table):
     clusters = []
 
     try:
-        with gzip.open(path, 'rb') as file:
+        with CorpusFileReader(path) as reader:
         #with open(path, 'r') as file:
-            for line in tqdm(file.readlines()):
-                cluster = json.loads(line)
+            for cluster in tqdm(reader):
                 cluster['tables'] = list(set([record['table_id'] for record in cluster['records']]))
                 if table is not None:
                     if table in cluster['tables']:
@@ -62,7 +62,8 @@ def reduce_product_clusters(worker):
             end = no_entities
 
         # Retrieve entities
-        hits = strategy.query_tables_index_by_id(range(start, end), index_name)
+        hits = strategy.query_tables_index_by_id(range(start, end), index_name,
+                                                 source_includes=['table', 'row_id'])
         for hit in hits['hits']['hits']:
             table = hit['_source']['table'].replace('product_', '').replace('_september2020.json.gz', '')
             if table[:3] in table_to_row_to_cluster:
@@ -2,9 +2,8 @@ import json
 import os
 import logging
 
-from elasticsearch import Elasticsearch
-
 from src.model.querytable import load_query_tables
+from src.strategy.open_book.es_helper import get_es_client
 
 
 def calculate_statistics():
@@ -65,8 +64,7 @@ def calculate_statistics():
 
 def retrieve_evidence_context(evidence):
     """Retrieve evidence context from ES"""
-    elastic_instance = os.environ['ES_INSTANCE']
-    _es = Elasticsearch([{'host': elastic_instance, 'port': 9200}])
+    _es = get_es_client()
     query_body = {
         'size': 1,
         'query':
@@ -27,6 +27,15 @@ def evaluate_query_table(query_table, experiment_type, retrieval_strategy, simil
     for evidence in retrieved_evidences:
         evidence.aggregate_scores_to_similarity_score()
 
+    # Rank retrieved evidences per entity once
+    retrieved_evidences_by_entity_id = {}
+    for evidence in retrieved_evidences:
+        retrieved_evidences_by_entity_id.setdefault(evidence.entity_id, []).append(evidence)
+    for entity_evidences in retrieved_evidences_by_entity_id.values():
+        entity_evidences.sort(key=lambda evidence: evidence.similarity_score, reverse=True)
+
+    evaluated_k_interval = [k for k in k_interval if not (k == 1 and voting == 'weighted')]
+
     for ranking_lvl in ranking_lvls:
         result = Result(query_table, retrieval_strategy, similarity_reranker, source_reranker, k_interval, ranking_lvl,
                         voting)
@@ -55,155 +64,90 @@ def evaluate_query_table(query_table, experiment_type, retrieval_strategy, simil
             positive_evidences = retrieval_strategy.filter_evidences_by_ground_truth_tables(query_table.verified_evidences)
             negative_evidences = []
 
+        positive_evidence_set = set(positive_evidences)
+        annotated_evidence_set = positive_evidence_set.union(negative_evidences)
+
         for row in query_table.table:
-            all_rel_retrieved_evidences = [evidence for evidence in retrieved_evidences if
-                                           evidence.entity_id == row['entityId']]
+            entity_id = row['entityId']
+            all_rel_retrieved_evidences = retrieved_evidences_by_entity_id.get(entity_id, [])
 
-            all_rel_retrieved_evidences.sort(key=lambda evidence: evidence.similarity_score, reverse=True)
+            # Positive evidences of the row - verified evidences are indexed by entity in the query table
+            positive_evidences_of_row = [evidence for evidence in query_table.get_verified_evidences(entity_id)
+                                         if evidence in positive_evidence_set]
+            # A retrieved evidence is a retrieved corner case if the first equal positive evidence is a corner case
+            corner_cases_of_row = {}
+            for evidence in positive_evidences_of_row:
+                corner_cases_of_row.setdefault(evidence, evidence.corner_case)
 
             if logger.level == logging.DEBUG:
                 logger.debug(' ')
                 logger.debug(query_table.identifier)
-                logger.debug(row['entityId'])
+                logger.debug(entity_id)
                 for evidence in all_rel_retrieved_evidences:
                     logger.debug(evidence.table)
                     logger.debug(evidence.row_id)
                     logger.debug(evidence.similarity_score)
 
             if query_table.type == 'augmentation':
-                result.target_values[row['entityId']] = row[query_table.target_attribute]
+                result.target_values[entity_id] = row[query_table.target_attribute]
+
+            if len(evaluated_k_interval) == 0:
+                continue
 
-            for k in k_interval:
-                if k == 1 and voting == 'weighted':
-                    continue
+            # Number of evaluated evidences per k - lists may be shorter than k
+            evaluated_positions = {k: min(k, len(all_rel_retrieved_evidences)) for k in evaluated_k_interval}
+            ranked_evidence_statistics = collect_ranked_evidence_statistics(
+                all_rel_retrieved_evidences[:max(evaluated_positions.values())], set(evaluated_positions.values()),
+                positive_evidence_set, annotated_evidence_set, corner_cases_of_row,
+                experiment_type == 'augmentation', voting)
 
-                rel_retrieved_evidences = all_rel_retrieved_evidences[:k]
-                no_rel_evidences = sum([1 for _ in rel_retrieved_evidences])
+            no_verified_evidences = len(positive_evidences_of_row)
+            seen_training = positive_evidences_of_row[0].seen_training if len(positive_evidences_of_row) > 0 else None
+            no_corner_cases = sum([1 for evidence in positive_evidences_of_row if evidence.corner_case])
 
-                no_verified_evidences = sum(
-                    [1 for evidence in positive_evidences if evidence.entity_id == row['entityId']])
-                no_pos_evidences = sum([1 for evidence in rel_retrieved_evidences if evidence in positive_evidences])
+            for k in evaluated_k_interval:
+                statistics = ranked_evidence_statistics[evaluated_positions[k]]
+                no_rel_evidences = evaluated_positions[k]
+                no_pos_evidences = statistics['no_pos_evidences']
 
                 # Calculate precision at k
                 precision = 0
                 if no_rel_evidences > 0:
                     precision = no_pos_evidences / no_rel_evidences
-                result.precision_per_entity[k][row['entityId']] = precision
+                result.precision_per_entity[k][entity_id] = precision
 
                 # Calculate recall at k
                 recall = 0
                 if no_verified_evidences > 0:
                     recall = no_pos_evidences / min(no_verified_evidences, k)
 
-                result.recall_per_entity[k][row['entityId']] = recall
+                result.recall_per_entity[k][entity_id] = recall
 
                 f1 = 0
                 if (precision + recall) > 0:
                     f1 = (2 * precision * recall) / (precision + recall)
-                result.f1_per_entity[k][row['entityId']] = f1
+                result.f1_per_entity[k][entity_id] = f1
 
                 # Calculate not annotated
                 no_not_annotated = 0
                 if no_rel_evidences > 0:
-                    no_not_annotated = sum([1 for evidence in rel_retrieved_evidences
-                                            if evidence not in positive_evidences
-                                            and evidence not in negative_evidences]) / no_rel_evidences
-
-                result.no_known_relevant_evidences[k][row['entityId']] = no_pos_evidences
-                result.no_verified_evidences[k][row['entityId']] = no_verified_evidences
-                result.not_annotated_per_entity[k][row['entityId']] = no_not_annotated
-
-                no_retrieved_evidences = 0
-                result_evidences = []
-                for retrieved_evidence in rel_retrieved_evidences[:k]:
-                    for verified_evidence in [evidence for evidence in positive_evidences if evidence.entity_id == row['entityId']]:
-                        if retrieved_evidence == verified_evidence:
-                            if verified_evidence.corner_case:
-                                no_retrieved_evidences += 1
-                            break
-
-                    if retrieved_evidence.context is not None:
-                        # Add evidence information to context
-                        result_evidence = retrieved_evidence.context.copy()
-                        result_evidence['similarity_score'] = retrieved_evidence.similarity_score
-                        result_evidence['relevant_evidence'] = True if retrieved_evidence in positive_evidences else False
-                        result_evidence['table'] = retrieved_evidence.table
-                        result_evidence['row_id'] = retrieved_evidence.row_id
-                        result_evidences.append(result_evidence)
-
-                found_positive_evidences = [evidence for evidence in positive_evidences
-                                              if evidence.entity_id == row['entityId']]
-                if len(found_positive_evidences) > 0:
-                    result.seen_training[k][row['entityId']] = found_positive_evidences[0].seen_training
-                else:
-                    result.seen_training[k][row['entityId']] = None
+                    no_not_annotated = statistics['no_not_annotated'] / no_rel_evidences
+
+                result.no_known_relevant_evidences[k][entity_id] = no_pos_evidences
+                result.no_verified_evidences[k][entity_id] = no_verified_evidences
+                result.not_annotated_per_entity[k][entity_id] = no_not_annotated
+                result.seen_training[k][entity_id] = seen_training
 
                 # Count number of corner cases
-                result.corner_cases[k][row['entityId']] = sum([1 for evidence in positive_evidences
-                                                               if evidence.entity_id == row['entityId']
-                                                               and evidence.corner_case])
-                result.retrieved_corner_cases[k][row['entityId']] = no_retrieved_evidences
+                result.corner_cases[k][entity_id] = no_corner_cases
+                result.retrieved_corner_cases[k][entity_id] = statistics['no_retrieved_corner_cases']
 
-                result.different_evidences[k][row['entityId']] = result_evidences
-                result.different_tables[k][row['entityId']] = \
-                    list(set([evidence.table for evidence in rel_retrieved_evidences][:k]))
+                result.different_evidences[k][entity_id] = statistics['result_evidences']
+                result.different_tables[k][entity_id] = statistics['tables']
 
                 if experiment_type == 'augmentation':
-                    values = []
-                    similarities = []
-                    sequence_scores = []
-                    dict_value_sequence_score = {}
-
-                    for evidence in rel_retrieved_evidences[:k]:
-                        # Exclude evidence value from augmentation if it is None
-                        if evidence.value is not None:
-                            if type(evidence.value) is str:
-                                value = evidence.value
-                            elif type(evidence.value) is list:
-                                value = ', '.join(evidence.value)
-                            else:
-                                value = str(evidence.value)
-
-                            values.append(value)
-                            similarities.append(evidence.similarity_score)
-                        if 'sequence_scores' in evidence.scores and evidence.scores['sequence_scores'] is not None:
-                            sequence_scores.append(evidence.scores['sequence_scores'])
-                        else:
-                            sequence_scores.append(0)
-
-                    # simple voting vs. weighted voting - To-Do: Separate fusion from evaluation!
-                    if voting == 'simple':
-                        value_counts = [(value, values.count(value)) for value in set(values)]
-                    elif voting == 'weighted':
-                        dict_value_similarity = {}
-                        
-                        total_similarity = 0
-                        initial_value_counts = { value: values.count(value) for value in set(values)}
-                        for value, similarity_score, sequence_score in zip(values, similarities, sequence_scores):
-                            if value not in dict_value_similarity:
-                                dict_value_similarity[value] = 0
-                            dict_value_similarity[value] += similarity_score
-                            total_similarity += similarity_score
-                            dict_value_sequence_score[value] = sequence_score
-
-                        # Normalize similarity scores by number of appearances
-                        dict_value_norm_similarity = {value: sim/initial_value_counts[value]
-                                                       for value, sim in dict_value_similarity.items()}
-                        if total_similarity > 0:
-                            value_counts = [(value, sim/total_similarity) for value, sim in dict_value_norm_similarity.items()]
-                        else:
-                            value_counts = [(value, 0) for value, sim in
-                                            dict_value_norm_similarity.items()]
-
-                    else:
-                        raise ValueError('Unknown voting strategy {}.'.format(voting))
-
-                    dict_value_counts = [{'value': value_count[0], 'count': value_count[1]} for value_count in value_counts]
-                    for dict_value_count in dict_value_counts:
-                        if dict_value_count['value'] in dict_value_sequence_score:
-                            dict_value_count['sequence_score'] = dict_value_sequence_score[dict_value_count['value']]
-                            continue
-                    value_counts.sort(key=lambda x: x[1], reverse=True)
+                    value_counts = statistics['value_counts']
+                    dict_value_counts = statistics['dict_value_counts']
 
                     # Calculate Accuracy
                     accuracy = 0
@@ -214,7 +158,7 @@ def evaluate_query_table(query_table, experiment_type, retrieval_strategy, simil
                             # TO-DO: Replace hack with proper approach to retrieve full coordinates!
                             target_value, predicted_value = determine_full_coordinates(value_counts[0][0],
                                                                                        query_table.target_attribute, row,
-                                                                                       rel_retrieved_evidences[:k])
+                                                                                       all_rel_retrieved_evidences[:k])
                             accuracy = calculate_accuracy(target_value, predicted_value, datatype)
 
                         else:
@@ -223,16 +167,127 @@ def evaluate_query_table(query_table, experiment_type, retrieval_strategy, simil
 
                             accuracy = calculate_accuracy(target_value, predicted_value, datatype)
 
-                    result.fusion_accuracy[k][row['entityId']] = accuracy
-                    result.different_values[k][row['entityId']] = dict_value_counts
-                    result.found_values[k][row['entityId']] = len(values)
-                    result.predicted_values[k][row['entityId']] = predicted_value
+                    result.fusion_accuracy[k][entity_id] = accuracy
+                    result.different_values[k][entity_id] = dict_value_counts
+                    result.found_values[k][entity_id] = statistics['no_values']
+                    result.predicted_values[k][entity_id] = predicted_value
 
         results.append(result)
 
     return results
 
 
+def collect_ranked_evidence_statistics(ranked_evidences, positions, positive_evidence_set, annotated_evidence_set,
+                                       corner_cases, with_values=False, voting='weighted'):
+    """Collect cumulative statistics of the ranked evidences in a single pass
+        :param positions numbers of top ranked evidences for which the statistics are returned
+        :return dict position --> statistics of the top position evidences
+    """
+    statistics = {}
+    no_pos_evidences = 0
+    no_not_annotated = 0
+    no_retrieved_corner_cases = 0
+    result_evidences = []
+    tables = {}
+    value_voting = ValueVoting(voting) if with_values else None
+
+    for position in range(len(ranked_evidences) + 1):
+        if position > 0:
+            evidence = ranked_evidences[position - 1]
+            is_positive = evidence in positive_evidence_set
+            if is_positive:
+                no_pos_evidences += 1
+                if corner_cases.get(evidence):
+                    no_retrieved_corner_cases += 1
+            if evidence not in annotated_evidence_set:
+                no_not_annotated += 1
+
+            if evidence.context is not None:
+                # Add evidence information to context
+                result_evidence = evidence.context.copy()
+                result_evidence['similarity_score'] = evidence.similarity_score
+                result_evidence['relevant_evidence'] = is_positive
+                result_evidence['table'] = evidence.table
+                result_evidence['row_id'] = evidence.row_id
+                result_evidences.append(result_evidence)
+
+            tables[evidence.table] = None
+            if value_voting is not None:
+                value_voting.add(evidence)
+
+        if position in positions:
+            position_statistics = {'no_pos_evidences': no_pos_evidences, 'no_not_annotated': no_not_annotated,
+                                   'no_retrieved_corner_cases': no_retrieved_corner_cases,
+                                   'result_evidences': result_evidences.copy(), 'tables': list(tables)}
+            if value_voting is not None:
+                position_statistics['value_counts'], position_statistics['dict_value_counts'] = \
+                    value_voting.determine_value_counts()
+                position_statistics['no_values'] = len(value_voting.values)
+            statistics[position] = position_statistics
+
+    return statistics
+
+
+class ValueVoting:
+    """Incremental voting on the values of ranked evidences - simple (value majority) or weighted (similarity scores)"""
+
+    def __init__(self, voting):
+        if voting not in ['simple', 'weighted']:
+            raise ValueError('Unknown voting strategy {}.'.format(voting))
+        self.voting = voting
+        self.values = []
+        self.sequence_scores = []
+        self.value_counts = {}
+        self.value_similarities = {}
+        self.total_similarity = 0
+        self.value_sequence_scores = {}
+
+    def add(self, evidence):
+        if 'sequence_scores' in evidence.scores and evidence.scores['sequence_scores'] is not None:
+            self.sequence_scores.append(evidence.scores['sequence_scores'])
+        else:
+            self.sequence_scores.append(0)
+
+        # Exclude evidence value from augmentation if it is None
+        if evidence.value is not None:
+            if type(evidence.value) is str:
+                value = evidence.value
+            elif type(evidence.value) is list:
+                value = ', '.join(evidence.value)
+            else:
+                value = str(evidence.value)
+
+            # Values are paired with sequence scores by position among the found values
+            sequence_score = self.sequence_scores[len(self.values)]
+            self.values.append(value)
+            self.value_counts[value] = self.value_counts.get(value, 0) + 1
+            self.value_similarities[value] = self.value_similarities.get(value, 0) + evidence.similarity_score
+            self.total_similarity += evidence.similarity_score
+            self.value_sequence_scores[value] = sequence_score
+
+    def determine_value_counts(self):
+        """:return value counts sorted by count, value counts as dicts"""
+        if self.voting == 'simple':
+            value_counts = list(self.value_counts.items())
+        else:
+            # Normalize similarity scores by number of appearances
+            value_norm_similarities = {value: similarity / self.value_counts[value]
+                                       for value, similarity in self.value_similarities.items()}
+            if self.total_similarity > 0:
+                value_counts = [(value, similarity / self.total_similarity)
+                                for value, similarity in value_norm_similarities.items()]
+            else:
+                value_counts = [(value, 0) for value in value_norm_similarities]
+
+        dict_value_counts = [{'value': value_count[0], 'count': value_count[1]} for value_count in value_counts]
+        if self.voting == 'weighted':
+            for dict_value_count in dict_value_counts:
+                dict_value_count['sequence_score'] = self.value_sequence_scores[dict_value_count['value']]
+        value_counts.sort(key=lambda x: x[1], reverse=True)
+
+        return value_counts, dict_value_counts
+
+
 def determine_full_coordinates(predicted_coordinate_part, target_attribute, row, rel_evidences):
     """Determine full coordinates"""
     complementary_attribute = {'latitude': 'longitude', 'longitude': 'latitude'}
@@ -1,4 +1,3 @@
-import gzip
 import json
 import logging
 import os
@@ -10,13 +9,13 @@ import numpy as np
 import pandas as pd
 
 import click
-from elasticsearch import Elasticsearch
 from tqdm import tqdm
 
+from src.preprocessing.corpus_reader import read_raw_entities
 from src.preprocessing.entity_extraction import extract_entity
 from src.preprocessing.language_detection import LanguageDetector
 from src.strategy.closed_book.generate_target_attribute_value import create_source_sequence2, create_natural_question
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 from src.strategy.open_book.retrieval.retrieval_strategy import RetrievalStrategy
 from src.strategy.pipeline_building import validate_configuration
 
@@ -57,22 +56,20 @@ def load_data(path_to_config, path_to_file, step_size):
     if path_to_file is not None:
         # Load entities from file
         path_to_file = '{}/{}'.format(os.environ['DATA_DIR'], path_to_file)
-        with gzip.open(path_to_file, 'rb') as file:
-            # 1. Fill index with normalized entities
-            raw_entities = [json.loads(line) for line in file.readlines()
-                            if 'name' in json.loads(line)
-                            and not ld.check_language_is_not_english(json.loads(line)['name'])]
-            entities = [extract_entity(raw_entity, schema_org_class) for raw_entity in raw_entities]
-            # To-Do: Remove duplicates (?)
-            entities = cleaning(entities, schema_org_class)
-            peristed_records, table_counter = persist_data_set_records(schema_org_class, entities, frequencies, count_record_rejected,
-                                                  attributes, generate_option, table_counter)
-            counter += peristed_records
+        # 1. Fill index with normalized entities - Lines are streamed and parsed once
+        raw_entities = [raw_entity for raw_entity in read_raw_entities(path_to_file)
+                        if 'name' in raw_entity and not ld.check_language_is_not_english(raw_entity['name'])]
+        entities = [extract_entity(raw_entity, schema_org_class) for raw_entity in raw_entities]
+        # To-Do: Remove duplicates (?)
+        entities = cleaning(entities, schema_org_class)
+        peristed_records, table_counter = persist_data_set_records(schema_org_class, entities, frequencies, count_record_rejected,
+                                              attributes, generate_option, table_counter)
+        counter += peristed_records
 
 
     else:
         strategy = RetrievalStrategy(schema_org_class, 'generate_entity')
-        _es = Elasticsearch([{'host': os.environ['ES_INSTANCE'], 'port': 9200}])
+        _es = get_es_client()
         entity_index_name = determine_es_index_name(schema_org_class)
         no_entities = int(_es.cat.count(entity_index_name, params={"format": "json"})[0]['count'])
 
@@ -4,12 +4,12 @@ import os
 
 import click
 import pandas as pd
-from elasticsearch import Elasticsearch
 from pandas import Series
 from tqdm import tqdm
 from random import randint
 
 from src.similarity.string_comparator import string_similarity
+from src.strategy.open_book.es_helper import get_es_client
 from src.strategy.open_book.retrieval.retrieval_strategy import RetrievalStrategy
 
 
@@ -20,7 +20,7 @@ def generate_training_data(schema_org_class):
 
     #seed(42)
     # Connect to Elasticsearch
-    _es = Elasticsearch([{'host': os.environ['ES_INSTANCE'], 'port': 9200}])
+    _es = get_es_client()
     _es.ping()
 
     # Load pre-training data pools
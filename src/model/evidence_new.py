@@ -1,18 +1,241 @@
+import math
+import threading
+import weakref
+from array import array
+
+from src.model.json_codec import to_camel_case
+
+
+class ScoreNameRegistry:
+    """Process-level registry of score names - Every score name is interned to a fixed position"""
+
+    def __init__(self):
+        self.positions = {}
+        self.names = []
+        self.lock = threading.Lock()
+
+    def intern(self, name):
+        position = self.positions.get(name)
+        if position is None:
+            with self.lock:
+                position = self.positions.get(name)
+                if position is None:
+                    position = len(self.names)
+                    self.names.append(name)
+                    self.positions[name] = position
+
+        return position
+
+
+score_name_registry = ScoreNameRegistry()
+
+
+class EvidenceScores:
+    """Scores of an evidence stored in a float array - Positions are given by the score name registry
+        and missing scores are NaN. The scores behave like the former scores dict."""
+
+    __slots__ = ('score_array',)
+
+    def __init__(self, scores=None):
+        self.score_array = array('d')
+        if scores is not None:
+            for name, value in scores.items():
+                self[name] = value
+
+    def position(self, name):
+        position = score_name_registry.positions.get(name)
+        if position is not None and position < len(self.score_array) and not math.isnan(self.score_array[position]):
+            return position
+        return None
+
+    def __setitem__(self, name, value):
+        if value is None:
+            # Missing scores are not stored
+            self.pop(name, None)
+            return
+
+        position = score_name_registry.intern(name)
+        if position >= len(self.score_array):
+            self.score_array.extend([math.nan] * (position + 1 - len(self.score_array)))
+        self.score_array[position] = value
+
+    def __getitem__(self, name):
+        position = self.position(name)
+        if position is None:
+            raise KeyError(name)
+        return self.score_array[position]
+
+    def __contains__(self, name):
+        return self.position(name) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return sum([1 for value in self.score_array if not math.isnan(value)])
+
+    def __eq__(self, other):
+        try:
+            return dict(self.items()) == dict(other.items())
+        except AttributeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        # Score positions are only valid within a process
+        return EvidenceScores, (dict(self.items()),)
+
+    def get(self, name, default=None):
+        position = self.position(name)
+        return self.score_array[position] if position is not None else default
+
+    def pop(self, name, *default):
+        position = self.position(name)
+        if position is None:
+            if len(default) > 0:
+                return default[0]
+            raise KeyError(name)
+
+        value = self.score_array[position]
+        self.score_array[position] = math.nan
+        return value
+
+    def items(self):
+        return [(score_name_registry.names[position], value) for position, value in enumerate(self.score_array)
+                if not math.isnan(value)]
+
+    def keys(self):
+        return [name for name, _ in self.items()]
+
+    def values(self):
+        return [value for value in self.score_array if not math.isnan(value)]
+
+    def copy(self):
+        scores_copy = EvidenceScores()
+        scores_copy.score_array = array('d', self.score_array)
+        return scores_copy
+
+
+class SharedContext(dict):
+    """Context of a document that is shared by all evidences of the document"""
+
+    __slots__ = ('__weakref__',)
+
+
+class ContextStore:
+    """Process-level store of evidence contexts by (table, row_id)
+        - Evidences of the same document hold a reference to one shared context instead of a copy.
+        - Contexts are dropped once no evidence references them."""
+
+    def __init__(self):
+        self.contexts = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+
+    def intern(self, table, row_id, context):
+        if context is None:
+            return None
+
+        key = (table, row_id)
+        with self.lock:
+            shared_context = self.contexts.get(key)
+            if shared_context is not None and (shared_context is context or shared_context == context):
+                return shared_context
+
+            if type(context) is not SharedContext:
+                context = SharedContext(context)
+            if shared_context is None:
+                # Contexts that differ from the stored context (e.g. other source attributes) are not shared
+                self.contexts[key] = context
+
+        return context
+
+    def __len__(self):
+        return len(self.contexts)
+
+
+context_store = ContextStore()
+
+
 class BaseEvidence:
 
+    __slots__ = ('identifier', '_query_table_id', '_entity_id', '_table', '_row_id', '_context', 'signal', 'scale',
+                 'corner_case', 'similarity_score', 'seen_training', '_scores', '_hash')
+
+    # Serialized attributes in the order of the json representation
+    json_attributes = ('identifier', 'query_table_id', 'entity_id', 'table', 'row_id', 'context', 'signal', 'scale',
+                       'corner_case', 'similarity_score', 'seen_training', 'scores')
+    # Camel case json keys are determined once per class
+    json_keys = tuple((attribute, to_camel_case(attribute)) for attribute in json_attributes)
+
     def __init__(self, identifier, query_table_id, entity_id, table, row_id, context):
+        self._hash = None
         self.identifier = identifier
-        self.query_table_id = query_table_id
-        self.entity_id = entity_id
-        self.table = table
-        self.row_id = row_id
+        self._query_table_id = query_table_id
+        self._entity_id = entity_id
+        self._table = table
+        self._row_id = row_id
         self.context = context
         self.signal = None
         self.scale = None
         self.corner_case = None
         self.similarity_score = None
         self.seen_training = None
-        self.scores = {}
+        self._scores = EvidenceScores()
+
+    # The hash is cached - it is reset if one of the identifying attributes changes
+    @property
+    def query_table_id(self):
+        return self._query_table_id
+
+    @query_table_id.setter
+    def query_table_id(self, query_table_id):
+        self._query_table_id = query_table_id
+        self._hash = None
+
+    @property
+    def entity_id(self):
+        return self._entity_id
+
+    @entity_id.setter
+    def entity_id(self, entity_id):
+        self._entity_id = entity_id
+        self._hash = None
+
+    @property
+    def table(self):
+        return self._table
+
+    @table.setter
+    def table(self, table):
+        self._table = table
+        self._hash = None
+
+    @property
+    def row_id(self):
+        return self._row_id
+
+    @row_id.setter
+    def row_id(self, row_id):
+        self._row_id = row_id
+        self._hash = None
+
+    @property
+    def context(self):
+        return self._context
+
+    @context.setter
+    def context(self, context):
+        self._context = context_store.intern(self._table, self._row_id, context)
+
+    @property
+    def scores(self):
+        return self._scores
+
+    @scores.setter
+    def scores(self, scores):
+        self._scores = scores.copy() if type(scores) is EvidenceScores else EvidenceScores(scores)
 
     def verify(self, signal):
         if signal is not None:
@@ -27,25 +250,28 @@ class BaseEvidence:
         encoded_evidence = {}
 
         # Camelcase encoding for keys and fill encoded evidence
-        for key in self.__dict__.keys():
-            camel_cased_key = ''.join([key_part.capitalize() for key_part in key.split('_')])
-            camel_cased_key = camel_cased_key[0].lower() + camel_cased_key[1:]
+        for key, camel_cased_key in self.json_keys:
             if camel_cased_key == 'identifier':
-                encoded_evidence['id'] = self.__dict__['identifier']
+                encoded_evidence['id'] = self.identifier
             elif camel_cased_key == 'context':
                 if with_evidence_context:
                     # Save evidence only if it is requested!
-                    encoded_evidence[camel_cased_key] = self.__dict__[key]
+                    encoded_evidence[camel_cased_key] = self.context
             elif without_score and camel_cased_key in ['scores', 'similarityScore']:
                 # Do not save similarity scores! Scores are only used at runtime.
                 continue
+            elif camel_cased_key == 'scores':
+                encoded_evidence[camel_cased_key] = dict(self.scores.items())
             else:
-                encoded_evidence[camel_cased_key] = self.__dict__[key]
+                encoded_evidence[camel_cased_key] = getattr(self, key)
 
         return encoded_evidence
 
     def __hash__(self):
-        return hash('-'.join([str(self.query_table_id), str(self.entity_id), self.table, str(self.row_id)]))
+        if self._hash is None:
+            self._hash = hash('-'.join([str(self._query_table_id), str(self._entity_id), self._table,
+                                        str(self._row_id)]))
+        return self._hash
 
     def __str__(self):
         return 'Query Table: {}, Entity Id: {}, Table: {}, Row: {}, Signal: {}' \
@@ -53,10 +279,22 @@ class BaseEvidence:
 
     def __eq__(self, other):
         try:
-            return self.__hash__() == other.__hash__()
+            return self.__hash__() == other.__hash__() \
+                and (self._table, self._row_id, self._entity_id, self._query_table_id) \
+                == (other.table, other.row_id, other.entity_id, other.query_table_id)
         except AttributeError:
             return NotImplemented
 
+    def __getstate__(self):
+        # Cached hashes of strings are only valid within a process
+        return {slot: getattr(self, slot) for cls in type(self).__mro__ for slot in getattr(cls, '__slots__', ())
+                if slot != '_hash'}
+
+    def __setstate__(self, state):
+        self._hash = None
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
     def __copy__(self):
         evidence_copy = BaseEvidence(self.identifier, self.query_table_id, self.entity_id, self.table, self.row_id,
                                      self.context)
@@ -71,7 +309,7 @@ class BaseEvidence:
     def aggregate_scores_to_similarity_score(self):
 
         # Average scores for now
-        score_values = [value for value in self.scores.values()]
+        score_values = self.scores.values()
         if len(score_values) > 0:
             self.similarity_score = sum(score_values) / len(score_values)
         else:
@@ -80,6 +318,8 @@ class BaseEvidence:
 
 class RetrievalEvidence(BaseEvidence):
 
+    __slots__ = ()
+
     def __init__(self, identifier, query_table_id, entity_id, table, row_id, context):
         super().__init__(identifier, query_table_id, entity_id, table, row_id, context)
 
@@ -93,6 +333,11 @@ class RetrievalEvidence(BaseEvidence):
 
 class AugmentationEvidence(BaseEvidence):
 
+    __slots__ = ('value', 'attribute')
+
+    json_attributes = BaseEvidence.json_attributes + ('value', 'attribute')
+    json_keys = tuple((attribute, to_camel_case(attribute)) for attribute in json_attributes)
+
     def __init__(self, identifier, query_table_id, entity_id, table, row_id, context, value, attribute):
         super().__init__(identifier, query_table_id, entity_id, table, row_id, context)
         self.value = value
@@ -104,9 +349,8 @@ class AugmentationEvidence(BaseEvidence):
                     self.signal)
 
     def __copy__(self):
-        evidence_copy = AugmentationEvidence(self.identifier, self.query_table_id, self.entity_id,
-                                             self.value, self.table, self.row_id, self.attribute,
-                                             self.context)
+        evidence_copy = AugmentationEvidence(self.identifier, self.query_table_id, self.entity_id, self.table,
+                                             self.row_id, self.context, self.value, self.attribute)
         evidence_copy.scale = self.scale
         evidence_copy.signal = self.signal
         evidence_copy.corner_case = self.corner_case
@@ -0,0 +1,130 @@
+import json
+import logging
+import math
+import os
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    # orjson is an optional dependency - the standard library is used if it is not installed
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def to_camel_case(key):
+    """Convert snake case attribute names to camel case json keys - Conversions are cached per key"""
+    camel_cased_key = ''.join([key_part.capitalize() for key_part in key.split('_')])
+    return camel_cased_key[0].lower() + camel_cased_key[1:]
+
+
+def loads(serialized_json):
+    """Deserialize a json string - NaN and Infinity are accepted like by the standard library"""
+    if orjson is not None:
+        try:
+            return orjson.loads(serialized_json)
+        except orjson.JSONDecodeError:
+            # orjson rejects NaN and Infinity - the standard library decides whether the json is invalid
+            pass
+    return json.loads(serialized_json)
+
+
+def contains_non_finite_float(value):
+    if isinstance(value, (float, np.floating)):
+        return not math.isfinite(value)
+    if isinstance(value, dict):
+        return any(contains_non_finite_float(element) for element in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(contains_non_finite_float(element) for element in value)
+    if isinstance(value, np.ndarray) and np.issubdtype(value.dtype, np.floating):
+        return not np.isfinite(value).all()
+    return False
+
+
+def convert_numpy_value(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def dumps(value, indent=False):
+    """Serialize value to a json string - Non-ASCII characters are not escaped
+        - NaN and Infinity are written as by the standard library, orjson would write them as null"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        serialized_value = orjson.dumps(value, option=option)
+        if b'null' not in serialized_value or not contains_non_finite_float(value):
+            return serialized_value.decode('utf-8')
+    return json.dumps(value, indent=2 if indent else None, ensure_ascii=False, default=convert_numpy_value)
+
+
+def load_json_file(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def save_json_file(value, path, indent=False):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(dumps(value, indent))
+
+
+def use_binary_sidecar():
+    """Binary sidecars of json files are written and read if QUERY_TABLE_BINARY_CACHE is set to true"""
+    return os.environ.get('QUERY_TABLE_BINARY_CACHE', 'false').lower() == 'true'
+
+
+def determine_path_to_binary_sidecar(path):
+    return '{}.msgpack'.format(path)
+
+
+def load_binary_sidecar(path):
+    """Load the msgpack sidecar of a json file if it is at least as recent as the json file
+        :return decoded value or None if no valid sidecar exists"""
+    path_to_sidecar = determine_path_to_binary_sidecar(path)
+    if not os.path.isfile(path_to_sidecar) or os.path.getmtime(path_to_sidecar) < os.path.getmtime(path):
+        return None
+
+    # msgpack is an optional dependency, which is only needed for binary sidecars
+    import msgpack
+
+    with open(path_to_sidecar, 'rb') as f:
+        try:
+            return msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+        except (ValueError, msgpack.ExtraData) as e:
+            logging.getLogger().warning('Not able to load binary sidecar {}: {}'.format(path_to_sidecar, e))
+            return None
+
+
+def save_binary_sidecar(value, path):
+    import msgpack
+
+    # Every writer uses its own temporary file - concurrent readers and writers never see a partial sidecar
+    path_to_sidecar = determine_path_to_binary_sidecar(path)
+    file_descriptor, path_to_tmp_sidecar = tempfile.mkstemp(dir=os.path.dirname(path_to_sidecar),
+                                                            prefix=os.path.basename(path_to_sidecar), suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, 'wb') as f:
+            f.write(msgpack.packb(value, use_bin_type=True))
+        os.replace(path_to_tmp_sidecar, path_to_sidecar)
+    except BaseException:
+        if os.path.exists(path_to_tmp_sidecar):
+            os.remove(path_to_tmp_sidecar)
+        raise
+
+
+def load_json_file_with_sidecar(path):
+    """Load a json file - If binary sidecars are enabled the msgpack sidecar is used and refreshed if necessary"""
+    if not use_binary_sidecar():
+        return load_json_file(path)
+
+    value = load_binary_sidecar(path)
+    if value is None:
+        value = load_json_file(path)
+        save_binary_sidecar(value, path)
+
+    return value
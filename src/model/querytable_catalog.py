@@ -0,0 +1,186 @@
+import logging
+import os
+import threading
+import time
+
+from src.model.json_codec import load_json_file, load_json_file_with_sidecar, save_json_file
+
+
+class QueryTableCatalog:
+    """Catalog of the query tables in DATA_DIR/querytables - Maps query table ids to paths and metadata
+        - The catalog is persisted as catalog.json next to the schema org classes.
+        - It is refreshed incrementally: only directories with a changed mtime are listed again,
+          the files of all known query tables are checked and only new or changed files are read.
+        - catalog.json is read again if another process updated it."""
+
+    def __init__(self, path_to_query_tables, refresh_interval=5):
+        self.path_to_query_tables = path_to_query_tables
+        self.path_to_catalog = '{}/catalog.json'.format(path_to_query_tables)
+        # Directory mtimes are checked at most every refresh_interval seconds
+        self.refresh_interval = refresh_interval
+        self.last_refresh = None
+        self.lock = threading.RLock()
+
+        # Directory structure: schema org class --> type --> gt table --> mtime of the gt table directory
+        self.directories = {}
+        # Relative path of the query table --> metadata of the query table
+        self.entries = {}
+        # mtime of catalog.json when it was loaded or saved by this process
+        self.catalog_mtime = None
+        self.load()
+
+    def load(self):
+        if os.path.isfile(self.path_to_catalog):
+            try:
+                catalog_mtime = os.path.getmtime(self.path_to_catalog)
+                catalog = load_json_file(self.path_to_catalog)
+                self.directories = catalog['directories']
+                self.entries = catalog['entries']
+                self.catalog_mtime = catalog_mtime
+            except (ValueError, KeyError, OSError) as e:
+                logging.getLogger().warning('Not able to load query table catalog {}: {}'.format(self.path_to_catalog, e))
+
+    def load_if_changed(self):
+        """Load catalog.json again if it was saved by another process"""
+        if os.path.isfile(self.path_to_catalog) and os.path.getmtime(self.path_to_catalog) != self.catalog_mtime:
+            self.load()
+
+    def save(self):
+        # Write to a temporary file first - other processes never see a partial catalog
+        path_to_tmp_catalog = '{}.{}.tmp'.format(self.path_to_catalog, os.getpid())
+        try:
+            save_json_file({'directories': self.directories, 'entries': self.entries}, path_to_tmp_catalog)
+            os.replace(path_to_tmp_catalog, self.path_to_catalog)
+            self.catalog_mtime = os.path.getmtime(self.path_to_catalog)
+        except OSError as e:
+            logging.getLogger().warning('Not able to save query table catalog {}: {}'.format(self.path_to_catalog, e))
+
+    def refresh(self, force=False):
+        """Update the catalog with added, changed and removed query tables
+            :param force re-check all query table files, even if their directory did not change"""
+        with self.lock:
+            if not force and self.last_refresh is not None \
+                    and time.time() - self.last_refresh < self.refresh_interval:
+                return
+
+            self.load_if_changed()
+            changed = False
+            directories = {}
+            visited_paths = set()
+            for schema_org_class in list_directories(self.path_to_query_tables):
+                if schema_org_class == 'deprecated' or 'test' in schema_org_class:
+                    continue
+                directories[schema_org_class] = {}
+                path_to_class = '{}/{}'.format(self.path_to_query_tables, schema_org_class)
+                for type in list_directories(path_to_class):
+                    directories[schema_org_class][type] = {}
+                    for gt_table in list_directories('{}/{}'.format(path_to_class, type)):
+                        if gt_table == 'deprecated':
+                            continue
+                        relative_path_to_gt_table = '{}/{}/{}'.format(schema_org_class, type, gt_table)
+                        mtime = os.path.getmtime('{}/{}'.format(self.path_to_query_tables, relative_path_to_gt_table))
+                        directories[schema_org_class][type][gt_table] = mtime
+
+                        known_mtime = self.directories.get(schema_org_class, {}).get(type, {}).get(gt_table)
+                        if not force and known_mtime == mtime:
+                            # Nothing was added or removed, but query tables may have been edited in place
+                            paths = [path for path, entry in self.entries.items()
+                                     if entry['directory'] == relative_path_to_gt_table]
+                        else:
+                            paths = ['{}/{}'.format(relative_path_to_gt_table, file_name)
+                                     for file_name in os.listdir('{}/{}'.format(self.path_to_query_tables,
+                                                                                relative_path_to_gt_table))
+                                     if file_name.endswith('.json')]
+
+                        for path in paths:
+                            if os.path.isfile('{}/{}'.format(self.path_to_query_tables, path)):
+                                visited_paths.add(path)
+                                changed = self.update_entry(path, relative_path_to_gt_table) or changed
+
+            for path in [path for path in self.entries if path not in visited_paths]:
+                del self.entries[path]
+                changed = True
+
+            changed = changed or directories != self.directories
+            self.directories = directories
+            self.last_refresh = time.time()
+            if changed:
+                self.save()
+
+    def update_entry(self, path, directory=None):
+        """Read the metadata of a query table if it is new or its file changed
+            :param path path of the query table relative to the query table directory
+            :return True if the entry was updated"""
+        absolute_path = '{}/{}'.format(self.path_to_query_tables, path)
+        mtime = os.path.getmtime(absolute_path)
+        if path in self.entries and self.entries[path]['mtime'] == mtime:
+            return False
+
+        try:
+            raw_json = load_json_file_with_sidecar(absolute_path)
+        except (ValueError, OSError) as e:
+            # The query table is invalid json - it is missing in all experiment runs
+            logging.getLogger().error('Query table {} is not added to the catalog: {}'.format(absolute_path, e))
+            return False
+
+        if directory is None:
+            directory = os.path.dirname(path)
+        schema_org_class, type, gt_table = directory.split('/')
+        with self.lock:
+            self.entries[path] = {'id': raw_json.get('id'), 'type': raw_json.get('type', type),
+                                  'schemaOrgClass': schema_org_class, 'gtTable': gt_table, 'directory': directory,
+                                  'targetAttribute': raw_json.get('targetAttribute'),
+                                  'noRows': len(raw_json.get('table', [])), 'mtime': mtime}
+        return True
+
+    def register(self, absolute_path):
+        """Update the catalog after a query table was written"""
+        with self.lock:
+            path = os.path.relpath(absolute_path, self.path_to_query_tables)
+            if len(path.split('/')) == 4 and self.update_entry(path):
+                self.save()
+
+    def get_schema_org_classes(self):
+        self.refresh()
+        return list(self.directories.keys())
+
+    def get_gt_tables(self, type, schema_org_class):
+        self.refresh()
+        return list(self.directories.get(schema_org_class, {}).get(type, {}).keys())
+
+    def get_entries(self, type=None, schema_org_class=None, gt_table=None):
+        """:return list of (absolute path, metadata) of the matching query tables"""
+        self.refresh()
+        return [('{}/{}'.format(self.path_to_query_tables, path), entry) for path, entry in self.entries.items()
+                if (type is None or entry['directory'].split('/')[1] == type)
+                and (schema_org_class is None or entry['schemaOrgClass'] == schema_org_class)
+                and (gt_table is None or entry['gtTable'] == gt_table)]
+
+    def find_query_table_path(self, type, query_table_id, schema_org_class=None):
+        """Find the path of a query table by its id - The catalog is refreshed once if the id is unknown"""
+        for force in [False, True]:
+            if force:
+                self.refresh(force=True)
+            for path, entry in self.get_entries(type, schema_org_class):
+                if str(entry['id']) == str(query_table_id) and os.path.isfile(path):
+                    return path
+
+        return None
+
+
+def list_directories(path):
+    if not os.path.isdir(path):
+        return []
+    return [entry.name for entry in os.scandir(path) if entry.is_dir()]
+
+
+query_table_catalogs = {}
+
+
+def get_query_table_catalog():
+    """Return the query table catalog of DATA_DIR - one catalog per process and data directory"""
+    path_to_query_tables = '{}/querytables'.format(os.environ['DATA_DIR'].rstrip('/'))
+    if path_to_query_tables not in query_table_catalogs:
+        query_table_catalogs[path_to_query_tables] = QueryTableCatalog(path_to_query_tables)
+
+    return query_table_catalogs[path_to_query_tables]
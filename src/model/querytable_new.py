@@ -1,10 +1,12 @@
 import copy
 import logging
-import json
 import os
 import itertools
 
 from src.model.evidence_new import RetrievalEvidence, AugmentationEvidence
+from src.model.querytable_catalog import get_query_table_catalog
+from src.model.json_codec import to_camel_case, load_json_file_with_sidecar, save_json_file, use_binary_sidecar, \
+    save_binary_sidecar
 
 
 def load_query_table(raw_json):
@@ -12,6 +14,8 @@ def load_query_table(raw_json):
     logger = logging.getLogger()
 
     verified_evidences = []
+    # Hash based lookup of already loaded evidences
+    loaded_evidences = set()
     for raw_evidence in raw_json['verifiedEvidences']:
         context = None
         if 'context' in raw_evidence:
@@ -41,9 +45,10 @@ def load_query_table(raw_json):
         if 'cornerCase' in raw_evidence:
             evidence.corner_case = raw_evidence['cornerCase']
 
-        if evidence.query_table_id == raw_json['id'] and evidence not in verified_evidences:
+        if evidence.query_table_id == raw_json['id'] and evidence not in loaded_evidences:
             verified_evidences.append(evidence)
-        elif evidence in verified_evidences:
+            loaded_evidences.add(evidence)
+        elif evidence in loaded_evidences:
             logger.warning('Evidence: {} already contained in query table {}'.format(evidence, raw_json['id']))
         else:
             logger.warning('Evidence: {} does not belong to query table {}'.format(evidence, raw_json['id']))
@@ -66,14 +71,13 @@ def load_query_table_from_file(path):
     """Load query table from provided path and return new Querytable object"""
     logger = logging.getLogger()
 
-    with open(path) as gsFile:
-        logger.info('Load query table from ' + path)
-        querytable = load_query_table(json.load(gsFile))
-        if type(querytable) is not BaseQueryTable and type(querytable) is not RetrievalQueryTable \
-                and type(querytable) is not AugmentationQueryTable:
-            print(type(querytable))
-            logger.warning('Not able to load query table from {}'.format(path))
-        return querytable
+    logger.info('Load query table from ' + path)
+    querytable = load_query_table(load_json_file_with_sidecar(path))
+    if type(querytable) is not BaseQueryTable and type(querytable) is not RetrievalQueryTable \
+            and type(querytable) is not AugmentationQueryTable:
+        print(type(querytable))
+        logger.warning('Not able to load query table from {}'.format(path))
+    return querytable
 
 
 def load_query_tables(type):
@@ -98,46 +102,26 @@ def load_query_tables_by_class(type, schema_org_class):
 def get_schema_org_classes(type):
     """Get a list of all schema org classes
         :param type string Type of query table that has to be loaded - Retrieval/ Augmentation"""
-    schema_org_classes = []
-    path_to_classes = '{}/querytables/'.format(os.environ['DATA_DIR'])
-    print(path_to_classes)
-    if os.path.isdir(path_to_classes):
-        schema_org_classes = [schema_org_class for schema_org_class in os.listdir(path_to_classes)
-                              if schema_org_class != 'deprecated' and 'test' not in schema_org_class]
-
-    return schema_org_classes
+    return get_query_table_catalog().get_schema_org_classes()
 
 
 def get_gt_tables(type, schema_org_class):
     """Get list of categories by schema org"""
-    gt_tables = []
-    path_to_gt_tables = '{}/querytables/{}/{}/'.format(os.environ['DATA_DIR'], schema_org_class, type)
-    if os.path.isdir(path_to_gt_tables):
-        gt_tables = [gt_table for gt_table in os.listdir(path_to_gt_tables) if gt_table != 'deprecated']
-
-    return gt_tables
+    return get_query_table_catalog().get_gt_tables(type, schema_org_class)
 
 
 def get_query_table_paths(type, schema_org_class, gt_table):
     """Get query table paths"""
-    query_table_files = []
-    path_to_query_tables = '{}/querytables/{}/{}/{}/'.format(os.environ['DATA_DIR'], schema_org_class, type, gt_table)
-
-    if os.path.isdir(path_to_query_tables):
-        # Filter for json files
-        query_table_files = ['{}{}'.format(path_to_query_tables, filename) for filename in os.listdir(path_to_query_tables)
-                             if '.json' in filename]
-
-    return query_table_files
+    return [path for path, _ in get_query_table_catalog().get_entries(type, schema_org_class, gt_table)]
 
 
 def get_all_query_table_paths(type):
-    query_table_paths = []
-    for schema_org_class in get_schema_org_classes(type):
-        for gt_table in get_gt_tables(type,schema_org_class):
-            query_table_paths.extend(get_query_table_paths(type, schema_org_class, gt_table))
+    return [path for path, _ in get_query_table_catalog().get_entries(type)]
+
 
-    return query_table_paths
+def find_query_table_path(type, query_table_id, schema_org_class=None):
+    """Find the path of a query table by its id"""
+    return get_query_table_catalog().find_query_table_path(type, query_table_id, schema_org_class)
 
 
 def create_context_attribute_permutations(querytable):
@@ -174,6 +158,9 @@ class BaseQueryTable:
         self.table = table
         self.verified_evidences = verified_evidences
 
+        # Lazily built per entity indexes - private attributes are not serialized
+        self._entity_index = None
+
     def __str__(self):
         return self.to_json(with_evidence_context=False)
 
@@ -181,22 +168,63 @@ class BaseQueryTable:
         encoded_evidence = {}
         # Camelcase encoding for keys and fill encoded evidence
         for key in self.__dict__.keys():
-            if key == 'identifier':
+            if key.startswith('_'):
+                continue
+            elif key == 'identifier':
                 encoded_evidence['id'] = self.__dict__['identifier']
             elif key == 'verified_evidences':
                 encoded_evidence['verifiedEvidences'] = [evidence.to_json(with_evidence_context) for evidence in
                                                          self.verified_evidences]
             else:
-                camel_cased_key = ''.join([key_part.capitalize() for key_part in key.split('_')])
-                camel_cased_key = camel_cased_key[0].lower() + camel_cased_key[1:]
-                encoded_evidence[camel_cased_key] = self.__dict__[key]
+                encoded_evidence[to_camel_case(key)] = self.__dict__[key]
 
         return encoded_evidence
 
+    def build_entity_index(self):
+        """Index rows and verified evidences by entity id"""
+        rows_by_entity_id = {}
+        for row in self.table:
+            rows_by_entity_id[row['entityId']] = row
+
+        verified_evidences_by_entity_id = {}
+        for evidence in self.verified_evidences:
+            verified_evidences_by_entity_id.setdefault(evidence.entity_id, []).append(evidence)
+
+        # The sizes detect changes of the lists, which bypass the methods of the query table
+        self._entity_index = {'rows': rows_by_entity_id, 'verified_evidences': verified_evidences_by_entity_id,
+                              'no_rows': len(self.table), 'no_verified_evidences': len(self.verified_evidences)}
+
+    def get_entity_index(self):
+        if self._entity_index is None or self._entity_index['no_rows'] != len(self.table) \
+                or self._entity_index['no_verified_evidences'] != len(self.verified_evidences):
+            self.build_entity_index()
+        return self._entity_index
+
+    def invalidate_entity_index(self):
+        self._entity_index = None
+
+    def get_row(self, entity_id):
+        return self.get_entity_index()['rows'][entity_id]
+
+    def get_verified_evidences(self, entity_id):
+        """Return the verified evidences of the entity"""
+        return self.get_entity_index()['verified_evidences'].get(entity_id, [])
+
+    def project_to_entity(self, entity_id):
+        """Return a query table that only contains the row and the verified evidences of the entity
+            - Rows and evidences are shared with this query table"""
+        query_table = copy.copy(self)
+        row = self.get_entity_index()['rows'].get(entity_id)
+        query_table.table = [row] if row is not None else []
+        query_table.verified_evidences = list(self.get_verified_evidences(entity_id))
+        query_table.context_attributes = list(self.context_attributes)
+        query_table.invalidate_entity_index()
+
+        return query_table
+
     def no_known_positive_evidences(self, entity_id):
         """Calculate number of know positive evidences"""
-        return sum([1 for evidence in self.verified_evidences
-                    if evidence.signal and evidence.entity_id == entity_id])
+        return sum([1 for evidence in self.get_verified_evidences(entity_id) if evidence.signal])
 
     def has_verified_evidences(self):
         return len(self.verified_evidences) > 0
@@ -218,28 +246,27 @@ class BaseQueryTable:
         if not os.path.isdir(path_to_query_table.replace('/{}'.format(file_name), '')):
             os.makedirs(path_to_query_table.replace('/{}'.format(file_name), ''))
 
-        # Save query table to file
-        with open(path_to_query_table, 'w', encoding='utf-8') as f:
-            json.dump(self.to_json(with_evidence_context), f, indent=2, ensure_ascii=False)
-            logger.info('Save query table {}'.format(path_to_query_table))
+        # Save query table to file - Gold standards stay indented to keep them readable
+        encoded_query_table = self.to_json(with_evidence_context)
+        save_json_file(encoded_query_table, path_to_query_table, indent=True)
+        if use_binary_sidecar():
+            save_binary_sidecar(encoded_query_table, path_to_query_table)
+        get_query_table_catalog().register(path_to_query_table)
+        logger.info('Save query table {}'.format(path_to_query_table))
 
 
     def calculate_evidence_statistics_of_row(self, entity_id):
         """Export Query Table Statistics per entity"""
-        row = [row for row in self.table if row['entityId'] == entity_id].pop()
+        row = self.get_row(entity_id)
 
-        evidences = sum([1 for evidence in self.verified_evidences
-                         if evidence.entity_id == row['entityId']])
-        correct_value_entity = sum([1 for evidence in self.verified_evidences
-                                    if evidence.entity_id == row['entityId'] and evidence.scale == 3])
-        rel_value_entity = sum([1 for evidence in self.verified_evidences
-                                if evidence.entity_id == row['entityId'] and evidence.scale == 2])
-        correct_entity = sum([1 for evidence in self.verified_evidences
-                              if evidence.entity_id == row['entityId'] and evidence.scale == 1])
-        not_correct_entity = sum([1 for evidence in self.verified_evidences
-                                  if evidence.entity_id == row['entityId'] and evidence.scale == 0])
+        # Scales may change after indexing, hence they are counted per call
+        scale_counts = {3: 0, 2: 0, 1: 0, 0: 0}
+        verified_evidences = self.get_verified_evidences(row['entityId'])
+        for evidence in verified_evidences:
+            if evidence.scale in scale_counts:
+                scale_counts[evidence.scale] += 1
 
-        return evidences, correct_value_entity, rel_value_entity, correct_entity, not_correct_entity
+        return len(verified_evidences), scale_counts[3], scale_counts[2], scale_counts[1], scale_counts[0]
 
     def remove_context_attribute(self, attribute):
         """Remove specified context attribute"""
@@ -259,6 +286,7 @@ class BaseQueryTable:
                                                                                       self.gt_table))
 
             self.context_attributes.remove(attribute)
+            self.invalidate_entity_index()
             logger.debug('Removed context attribute {} from querytable {}!'.format(attribute, self.identifier))
 
     def add_verified_evidence(self, evidence):
@@ -267,6 +295,7 @@ class BaseQueryTable:
             logger.warning('Evidence {} does not belong to query table {}!'.format(evidence.identifier, self.identifier))
         else:
             self.verified_evidences.append(evidence)
+            self.invalidate_entity_index()
 
     def normalize_query_table_numbering(self):
         # Change numbering of entities in query table
@@ -298,6 +327,8 @@ class BaseQueryTable:
                 evidence.identifier = i
             i += 1
 
+        self.invalidate_entity_index()
+
     def append(self, query_table):
         """
             Append rows and evidences to query table -  Not implemented for Base Query Table
@@ -345,6 +376,8 @@ class RetrievalQueryTable(BaseQueryTable):
                 new_evidence.corner_case = evidence.corner_case
                 self.verified_evidences.append(new_evidence)
 
+        self.invalidate_entity_index()
+
 
 class AugmentationQueryTable(BaseQueryTable):
 
@@ -394,3 +427,5 @@ class AugmentationQueryTable(BaseQueryTable):
                 new_evidence.signal = evidence.signal
                 new_evidence.corner_case = evidence.corner_case
                 self.verified_evidences.append(new_evidence)
+
+        self.invalidate_entity_index()
@@ -1,5 +1,4 @@
-import json
-import os
+from src.model.result_sink import JsonLinesResultSink, determine_path_to_results
 
 
 class Result:
@@ -54,17 +53,10 @@ class Result:
             self.predicted_values[k] = {}
 
     def save_result(self, file_name, with_evidences=False):
-        path_to_results = 'result/{}'.format(self.querytable.schema_org_class)
-        if not os.path.isdir(path_to_results):
-            os.makedirs(path_to_results)
-
-        path_to_results = '{}/{}'.format(path_to_results, file_name)
-
-        with open(path_to_results, 'a+', encoding='utf-8') as f:
-            unpacked_results = self.unpack(with_evidences)
-            for unpacked_result in unpacked_results:
-                json.dump(unpacked_result, f)
-                f.write('\n')
+        """Append result to the results file - Use a ResultSink to save many results"""
+        path_to_results = determine_path_to_results(self.querytable.schema_org_class, file_name)
+        with JsonLinesResultSink(path_to_results) as result_sink:
+            result_sink.write_result(self, with_evidences)
 
     def unpack(self, with_evidences=False):
         results = []
@@ -0,0 +1,230 @@
+import gzip
+import io
+import json
+import logging
+import numbers
+import os
+import pickle
+import time
+
+from src.model.json_codec import dumps
+
+
+def determine_path_to_results(schema_org_class, file_name):
+    path_to_results = 'result/{}'.format(schema_org_class)
+    if not os.path.isdir(path_to_results):
+        os.makedirs(path_to_results)
+
+    return '{}/{}'.format(path_to_results, file_name)
+
+
+class ResultSink:
+    """Destination of result rows - Keeps one handle open for the whole run"""
+
+    def __init__(self, path_to_results, flush_interval=30):
+        self.path_to_results = path_to_results
+        # Flush buffered rows at most every flush_interval seconds
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+        self.no_rows = 0
+
+    def write_result(self, result, with_evidences=False):
+        self.write_rows(result.unpack(with_evidences))
+
+    def write_rows(self, rows):
+        self.append_rows(rows)
+        self.no_rows += len(rows)
+
+        if time.time() - self.last_flush > self.flush_interval:
+            self.flush()
+
+    def append_rows(self, rows):
+        logger = logging.getLogger()
+        logger.warning('Method not implemented!')
+
+        raise NotImplementedError('Method not implemented!')
+
+    def flush(self):
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        logging.getLogger().info('Saved {} result rows to {}'.format(self.no_rows, self.path_to_results))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JsonLinesResultSink(ResultSink):
+    """Write result rows as json lines - optionally gzip or zstd compressed"""
+
+    def __init__(self, path_to_results, compression=None, flush_interval=30):
+        super().__init__(path_to_results, flush_interval)
+        self.compression = compression
+
+        if compression is None:
+            self.file = open(path_to_results, 'a', encoding='utf-8', buffering=1024 * 1024)
+            self.raw_file = None
+        elif compression == 'gzip':
+            # Appending to gzip files adds a new member, which is transparent to readers
+            self.raw_file = gzip.open(path_to_results, 'ab')
+            self.file = io.TextIOWrapper(io.BufferedWriter(self.raw_file, buffer_size=1024 * 1024), encoding='utf-8')
+        elif compression == 'zstd':
+            # zstandard is an optional dependency, which is only needed for zstd compressed results
+            import zstandard
+
+            self.raw_file = zstandard.open(path_to_results, 'ab')
+            self.file = io.TextIOWrapper(io.BufferedWriter(self.raw_file, buffer_size=1024 * 1024), encoding='utf-8')
+        else:
+            raise ValueError('Compression {} is unknown!'.format(compression))
+
+    def append_rows(self, rows):
+        self.file.write(''.join(['{}\n'.format(dumps(row)) for row in rows]))
+
+    def flush(self):
+        self.file.flush()
+        super().flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+def prepare_parquet_value(value):
+    """Nested values are stored as json strings"""
+    if type(value) in [list, dict, set]:
+        return json.dumps(value if type(value) is not set else list(value))
+    return value
+
+
+def determine_parquet_type(value):
+    """:return 'bool', 'int', 'float', 'string' or None for missing values"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or type(value).__name__ == 'bool_':
+        return 'bool'
+    if isinstance(value, numbers.Integral):
+        return 'int'
+    if isinstance(value, numbers.Real):
+        return 'float'
+    return 'string'
+
+
+def unify_parquet_types(first_type, second_type):
+    """Widen the type of a column - integers and floats become floats, all other mixtures become strings"""
+    if first_type is None or first_type == second_type:
+        return second_type
+    if second_type is None:
+        return first_type
+    if {first_type, second_type} == {'int', 'float'}:
+        return 'float'
+    return 'string'
+
+
+def convert_parquet_value(value, parquet_type):
+    if value is None:
+        return None
+    if parquet_type == 'float':
+        return float(value)
+    if parquet_type == 'string' and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+class ParquetResultSink(ResultSink):
+    """Write result rows to a columnar parquet file - Rows are written in row groups of row_group_size rows
+        - Parquet files have a single schema. Rows are spilled to a temporary file and the union schema of all
+          rows is determined while they are collected. The parquet file is written on close."""
+
+    def __init__(self, path_to_results, row_group_size=100000, flush_interval=30):
+        super().__init__(path_to_results, flush_interval)
+        self.row_group_size = row_group_size
+        self.buffered_rows = []
+        # Column name --> parquet type in the order of appearance
+        self.column_types = {}
+        self.path_to_spilled_rows = '{}.rows.tmp'.format(path_to_results)
+        self.spilled_rows_file = open(self.path_to_spilled_rows, 'wb')
+
+    def append_rows(self, rows):
+        for row in rows:
+            prepared_row = {key: prepare_parquet_value(value) for key, value in row.items()}
+            for key, value in prepared_row.items():
+                self.column_types[key] = unify_parquet_types(self.column_types.get(key),
+                                                             determine_parquet_type(value))
+            self.buffered_rows.append(prepared_row)
+
+        if len(self.buffered_rows) >= self.row_group_size:
+            self.spill_rows()
+
+    def spill_rows(self):
+        if len(self.buffered_rows) > 0:
+            pickle.dump(self.buffered_rows, self.spilled_rows_file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.buffered_rows = []
+
+    def flush(self):
+        self.spill_rows()
+        self.spilled_rows_file.flush()
+        super().flush()
+
+    def load_spilled_rows(self):
+        with open(self.path_to_spilled_rows, 'rb') as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    break
+
+    def write_parquet_file(self):
+        # pyarrow is an optional dependency, which is only needed for parquet results
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrow_types = {'bool': pa.bool_(), 'int': pa.int64(), 'float': pa.float64(), 'string': pa.string(),
+                       None: pa.string()}
+        schema = pa.schema([pa.field(column, arrow_types[parquet_type])
+                            for column, parquet_type in self.column_types.items()])
+
+        def write_row_group(rows):
+            # Rows without a column (e.g. retrieval vs. augmentation results) receive null values
+            columns = {column: [convert_parquet_value(row.get(column), parquet_type) for row in rows]
+                       for column, parquet_type in self.column_types.items()}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+        with pq.ParquetWriter(self.path_to_results, schema, compression='zstd') as writer:
+            # Keep row groups large - spilled chunks are regrouped to row_group_size rows
+            row_group = []
+            for rows in self.load_spilled_rows():
+                row_group.extend(rows)
+                if len(row_group) >= self.row_group_size:
+                    write_row_group(row_group)
+                    row_group = []
+            if len(row_group) > 0:
+                write_row_group(row_group)
+
+    def close(self):
+        super().close()
+        self.spilled_rows_file.close()
+        if self.no_rows > 0:
+            self.write_parquet_file()
+        os.remove(self.path_to_spilled_rows)
+
+
+def select_result_sink(schema_org_class, file_name, result_format='jsonl', compression=None):
+    """Open a result sink for the results of a run
+        :param result_format 'jsonl' or 'parquet'
+        :param compression None, 'gzip' or 'zstd' for jsonl results
+    """
+    if result_format == 'jsonl':
+        if compression == 'gzip':
+            file_name = '{}.gz'.format(file_name)
+        elif compression == 'zstd':
+            file_name = '{}.zst'.format(file_name)
+        return JsonLinesResultSink(determine_path_to_results(schema_org_class, file_name), compression)
+    elif result_format == 'parquet':
+        file_name = '{}.parquet'.format(os.path.splitext(file_name)[0])
+        return ParquetResultSink(determine_path_to_results(schema_org_class, file_name))
+    else:
+        raise ValueError('Result format {} is unknown!'.format(result_format))
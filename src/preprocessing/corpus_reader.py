@@ -0,0 +1,126 @@
+import gzip
+import importlib.util
+import io
+import logging
+import os
+import shutil
+import subprocess
+import time
+
+from src.model.json_codec import loads
+
+BUFFER_SIZE = 1024 * 1024
+
+
+class PigzFile:
+    """Decompress a gzip file with a pigz subprocess - pigz decompresses in a separate process"""
+
+    def __init__(self, path):
+        self.path = path
+        self.process = subprocess.Popen(['pigz', '-dc', path], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        bufsize=BUFFER_SIZE)
+
+    def __iter__(self):
+        return iter(self.process.stdout)
+
+    def close(self):
+        self.process.stdout.close()
+        error = self.process.stderr.read()
+        self.process.stderr.close()
+        # Lines are read to the end before the file is closed - a negative return code means pigz was killed
+        if self.process.wait() > 0:
+            raise gzip.BadGzipFile('pigz could not decompress {}: {}'.format(self.path, error.decode('utf-8')))
+
+
+def determine_gzip_backend(backend=None):
+    """Determine the gzip backend - 'isal' (python-isal), 'pigz' (subprocess) or 'gzip' (standard library)
+        - Without a backend CORPUS_GZIP_BACKEND or the fastest available backend is used"""
+    if backend is None:
+        backend = os.environ.get('CORPUS_GZIP_BACKEND')
+
+    if backend is None:
+        if importlib.util.find_spec('isal') is not None:
+            backend = 'isal'
+        elif shutil.which('pigz') is not None:
+            backend = 'pigz'
+        else:
+            backend = 'gzip'
+
+    if backend not in ['isal', 'pigz', 'gzip']:
+        raise ValueError('Gzip backend {} is unknown!'.format(backend))
+
+    return backend
+
+
+def open_gzip_file(path, backend=None):
+    """Open a gzip file for streaming binary reads"""
+    backend = determine_gzip_backend(backend)
+    if backend == 'isal':
+        # isal is an optional dependency
+        from isal import igzip
+
+        return io.BufferedReader(igzip.open(path, 'rb'), buffer_size=BUFFER_SIZE)
+    elif backend == 'pigz':
+        return PigzFile(path)
+
+    return io.BufferedReader(gzip.open(path, 'rb'), buffer_size=BUFFER_SIZE)
+
+
+class CorpusFileReader:
+    """Stream the raw entities of a gzipped json lines file - Every line is parsed exactly once
+        - Lines are read incrementally, the file is never materialized in memory.
+        - Lines that are no valid json are skipped, counted in the statistics and reported per file."""
+
+    def __init__(self, path, backend=None):
+        self.path = path
+        self.backend = determine_gzip_backend(backend)
+        self.file = None
+        self.statistics = {'lines': 0, 'entities': 0, 'invalid_lines': 0, 'bytes': 0, 'seconds': 0}
+
+    def __enter__(self):
+        self.file = open_gzip_file(self.path, self.backend)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        if self.file is None:
+            self.file = open_gzip_file(self.path, self.backend)
+
+        logger = logging.getLogger()
+        start_time = time.time()
+        for line in self.file:
+            self.statistics['lines'] += 1
+            self.statistics['bytes'] += len(line)
+            if len(line.strip()) == 0:
+                continue
+
+            try:
+                # NaN and Infinity are decoded like by json.loads - only invalid json is skipped
+                raw_entity = loads(line)
+            except ValueError as e:
+                logger.debug('Invalid line {} in {}: {}'.format(self.statistics['lines'], self.path, e))
+                self.statistics['invalid_lines'] += 1
+                continue
+
+            self.statistics['entities'] += 1
+            yield raw_entity
+
+        self.statistics['seconds'] = time.time() - start_time
+        if self.statistics['invalid_lines'] > 0:
+            logger.warning('Skipped {} invalid lines of {} lines in {}'.format(self.statistics['invalid_lines'],
+                                                                             self.statistics['lines'], self.path))
+
+    def close(self):
+        if self.file is not None:
+            file = self.file
+            self.file = None
+            file.close()
+
+
+def read_raw_entities(path, backend=None):
+    """Iterate over the raw entities of a gzipped json lines file"""
+    with CorpusFileReader(path, backend) as reader:
+        for raw_entity in reader:
+            yield raw_entity
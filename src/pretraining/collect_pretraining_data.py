@@ -1,17 +1,15 @@
-import gzip
-import json
 import logging
 import os
 import random
 
 import click
-from elasticsearch import Elasticsearch
 from tqdm import tqdm
 
+from src.preprocessing.corpus_reader import read_raw_entities
 from src.preprocessing.entity_extraction import extract_entity
 from src.preprocessing.language_detection import LanguageDetector
 from src.strategy.open_book.entity_serialization import EntitySerializer
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 from src.strategy.open_book.retrieval.retrieval_strategy import RetrievalStrategy
 
 
@@ -33,21 +31,28 @@ def collect_pretraining_data(schema_org_class, path_to_file, step_size):
     if path_to_file is not None:
         # Load entities from file
         path_to_file = '{}/{}'.format(os.environ['DATA_DIR'], path_to_file)
-        with gzip.open(path_to_file, 'rb') as file:
-            # 1. Fill index with normalized entities
-            raw_entities = [json.loads(line) for line in file.readlines()
-                            if 'name' in json.loads(line)
-                            and not ld.check_language_is_not_english(json.loads(line)['name'])]
-            entities = [extract_entity(raw_entity, schema_org_class) for raw_entity in raw_entities]
-            # To-Do: Remove duplicates (?)
-            encoded_entities = [entity_encoder.convert_to_str_representation(entity) for entity in entities]
+        # 1. Fill index with normalized entities - Lines are streamed and parsed once
+        #    Only step_size encoded entities are kept in memory at once
+        encoded_entities = []
+        for raw_entity in read_raw_entities(path_to_file):
+            if 'name' in raw_entity and not ld.check_language_is_not_english(raw_entity['name']):
+                entity = extract_entity(raw_entity, schema_org_class)
+                # To-Do: Remove duplicates (?)
+                encoded_entities.append(entity_encoder.convert_to_str_representation(entity))
+
+            if len(encoded_entities) >= step_size:
+                append_pre_training_data(schema_org_class, encoded_entities)
+                counter += len(encoded_entities)
+                encoded_entities = []
+
+        if len(encoded_entities) > 0:
             append_pre_training_data(schema_org_class, encoded_entities)
             counter += len(encoded_entities)
 
 
     else:
         strategy = RetrievalStrategy(schema_org_class)
-        _es = Elasticsearch([{'host': os.environ['ES_INSTANCE'], 'port': 9200}])
+        _es = get_es_client()
         entity_index_name = determine_es_index_name(schema_org_class)
         no_entities = int(_es.cat.count(entity_index_name, params={"format": "json"})[0]['count'])
 
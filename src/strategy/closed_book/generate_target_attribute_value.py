@@ -6,6 +6,7 @@ import math
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 
 from src.model.evidence import Evidence
+from src.strategy.model_registry import load_shared_model
 from src.strategy.open_book.retrieval.retrieval_strategy import RetrievalStrategy
 
 
@@ -74,26 +75,34 @@ def get_question_type(attribute):
 
 class TargetAttributeValueGenerator(RetrievalStrategy):
 
-    def __init__(self, schema_org_class, model_name, training_data_type='origin'):
+    def __init__(self, schema_org_class, model_name, training_data_type='origin', batch_size=16, max_new_tokens=None):
         super().__init__(schema_org_class, 'generate_entity')
 
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         #self.device = 'cpu'
         self.model_name = model_name
         model_path = '{}/models/closed_book/{}'.format(os.environ['DATA_DIR'], model_name)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_path).to(self.device)
+        self.tokenizer = load_shared_model(('tokenizer', model_path),
+                                           lambda: AutoTokenizer.from_pretrained(model_path), self)
+        self.model = load_shared_model(('seq2seq_model', model_path, str(self.device)),
+                                       lambda: AutoModelForSeq2SeqLM.from_pretrained(model_path).to(self.device), self)
         self.training_data_type = training_data_type
 
+        # Number of rows that are generated at once & maximal length of generated values
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.num_return_sequences = 5
+
     # Sequence generator
     def retrieve_evidence(self, query_table, evidence_count, entity_id):
         logger = logging.getLogger()
         evidence_id = 1
         evidences = []
 
-        # Iterate through query table and create entity embeddings (neural representations)
+        # Create source sequences for all rows of the query table
+        rows = []
+        sources = []
         for row in query_table.table:
-            source = ''
             if self.training_data_type == 'origin' or self.training_data_type == 'descriptive':
                 source = create_source_sequence2(row, query_table.target_attribute, query_table.context_attributes)
                 #print(self.tokenizer.tokenize(source))
@@ -103,23 +112,39 @@ class TargetAttributeValueGenerator(RetrievalStrategy):
                 logger.warning('Training data type is not defined')
                 continue
 
-            input_ids = self.tokenizer(source, return_tensors='pt').input_ids.to(self.device)
-            outputs = self.model.generate(input_ids, return_dict_in_generate=True, output_scores=True, 
-                num_return_sequences=5, num_beams=5) # evidence_count can be used here for beam search params?
-
-            for i in range(len(outputs['sequences'])):
-                sequence = outputs['sequences'][i]
-                sequences_scores = outputs['sequences_scores'][i]
-                decoded_value = self.tokenizer.decode(sequence, skip_special_tokens=True)
-
-                if self.training_data_type == 'origin' or self.training_data_type == 'descriptive':
-                    decoded_value = decoded_value.replace('[VAL]', '')
-
-                evidence = Evidence(evidence_id, query_table.identifier, row['entityId'], decoded_value,
-                            None, None, query_table.target_attribute, None)
-                evidence.set_scores('sequence_scores', math.exp(sequences_scores))
-                evidences.append(evidence)
-            evidence_id += 1
+            rows.append(row)
+            sources.append(source)
+
+        generation_parameters = {'return_dict_in_generate': True, 'output_scores': True,
+                                 'num_return_sequences': self.num_return_sequences,
+                                 'num_beams': self.num_return_sequences}
+        if self.max_new_tokens is not None:
+            generation_parameters['max_new_tokens'] = self.max_new_tokens
+
+        # Generate values for padded batches of rows
+        for start in range(0, len(sources), self.batch_size):
+            batch_rows = rows[start:start + self.batch_size]
+            inputs = self.tokenizer(sources[start:start + self.batch_size], return_tensors='pt',
+                                    padding=True).to(self.device)
+            with torch.no_grad():
+                outputs = self.model.generate(input_ids=inputs.input_ids, attention_mask=inputs.attention_mask,
+                                              **generation_parameters)
+
+            # Generated sequences are grouped by row - num_return_sequences sequences per row
+            for row_index, row in enumerate(batch_rows):
+                for i in range(row_index * self.num_return_sequences, (row_index + 1) * self.num_return_sequences):
+                    sequence = outputs['sequences'][i]
+                    sequences_scores = outputs['sequences_scores'][i]
+                    decoded_value = self.tokenizer.decode(sequence, skip_special_tokens=True)
+
+                    if self.training_data_type == 'origin' or self.training_data_type == 'descriptive':
+                        decoded_value = decoded_value.replace('[VAL]', '')
+
+                    evidence = Evidence(evidence_id, query_table.identifier, row['entityId'], decoded_value,
+                                None, None, query_table.target_attribute, None)
+                    evidence.set_scores('sequence_scores', math.exp(sequences_scores))
+                    evidences.append(evidence)
+                evidence_id += 1
 
         return evidences
 
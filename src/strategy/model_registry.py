@@ -0,0 +1,87 @@
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class ModelRegistry:
+    """Process-level registry of loaded models, tokenizers and indices
+        - Components that use the same model (same path, device, ...) share one loaded instance.
+        - Every owner holds a reference to its models. Models without references stay resident
+          until more than max_resident_models are loaded, then the least recently used ones are dropped.
+        - Models are loaded outside of the registry lock - only acquires of the same key wait for a load."""
+
+    def __init__(self, max_resident_models=8):
+        self.max_resident_models = max_resident_models
+        self.models = OrderedDict()
+        self.reference_counts = {}
+        # Key --> lock that is held while the model of the key is loaded
+        self.loading_locks = {}
+        self.lock = threading.RLock()
+
+    def acquire(self, key, load_function, owner):
+        """Return the model of the key - The model is loaded with load_function if it is not resident
+            :param key hashable identifier of the model, e.g. (model type, model path, device)
+            :param owner object that uses the model - the reference is released when the owner is garbage collected
+        """
+        logger = logging.getLogger()
+        with self.lock:
+            loading_lock = self.loading_locks.setdefault(key, threading.Lock())
+
+        with loading_lock:
+            with self.lock:
+                resident = key in self.models
+                if resident:
+                    logger.debug('Reuse resident model {}'.format(key))
+                    self.models.move_to_end(key)
+                    self.reference_counts[key] += 1
+                    model = self.models[key]
+
+            if not resident:
+                logger.info('Load model {}'.format(key))
+                model = load_function()
+                with self.lock:
+                    self.models[key] = model
+                    self.reference_counts[key] = 1
+                    self.evict()
+
+        weakref.finalize(owner, self.release, key)
+
+        return model
+
+    def release(self, key):
+        with self.lock:
+            if key in self.reference_counts and self.reference_counts[key] > 0:
+                self.reference_counts[key] -= 1
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used models without references until the registry is within its bound"""
+        with self.lock:
+            unreferenced_keys = [key for key in self.models if self.reference_counts[key] == 0]
+            while len(self.models) > self.max_resident_models and len(unreferenced_keys) > 0:
+                key = unreferenced_keys.pop(0)
+                del self.models[key]
+                del self.reference_counts[key]
+                logging.getLogger().info('Evicted model {}'.format(key))
+
+    def clear(self):
+        with self.lock:
+            self.models.clear()
+            self.reference_counts.clear()
+            self.loading_locks.clear()
+
+    def __contains__(self, key):
+        return key in self.models
+
+    def __len__(self):
+        return len(self.models)
+
+
+model_registry = ModelRegistry(int(os.environ.get('MAX_RESIDENT_MODELS', 8)))
+
+
+def load_shared_model(key, load_function, owner):
+    """Load model through the process-level model registry"""
+    return model_registry.acquire(key, load_function, owner)
@@ -1,11 +1,89 @@
-import gzip
+import asyncio
+import atexit
 import json
 import logging
+import os
+import threading
+import weakref
 
-from elasticsearch import helpers
+from elasticsearch import Elasticsearch, helpers
 
+from src.preprocessing.corpus_reader import CorpusFileReader
 from src.preprocessing.value_normalizer import normalize_value, get_datatype
 
+# Clients are shared per process
+es_clients = {}
+# Asynchronous clients are bound to the event loop they were created in - one client per process and event loop.
+# The loops are weakly referenced, a client is never handed out to another loop that reuses the id of a closed loop.
+async_es_clients = weakref.WeakKeyDictionary()
+# Event loop of every thread for run_async
+event_loops = threading.local()
+
+
+def determine_es_hosts():
+    """ES_INSTANCE may contain a comma separated list of nodes"""
+    return [{'host': host.strip(), 'port': 9200} for host in os.environ['ES_INSTANCE'].split(',')]
+
+
+def determine_es_client_configuration():
+    # Keep-alive connections per node - should be at least the number of concurrent requests
+    return {'maxsize': int(os.environ.get('ES_MAX_CONNECTIONS', 25)), 'timeout': 60, 'max_retries': 3,
+            'retry_on_timeout': True}
+
+
+def get_es_client():
+    """Return the shared Elasticsearch client of this process"""
+    key = os.getpid()
+    if key not in es_clients:
+        logging.getLogger().info('Connect to Elasticsearch {}'.format(os.environ['ES_INSTANCE']))
+        es_clients[key] = Elasticsearch(determine_es_hosts(), **determine_es_client_configuration())
+    return es_clients[key]
+
+
+def get_async_es_client():
+    """Return the shared AsyncElasticsearch client of this process and the running event loop"""
+    # The asynchronous client needs aiohttp, which is an optional dependency (elasticsearch[async])
+    from elasticsearch import AsyncElasticsearch
+
+    loop = asyncio.get_running_loop()
+    pid, client = async_es_clients.get(loop, (None, None))
+    if pid != os.getpid():
+        logging.getLogger().info('Connect asynchronously to Elasticsearch {}'.format(os.environ['ES_INSTANCE']))
+        client = AsyncElasticsearch(determine_es_hosts(), **determine_es_client_configuration())
+        async_es_clients[loop] = (os.getpid(), client)
+    return client
+
+
+async def close_async_es_client():
+    """Close the AsyncElasticsearch client of the running event loop - Await it before the loop is closed"""
+    pid, client = async_es_clients.pop(asyncio.get_running_loop(), (None, None))
+    if pid == os.getpid():
+        await client.close()
+
+
+def use_async_retrieval():
+    """Evidences are retrieved with asynchronous ES requests if ES_ASYNC_RETRIEVAL is set to true"""
+    return os.environ.get('ES_ASYNC_RETRIEVAL', 'false').lower() == 'true'
+
+
+def run_async(coroutine):
+    """Run a coroutine on the event loop of the current thread
+        - The loop stays open between calls, hence its AsyncElasticsearch client and connections are reused
+        - The loop and its client are closed when the process exits"""
+    if getattr(event_loops, 'pid', None) != os.getpid():
+        # Loops of the parent process are not used after a fork
+        event_loops.loop = asyncio.new_event_loop()
+        event_loops.pid = os.getpid()
+    return event_loops.loop.run_until_complete(coroutine)
+
+
+@atexit.register
+def close_event_loop():
+    """Close the event loop of run_async and its AsyncElasticsearch client"""
+    if getattr(event_loops, 'pid', None) == os.getpid() and not event_loops.loop.is_closed():
+        event_loops.loop.run_until_complete(close_async_es_client())
+        event_loops.loop.close()
+
 
 def determine_es_index_name(schema_org_class, table=False, tokenizer=None, clusters=False):
     if table:
@@ -30,12 +108,10 @@ def index_table(path_to_table_corpus, schema_org_class, table_file_name, table_i
     # Index table
     file_path = '{}{}/{}'.format(path_to_table_corpus, schema_org_class, table_file_name)
     actions = []
-    with gzip.open(file_path, 'rb') as file:
+    with CorpusFileReader(file_path) as reader:
         entity_index_number = 0
-        for line in file.readlines():
+        for raw_entity in reader:
             entity_index_number += 1
-            # Extract entity
-            raw_entity = json.loads(line)
 
             if 'name' in raw_entity:
                 entity = {'table': table_index_name, 'row_id': raw_entity['row_id'],
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+
+
+def determine_entity_hash(entity, excluded_attributes=('description',)):
+    """Canonical hash of a normalized entity - Entities with the same values (in any order) share the hash"""
+    canonical_entity = json.dumps({key: value for key, value in entity.items() if key not in excluded_attributes},
+                                  sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(canonical_entity.encode('utf-8'), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Fixed size set of entity hashes - Unseen entities are reported as seen with probability error_rate"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.error_rate = error_rate
+        self.no_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.no_hashes = max(1, int(round(self.no_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.no_bits + 7) // 8)
+
+    def add(self, entity_hash):
+        """Add the entity hash
+            :return True if the entity hash was not seen before"""
+        # Double hashing with the two halves of the 128 bit entity hash
+        first_hash = int.from_bytes(entity_hash[:8], 'little')
+        second_hash = int.from_bytes(entity_hash[8:16], 'little') | 1
+        positions = [(first_hash + i * second_hash) % self.no_bits for i in range(self.no_hashes)]
+
+        is_new = False
+        for position in positions:
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= (1 << bit)
+                is_new = True
+
+        return is_new
+
+    def close(self):
+        pass
+
+
+class DiskHashSet:
+    """Exact set of entity hashes in a sqlite database - Memory usage does not grow with the corpus"""
+
+    def __init__(self, path, commit_interval=100000):
+        # Every run starts with an empty set
+        if os.path.isfile(path):
+            os.remove(path)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=OFF')
+        self.connection.execute('PRAGMA synchronous=OFF')
+        self.connection.execute('CREATE TABLE entity_hashes (hash BLOB PRIMARY KEY) WITHOUT ROWID')
+        self.commit_interval = commit_interval
+        self.no_uncommitted_hashes = 0
+
+    def add(self, entity_hash):
+        """Add the entity hash
+            :return True if the entity hash was not seen before"""
+        cursor = self.connection.execute('INSERT OR IGNORE INTO entity_hashes (hash) VALUES (?)', (entity_hash,))
+        self.no_uncommitted_hashes += 1
+        if self.no_uncommitted_hashes >= self.commit_interval:
+            self.connection.commit()
+            self.no_uncommitted_hashes = 0
+
+        return cursor.rowcount == 1
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+def select_seen_entity_set(seen_entity_set, path, expected_entities):
+    """Select the set of seen entities for deduplication across the corpus
+        :param seen_entity_set 'disk' (exact, sqlite) or 'bloom' (fixed memory - unique entities are dropped as
+            false duplicates with the error rate of the filter)"""
+    if seen_entity_set == 'bloom':
+        return BloomFilter(expected_entities)
+    elif seen_entity_set == 'disk':
+        return DiskHashSet(path)
+    else:
+        raise ValueError('Seen entity set {} is unknown!'.format(seen_entity_set))
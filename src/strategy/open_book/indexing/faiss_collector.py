@@ -4,22 +4,69 @@ import os
 import faiss
 import numpy as np
 
+from src.strategy.open_book.indexing.faiss_entity_store import EntityStoreWriter
+from src.strategy.open_book.indexing.reservoir_sample import ReservoirSample
 
-def determine_path_to_faiss_index(schema_org_class, model_name, pool, sim, clusters):
+
+def determine_path_to_faiss_index(schema_org_class, model_name, pool, sim, clusters, index_type='flat'):
     path_to_faiss_dir = '{}/faiss/'.format(os.environ['DATA_DIR'])
     if not os.path.isdir(path_to_faiss_dir):
         os.mkdir(path_to_faiss_dir)
+
+    # Flat indices keep the original file name
+    index_suffix = '' if index_type == 'flat' else '_{}'.format(index_type)
     if clusters:
-        return '{}{}_faiss_{}_{}_{}_with_clusters.index'.format(path_to_faiss_dir, schema_org_class,
-                                                model_name.replace('/', ''), pool, sim)
+        return '{}{}_faiss_{}_{}_{}{}_with_clusters.index'.format(path_to_faiss_dir, schema_org_class,
+                                                model_name.replace('/', ''), pool, sim, index_suffix)
+    else:
+        return '{}{}_faiss_{}_{}_{}{}.index'.format(path_to_faiss_dir, schema_org_class,
+                                                  model_name.replace('/', ''), pool, sim, index_suffix)
+
+
+def create_faiss_index(dimensions, similarity_measure, index_configuration=None):
+    """Create an empty faiss index
+        :param index_configuration dict with the index type ('flat', 'ivf_flat', 'ivf_pq' or 'hnsw')
+                                   and its parameters - falls back to a flat index if not defined
+    """
+    if index_configuration is None:
+        index_configuration = {'type': 'flat'}
+
+    index_type = index_configuration['type']
+    metric = faiss.METRIC_L2 if similarity_measure == 'f2' else faiss.METRIC_INNER_PRODUCT
+
+    if index_type == 'flat':
+        if similarity_measure == 'f2':
+            index = faiss.IndexFlatL2(dimensions)
+        else:
+            index = faiss.IndexFlatIP(dimensions)
+    elif index_type == 'ivf_flat':
+        quantizer = faiss.IndexFlatL2(dimensions) if metric == faiss.METRIC_L2 else faiss.IndexFlatIP(dimensions)
+        index = faiss.IndexIVFFlat(quantizer, dimensions, index_configuration['nlist'], metric)
+    elif index_type == 'ivf_pq':
+        quantizer = faiss.IndexFlatL2(dimensions) if metric == faiss.METRIC_L2 else faiss.IndexFlatIP(dimensions)
+        index = faiss.IndexIVFPQ(quantizer, dimensions, index_configuration['nlist'], index_configuration['m'],
+                                 index_configuration.get('nbits', 8), metric)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimensions, index_configuration.get('hnsw_m', 32), metric)
+        index.hnsw.efConstruction = index_configuration.get('ef_construction', 40)
     else:
-        return '{}{}_faiss_{}_{}_{}.index'.format(path_to_faiss_dir, schema_org_class,
-                                                  model_name.replace('/', ''), pool, sim)
+        raise ValueError('Faiss index type {} is not defined!'.format(index_type))
+
+    return index
+
+
+def set_faiss_search_parameters(index, nprobe=None, ef_search=None):
+    """Set query time parameters of approximate faiss indices"""
+    parameter_space = faiss.ParameterSpace()
+    if nprobe is not None:
+        parameter_space.set_index_parameter(index, 'nprobe', nprobe)
+    if ef_search is not None:
+        parameter_space.set_index_parameter(index, 'efSearch', ef_search)
 
 
 class FaissIndexCollector:
     def __init__(self, schema_org_class, model_name, pooling, similarity_measure, final_representation,
-                 dimensions, clusters):
+                 dimensions, clusters, index_configuration=None):
         self.schema_org_class = schema_org_class
         self.model_name = model_name
         self.pooling = pooling
@@ -27,12 +74,28 @@ class FaissIndexCollector:
         self.dimensions = dimensions
         self.clusters = clusters
 
+        if index_configuration is None:
+            index_configuration = {'type': 'flat'}
+        self.index_configuration = index_configuration
+
         # Initialize entity representations
         self.indices = {}
-        if self.similarity_measure == 'f2':
-            self.indices['index_{}_{}'.format(self.pooling, self.similarity_measure)] = faiss.IndexFlatL2(self.dimensions)
-        else:
-            self.indices['index_{}_{}'.format(self.pooling, self.similarity_measure)] = faiss.IndexFlatIP(self.dimensions)
+        self.indices['index_{}_{}'.format(self.pooling, self.similarity_measure)] = \
+            create_faiss_index(self.dimensions, self.similarity_measure, self.index_configuration)
+
+        path_to_faiss_index = determine_path_to_faiss_index(self.schema_org_class, self.model_name, self.pooling,
+                                                            self.similarity_measure, self.clusters,
+                                                            self.index_configuration['type'])
+
+        # IVF indices have to be trained on a uniform random sample of all representations
+        # - Representations are spilled to disk in order until all of them are collected
+        self.training_sample = ReservoirSample(self.index_configuration.get('training_sample_size', 100000))
+        self.path_to_untrained_representations = '{}.untrained'.format(path_to_faiss_index)
+        self.untrained_representations_file = None
+        self.no_untrained_representations = 0
+
+        # Store entities by faiss id next to the index - retrieval does not need ES to hydrate hits
+        self.entity_store_writer = EntityStoreWriter(path_to_faiss_index)
 
         self.entity_representations = {}
         self.initialize_entity_representations()
@@ -56,6 +119,7 @@ class FaissIndexCollector:
             logging.getLogger().warning('Identifier: {} is not defined!'.format(identifier))
         entity_rep = entity[identifier]
         self.entity_representations['{}_{}'.format(self.pooling, self.similarity_measure)].append(entity_rep)
+        self.entity_store_writer.append(entity)
 
 
     def add_entity_representations_to_indices(self):
@@ -63,13 +127,56 @@ class FaissIndexCollector:
         # save neural entity representations to different indices
         index_identifier = 'index_{}_{}'.format(self.pooling, self.similarity_measure)
         representations = np.array(self.entity_representations['{}_{}'.format(self.pooling, self.similarity_measure)]).astype('float32')
-        self.indices[index_identifier].add(representations)
+
+        if self.indices[index_identifier].is_trained:
+            self.indices[index_identifier].add(representations)
+        elif len(representations) > 0:
+            # Keep the order of the representations - faiss ids have to match the ES ids
+            if self.untrained_representations_file is None:
+                self.untrained_representations_file = open(self.path_to_untrained_representations, 'wb')
+            self.untrained_representations_file.write(representations.tobytes())
+            self.no_untrained_representations += len(representations)
+            self.training_sample.add(representations)
+
+    def train_index_and_add_untrained_representations(self):
+        """Train the index on the training sample and add the spilled representations to the index afterwards"""
+        index_identifier = 'index_{}_{}'.format(self.pooling, self.similarity_measure)
+        training_sample = self.training_sample.get_sample()
+        logging.info('Train {} index on {} of {} entity representations'.format(
+            self.index_configuration['type'], len(training_sample), self.no_untrained_representations))
+        self.indices[index_identifier].train(training_sample)
+
+        if self.untrained_representations_file is not None:
+            self.untrained_representations_file.close()
+            self.untrained_representations_file = None
+            untrained_representations = np.memmap(self.path_to_untrained_representations, dtype='float32', mode='r',
+                                                  shape=(self.no_untrained_representations, self.dimensions))
+            for start in range(0, self.no_untrained_representations, self.training_sample.size):
+                self.indices[index_identifier].add(
+                    np.array(untrained_representations[start:start + self.training_sample.size]))
+            del untrained_representations
+            os.remove(self.path_to_untrained_representations)
+            self.no_untrained_representations = 0
 
     def save_indices(self):
         index_identifier = 'index_{}_{}'.format(self.pooling, self.similarity_measure)
-        path_to_faiss_index = determine_path_to_faiss_index(self.schema_org_class, self.model_name, self.pooling, self.similarity_measure, self.clusters)
+        if not self.indices[index_identifier].is_trained:
+            if self.next_representation < self.final_representation:
+                logging.info('Index {} is not trained yet - Skip saving'.format(index_identifier))
+                return
+            # All representations are collected, but the training sample is not complete --> Train on all of them
+            self.train_index_and_add_untrained_representations()
+
+        path_to_faiss_index = determine_path_to_faiss_index(self.schema_org_class, self.model_name, self.pooling,
+                                                            self.similarity_measure, self.clusters,
+                                                            self.index_configuration['type'])
         # Write index to file - Persist
         faiss.write_index(self.indices[index_identifier], path_to_faiss_index)
+        if self.next_representation < self.final_representation:
+            self.entity_store_writer.flush()
+        else:
+            # All entities are collected - the entity store is complete
+            self.entity_store_writer.close()
         logging.info('Saved Index - {} for model {} and schema org class {}'.format(index_identifier,
                                                                                     self.model_name,
                                                                                     self.schema_org_class))
@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+
+import numpy as np
+
+
+def determine_paths_to_entity_store(path_to_faiss_index):
+    """Determine the paths of the entity store files that belong to the provided faiss index
+        :return path to the serialized entities, path to the offsets of the entities"""
+    path_prefix = path_to_faiss_index[:-len('.index')] if path_to_faiss_index.endswith('.index') \
+        else path_to_faiss_index
+    return '{}_entities.bin'.format(path_prefix), '{}_entity_offsets.npy'.format(path_prefix)
+
+
+def entity_store_exists(path_to_faiss_index):
+    path_to_entities, path_to_offsets = determine_paths_to_entity_store(path_to_faiss_index)
+    return os.path.isfile(path_to_entities) and os.path.isfile(path_to_offsets)
+
+
+class EntityStoreWriter:
+    """Write the entities of a faiss index in the order of their faiss ids next to the index
+        - The entities are stored as concatenated json documents plus an array of offsets
+        - numpy is a core dependency, pyarrow is only optional (parquet results) and not needed for retrieval"""
+
+    def __init__(self, path_to_faiss_index):
+        self.path_to_entities, self.path_to_offsets = determine_paths_to_entity_store(path_to_faiss_index)
+        self.file = open(self.path_to_entities, 'wb')
+        self.offsets = [0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def append(self, entity):
+        """Append entity - The entity receives the next faiss id"""
+        # Do not store the entity representations
+        context = {key: value for key, value in entity.items() if not key.startswith('entity_vector')}
+        serialized_entity = json.dumps(context, ensure_ascii=False).encode('utf-8')
+        self.file.write(serialized_entity)
+        self.offsets.append(self.offsets[-1] + len(serialized_entity))
+
+    def flush(self):
+        """Persist entities and offsets"""
+        self.file.flush()
+        np.save(self.path_to_offsets, np.array(self.offsets, dtype='int64'))
+        logging.getLogger().info('Saved {} entities to {}'.format(len(self.offsets) - 1, self.path_to_entities))
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class EntityStore:
+    """Memory-mapped read access to the entities of a faiss index by faiss id"""
+
+    def __init__(self, path_to_faiss_index):
+        path_to_entities, path_to_offsets = determine_paths_to_entity_store(path_to_faiss_index)
+        self.offsets = np.load(path_to_offsets, mmap_mode='r')
+        if self.offsets[-1] > 0:
+            self.entities = np.memmap(path_to_entities, dtype='uint8', mode='r')
+        else:
+            # Empty files cannot be memory-mapped
+            self.entities = np.zeros(0, dtype='uint8')
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get_entity(self, faiss_id):
+        """Return the entity of the provided faiss id or None if the id is unknown (e.g. -1 for missing hits)"""
+        faiss_id = int(faiss_id)
+        if faiss_id < 0 or faiss_id >= len(self):
+            return None
+
+        start, end = self.offsets[faiss_id], self.offsets[faiss_id + 1]
+        return json.loads(self.entities[start:end].tobytes().decode('utf-8'))
+
+    def get_entities(self, faiss_ids):
+        return [self.get_entity(faiss_id) for faiss_id in faiss_ids]
@@ -1,10 +1,9 @@
 import gzip
-import json
 import os
 import time
 
 import click
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import helpers
 import logging
 
 from multiprocessing import Pool
@@ -13,8 +12,11 @@ from tqdm import tqdm
 
 from src.data.localbusiness.load_clusters import load_clusters as load_localbusiness_clusters
 from src.data.product.load_clusters import load_clusters as load_product_clusters
+from src.preprocessing.corpus_reader import CorpusFileReader
 from src.preprocessing.entity_extraction import extract_entity
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.indexing.entity_deduplication import BloomFilter, determine_entity_hash, \
+    select_seen_entity_set
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 from src.preprocessing.language_detection import LanguageDetector
 
 
@@ -24,11 +26,17 @@ from src.preprocessing.language_detection import LanguageDetector
 @click.option('--tokenizer', help='Tokenizer for ES Index', default='standard')
 @click.option('--no-test/--test', default=True)
 @click.option('--with-clusters/--without-clusters', default=False)
-def load_data(schema_org_class, worker, tokenizer, no_test, with_clusters):
+@click.option('--deduplication', type=click.Choice(['none', 'table', 'corpus']), default='table',
+              help='Drop duplicate entities within a table, across the corpus or not at all')
+@click.option('--seen_entity_set', type=click.Choice(['bloom', 'disk']), default='disk',
+              help='Set of seen entities for corpus deduplication - bloom drops some unique entities')
+@click.option('--expected_entities', type=int, default=100000000, help='Capacity of the bloom filter')
+def load_data(schema_org_class, worker, tokenizer, no_test, with_clusters, deduplication, seen_entity_set,
+              expected_entities):
     logger = logging.getLogger()
 
     # Connect to Elasticsearch
-    _es = Elasticsearch([{'host': os.environ['ES_INSTANCE'], 'port': 9200}], timeout=15, max_retries=3, retry_on_timeout=True)
+    _es = get_es_client()
 
     if not _es.ping():
         raise ValueError("Connection failed")
@@ -116,7 +124,14 @@ def load_data(schema_org_class, worker, tokenizer, no_test, with_clusters):
         _es.indices.create(entity_index_name, body=mapping)
 
     # Collect statistics about added/ not added entities & tables
-    index_statistics = {'tables_added': 0, 'tables_not_added': 0, 'entities_added': 0, 'entities_not_added': 0}
+    index_statistics = {'tables_added': 0, 'tables_not_added': 0, 'entities_added': 0, 'entities_not_added': 0,
+                        'duplicates_in_table': 0, 'duplicates_in_corpus': 0, 'lines_read': 0, 'invalid_lines': 0}
+
+    # Entities are deduplicated within tables by the workers and across the corpus before they are sent to ES
+    seen_entities = None
+    if deduplication == 'corpus':
+        seen_entities = select_seen_entity_set(seen_entity_set, '{}/corpus/{}_entity_hashes.sqlite'.format(
+            os.environ['DATA_DIR'], entity_index_name), expected_entities)
 
     directory = '{}/corpus/{}'.format(os.environ['DATA_DIR'], schema_org_class)
 
@@ -139,20 +154,22 @@ def load_data(schema_org_class, worker, tokenizer, no_test, with_clusters):
         collected_filenames.append(filename)
         if len(collected_filenames) > 50:
             if worker == 0:
-                results.append(create_table_index_action(directory, collected_filenames, entity_index_name, schema_org_class, clusters))
+                results.append(create_table_index_action(directory, collected_filenames, entity_index_name, schema_org_class, clusters,
+                                                         deduplication))
             else:
                 results.append(
                     pool.apply_async(create_table_index_action, (directory, collected_filenames, entity_index_name,
-                                                                 schema_org_class, clusters,)))
+                                                                 schema_org_class, clusters, deduplication)))
             collected_filenames = []
 
     if len(collected_filenames) > 0:
         if worker == 0:
-            results.append(create_table_index_action(directory, collected_filenames, entity_index_name, schema_org_class, clusters))
+            results.append(create_table_index_action(directory, collected_filenames, entity_index_name, schema_org_class, clusters,
+                                                         deduplication))
         else:
             results.append(
                  pool.apply_async(create_table_index_action, (directory, collected_filenames, entity_index_name,
-                                                              schema_org_class, clusters)))
+                                                              schema_org_class, clusters, deduplication)))
 
     pbar = tqdm(total=len(results))
     logger.info('Wait for all tasks to finish!')
@@ -161,9 +178,12 @@ def load_data(schema_org_class, worker, tokenizer, no_test, with_clusters):
         if len(results) == 0:
             break
 
-        results, entity_index = send_actions_to_elastic(_es, results, entity_index, index_statistics, pbar, no_test, worker)
+        results, entity_index = send_actions_to_elastic(_es, results, entity_index, index_statistics, pbar, no_test, worker,
+                                                        seen_entities)
 
     pbar.close()
+    if seen_entities is not None:
+        seen_entities.close()
 
     if worker > 0:
         pool.close()
@@ -174,9 +194,18 @@ def load_data(schema_org_class, worker, tokenizer, no_test, with_clusters):
     logger.info('Not added entities: {}'.format(index_statistics['entities_not_added']))
     logger.info('Added tables: {}'.format(index_statistics['tables_added']))
     logger.info('Not added tables: {}'.format(index_statistics['tables_not_added']))
-
-
-def send_actions_to_elastic(_es, results, entity_index, index_statistics, pbar, no_test, worker):
+    logger.info('Duplicates in tables: {}'.format(index_statistics['duplicates_in_table']))
+    if isinstance(seen_entities, BloomFilter):
+        # Some of the duplicates across tables are unique entities reported as seen by the bloom filter
+        logger.info('Duplicates across tables: {} - bloom filter false positive rate: {}'.format(
+            index_statistics['duplicates_in_corpus'], seen_entities.error_rate))
+    else:
+        logger.info('Duplicates across tables: {}'.format(index_statistics['duplicates_in_corpus']))
+    logger.info('Read lines: {}'.format(index_statistics['lines_read']))
+    logger.info('Skipped invalid lines: {}'.format(index_statistics['invalid_lines']))
+
+
+def send_actions_to_elastic(_es, results, entity_index, index_statistics, pbar, no_test, worker, seen_entities=None):
     """Send actions to elastic and update statistics"""
     logger = logging.getLogger()
 
@@ -193,6 +222,14 @@ def send_actions_to_elastic(_es, results, entity_index, index_statistics, pbar,
         if new_actions is not None and new_statistics is not None:
             logger.debug('Retrieved {} actions'.format(len(new_actions)))
             for action in new_actions:
+                # The entity hash is only used for deduplication and not indexed
+                entity_hash = action.pop('_entity_hash', None)
+                if seen_entities is not None and entity_hash is not None and not seen_entities.add(entity_hash):
+                    new_statistics['entities_added'] -= 1
+                    new_statistics['entities_not_added'] += 1
+                    new_statistics['duplicates_in_corpus'] += 1
+                    continue
+
                 action['_id'] = entity_index
                 actions.append(action)
 
@@ -200,6 +237,10 @@ def send_actions_to_elastic(_es, results, entity_index, index_statistics, pbar,
 
             index_statistics['entities_added'] += new_statistics['entities_added']
             index_statistics['entities_not_added'] += new_statistics['entities_not_added']
+            index_statistics['duplicates_in_table'] += new_statistics['duplicates_in_table']
+            index_statistics['duplicates_in_corpus'] += new_statistics['duplicates_in_corpus']
+            index_statistics['lines_read'] += new_statistics['lines_read']
+            index_statistics['invalid_lines'] += new_statistics['invalid_lines']
             collected_results.append(result)
             pbar.update(1)
 
@@ -213,8 +254,10 @@ def send_actions_to_elastic(_es, results, entity_index, index_statistics, pbar,
     return results, entity_index
 
 
-def create_table_index_action(directory, files, entity_index, schema_org_class, clusters):
-    """Creates entity document that will be index to elastic search"""
+def create_table_index_action(directory, files, entity_index, schema_org_class, clusters, deduplication='table'):
+    """Creates entity document that will be index to elastic search
+        :param deduplication 'table' or 'corpus' drop entities with the same values (except description) of a table,
+                             'corpus' additionally marks the entities with their hash for deduplication across tables"""
     log_format = '%(asctime)s - subprocess - %(name)s - %(levelname)s - %(message)s'
     logging.basicConfig(level=logging.INFO, format=log_format)
     logger = logging.getLogger()
@@ -222,7 +265,8 @@ def create_table_index_action(directory, files, entity_index, schema_org_class,
     ld = LanguageDetector()
 
     actions = []
-    index_statistics = {'entities_added': 0, 'entities_not_added': 0}
+    index_statistics = {'entities_added': 0, 'entities_not_added': 0, 'duplicates_in_table': 0,
+                        'duplicates_in_corpus': 0, 'lines_read': 0, 'invalid_lines': 0}
 
     for filename in files:
         file_path = '{}/{}'.format(directory, filename)
@@ -237,14 +281,12 @@ def create_table_index_action(directory, files, entity_index, schema_org_class,
         else:
             file_table = None
 
-        # Use 'entity' to find entity indices
-        found_entities = []
+        # Hashes of the entities of the table
+        found_entities = set()
         try:
-            with gzip.open(file_path, 'rb') as file:
+            with CorpusFileReader(file_path) as reader:
                 # 1. Fill index with normalized entities
-                for line in file.readlines():
-                    # Extract entity name
-                    raw_entity = json.loads(line)
+                for raw_entity in reader:
                     if clusters is not None and file_table is not None:
                         if raw_entity['row_id'] not in clusters[file_table[:3]][file_table]:
                             index_statistics['entities_not_added'] += 1
@@ -262,23 +304,27 @@ def create_table_index_action(directory, files, entity_index, schema_org_class,
                         else:
                             entity = extract_entity(raw_entity, schema_org_class)
                             # Determine duplicates based on entity values without description
-                            entity_wo_description = entity.copy()
-                            if 'description' in entity_wo_description:
-                                del entity_wo_description['description']
+                            entity_hash = determine_entity_hash(entity) if deduplication != 'none' else None
 
                             if 'name' in entity \
                                     and len(entity.keys()) > 1 \
-                                    and entity_wo_description not in found_entities:
+                                    and (entity_hash is None or entity_hash not in found_entities):
 
-                                found_entities.append(entity_wo_description)
+                                if entity_hash is not None:
+                                    found_entities.add(entity_hash)
 
                                 entity['table'] = filename.lower()
                                 entity['row_id'] = raw_entity['row_id']
                                 entity['page_url'] = raw_entity['page_url']
 
-                                actions.append({'_index': entity_index, '_source': entity})
+                                action = {'_index': entity_index, '_source': entity}
+                                if deduplication == 'corpus':
+                                    action['_entity_hash'] = entity_hash
+                                actions.append(action)
                                 index_statistics['entities_added'] += 1
                             else:
+                                if entity_hash in found_entities:
+                                    index_statistics['duplicates_in_table'] += 1
                                 index_statistics['entities_not_added'] += 1
 
                     else:
@@ -287,6 +333,9 @@ def create_table_index_action(directory, files, entity_index, schema_org_class,
                                 .format(str(raw_entity), filename))
                         index_statistics['entities_not_added'] += 1
 
+                index_statistics['lines_read'] += reader.statistics['lines']
+                index_statistics['invalid_lines'] += reader.statistics['invalid_lines']
+
         except gzip.BadGzipFile as e:
             logger.warning('{} - Cannot open file {}'.format(e, filename))
 
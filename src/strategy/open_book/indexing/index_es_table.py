@@ -1,14 +1,16 @@
 import gzip
-import json
 import os
 import time
 
 import click
-from elasticsearch import Elasticsearch, helpers
+from elasticsearch import helpers
 import logging
 
 from multiprocessing import Pool
 
+from src.preprocessing.corpus_reader import CorpusFileReader
+from src.strategy.open_book.es_helper import get_es_client
+
 
 @click.command()
 @click.option('--schema_org_class')
@@ -17,9 +19,8 @@ def load_data(schema_org_class, worker):
     logger = logging.getLogger()
 
     path_to_data_dir = os.environ['DATA_DIR']
-    elasticsearch_host = os.environ['ES_INSTANCE']
     # Connect to Elasticsearch
-    _es = Elasticsearch([{'host': elasticsearch_host, 'port': 9200}])
+    _es = get_es_client()
     _es.ping()
 
     # Prepare parallel processing
@@ -50,6 +51,8 @@ def load_data(schema_org_class, worker):
     index_statistics['tables_not_added'] = 0
     index_statistics['entities_added'] = 0
     index_statistics['entities_not_added'] = 0
+    index_statistics['lines_read'] = 0
+    index_statistics['invalid_lines'] = 0
 
     directory = '{}/corpus/{}'.format(path_to_data_dir, schema_org_class)
     pool = Pool(worker)
@@ -86,6 +89,8 @@ def load_data(schema_org_class, worker):
     logger.info('Not added entities: {}'.format(index_statistics['entities_not_added']))
     logger.info('Added tables: {}'.format(index_statistics['tables_added']))
     logger.info('Not added tables: {}'.format(index_statistics['tables_not_added']))
+    logger.info('Read lines: {}'.format(index_statistics['lines_read']))
+    logger.info('Skipped invalid lines: {}'.format(index_statistics['invalid_lines']))
 
 
 def send_actions_to_elastic(_es, results, doc_index_number, index_statistics):
@@ -107,6 +112,8 @@ def send_actions_to_elastic(_es, results, doc_index_number, index_statistics):
             index_statistics['entities_not_added'] += new_statistics['entities_not_added']
             index_statistics['tables_added'] += new_statistics['tables_added']
             index_statistics['tables_not_added'] += new_statistics['tables_not_added']
+            index_statistics['lines_read'] += new_statistics['lines_read']
+            index_statistics['invalid_lines'] += new_statistics['invalid_lines']
             collected_results.append(result)
 
     if len(actions) > 0:
@@ -125,21 +132,19 @@ def create_table_index_action(directory, filename, table_index_name):
     logger = logging.getLogger()
     actions = []
     table_added = False
-    index_statistics = {'entities_added': 0, 'entities_not_added': 0, 'tables_added': 0, 'tables_not_added': 0}
+    index_statistics = {'entities_added': 0, 'entities_not_added': 0, 'tables_added': 0, 'tables_not_added': 0,
+                        'lines_read': 0, 'invalid_lines': 0}
     
     file_path = '{}/{}'.format(directory, filename)
     # Use 'entity' to find entity indices
     try:
-        with gzip.open(file_path, 'rb') as file:
+        with CorpusFileReader(file_path) as reader:
 
             # 1. Fill Entities Index - Index on demand (!) --> Not necessary to index all data upfront
             table_name_column = {'table_name': filename, 'content': '', 'boolean_content': '', 'schema': ''}
             schema = set()
             
-            for line in file.readlines():
-
-                # Extract entity name
-                raw_entity = json.loads(line)
+            for raw_entity in reader:
 
                 if 'name' in raw_entity:
                     # Collect Table Name Column for Tables Index
@@ -185,6 +190,9 @@ def create_table_index_action(directory, filename, table_index_name):
                             .format(str(raw_entity), filename))
                     index_statistics['entities_not_added'] += 1
 
+            index_statistics['lines_read'] += reader.statistics['lines']
+            index_statistics['invalid_lines'] += reader.statistics['invalid_lines']
+
     except gzip.BadGzipFile as e:
         logger.warning('{} - Cannot open file {}'.format(e, filename))
 
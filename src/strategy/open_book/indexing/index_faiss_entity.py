@@ -5,10 +5,9 @@ from multiprocessing import Process, Queue
 
 import click
 import yaml
-from elasticsearch import Elasticsearch
 from tqdm import tqdm
 
-from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.es_helper import determine_es_index_name, get_es_client
 from src.strategy.open_book.indexing.faiss_collector import FaissIndexCollector
 from src.strategy.open_book.retrieval.encoding.bi_encoder_factory import select_bi_encoder
 from src.strategy.open_book.retrieval.query_by_entity import QueryByEntity
@@ -29,7 +28,7 @@ def load_data(path_to_config):
 
     strategy = QueryByEntity(schema_org_class)
 
-    _es = Elasticsearch([{'host': os.environ['ES_INSTANCE'], 'port': 9200}])
+    _es = get_es_client()
     entity_index_name = determine_es_index_name(schema_org_class, clusters=config['general']['clusters'])
     logger.info('Create FAISS index for ES index {}'.format(entity_index_name))
     no_entities = int(_es.cat.count(entity_index_name, params={"format": "json"})[0]['count'])
@@ -42,8 +41,13 @@ def load_data(path_to_config):
     similarity_measure = config['bi_encoder_configuration']['similarity_measure']  # Normalisation needed if similarity measure is cos
     bi_encoder_configuration = config['bi_encoder_configuration']
 
+    # Index type (flat, ivf_flat, ivf_pq or hnsw) - Defaults to exact search with a flat index
+    index_configuration = config.get('index_configuration', {'type': 'flat'})
+    logger.info('Build faiss index of type {}'.format(index_configuration['type']))
+
     faiss_collector = FaissIndexCollector(schema_org_class, model_name, pooling, similarity_measure, final_step,
-                                          config['bi_encoder_configuration']['dimensions'], config['general']['clusters'])
+                                          config['bi_encoder_configuration']['dimensions'], config['general']['clusters'],
+                                          index_configuration)
 
     input_q = Queue()
     output_q = Queue()
@@ -134,12 +138,8 @@ def generate_embeddings(bi_encoder_configuration, schema_org_class, input_q, out
 
         pooled_outputs = bi_encoder.encode_entities_and_return_pooled_outputs(entities)
 
-        if len(entities) == 1:
-            # Cover special case if only one entity was selected
-            entities[0][collection_identifier] = pooled_outputs
-        else:
-            for entity, pooled_output in zip(entities, pooled_outputs):
-                entity[collection_identifier] = pooled_output
+        for entity, pooled_output in zip(entities, pooled_outputs):
+            entity[collection_identifier] = pooled_output
 
         output_q.put((i, entities))
 
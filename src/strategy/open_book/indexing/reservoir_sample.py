@@ -0,0 +1,38 @@
+import numpy as np
+
+
+class ReservoirSample:
+    """Uniform random sample of a fixed number of vectors from a stream of vector batches
+        - Reservoir sampling (Algorithm R) with a fixed seed - the sample is reproducible for the same stream"""
+
+    def __init__(self, size, seed=42):
+        self.size = size
+        self.random_state = np.random.RandomState(seed)
+        self.sample = None
+        self.no_seen_vectors = 0
+
+    def add(self, vectors):
+        vectors = np.asarray(vectors, dtype='float32')
+        if len(vectors) == 0:
+            return
+        if self.sample is None:
+            self.sample = np.empty((self.size, vectors.shape[1]), dtype='float32')
+
+        # Fill the reservoir first
+        no_filled_vectors = min(max(self.size - self.no_seen_vectors, 0), len(vectors))
+        self.sample[self.no_seen_vectors:self.no_seen_vectors + no_filled_vectors] = vectors[:no_filled_vectors]
+
+        # Afterwards the i-th vector of the stream replaces a random vector of the reservoir with probability size/i
+        stream_positions = np.arange(self.no_seen_vectors + no_filled_vectors, self.no_seen_vectors + len(vectors),
+                                     dtype='int64')
+        if len(stream_positions) > 0:
+            replaced_positions = self.random_state.randint(0, stream_positions + 1, dtype='int64')
+            for i in np.nonzero(replaced_positions < self.size)[0]:
+                self.sample[replaced_positions[i]] = vectors[no_filled_vectors + i]
+
+        self.no_seen_vectors += len(vectors)
+
+    def get_sample(self):
+        if self.sample is None:
+            return np.empty((0, 0), dtype='float32')
+        return self.sample[:min(self.size, self.no_seen_vectors)]
@@ -0,0 +1,147 @@
+import logging
+import os
+
+import click
+import torch
+from transformers import AutoTokenizer, AutoModel, AutoModelForSequenceClassification
+
+from src.finetuning.open_book.contrastive.models.modeling import ContrastiveModel
+
+def determine_path_to_onnx_model(model_path, inference_backend):
+    """Exported graphs are stored next to the model directory"""
+    model_path = model_path.rstrip('/')
+    if inference_backend == 'onnx':
+        return '{}.onnx'.format(model_path)
+    elif inference_backend == 'onnx_quantized':
+        return '{}_quantized.onnx'.format(model_path)
+    else:
+        raise ValueError('Inference backend {} does not use an exported graph!'.format(inference_backend))
+
+
+class OnnxModel:
+    """Run an exported graph with ONNX Runtime - Mimics the call interface of the replaced pytorch model"""
+
+    def __init__(self, path_to_onnx_model, output_class=None):
+        # ONNX Runtime is an optional dependency, which is only needed for exported models
+        import onnxruntime
+
+        if not os.path.isfile(path_to_onnx_model):
+            raise ValueError('Exported model {} not found - Export the model with src.strategy.open_book.onnx_inference'
+                             .format(path_to_onnx_model))
+
+        logging.getLogger().info('Load exported model from {}'.format(path_to_onnx_model))
+        self.session = onnxruntime.InferenceSession(path_to_onnx_model, providers=['CPUExecutionProvider'])
+        self.path_to_onnx_model = path_to_onnx_model
+        self.input_names = [session_input.name for session_input in self.session.get_inputs()]
+        self.output_names = [session_output.name for session_output in self.session.get_outputs()]
+        self.output_class = output_class
+        self.warned_about_ignored_inputs = False
+
+    def __call__(self, **inputs):
+        ignored_input_names = [name for name in inputs if name not in self.input_names]
+        if len(ignored_input_names) > 0 and not self.warned_about_ignored_inputs:
+            # Graphs exported without token_type_ids score sentence pairs differently than the pytorch model
+            logging.getLogger().warning('Exported model {} ignores the inputs {} - Export the model again'
+                                        .format(self.path_to_onnx_model, ', '.join(ignored_input_names)))
+            self.warned_about_ignored_inputs = True
+
+        onnx_inputs = {name: inputs[name].cpu().numpy() for name in self.input_names}
+        outputs = [torch.from_numpy(output) for output in self.session.run(self.output_names, onnx_inputs)]
+
+        if self.output_class is not None:
+            return self.output_class(**dict(zip(self.output_names, outputs)))
+        return tuple(outputs)
+
+
+class FirstOutputWrapper(torch.nn.Module):
+    """Export only the first output of a transformer model - last hidden state or logits"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        if token_type_ids is None:
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids)[0]
+
+
+class ContrastiveOutputWrapper(torch.nn.Module):
+    """Export only the pooled & normalized output of a contrastive model"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask)[1]
+
+
+def determine_input_names(tokenizer):
+    """Inputs of the exported graph - BERT tokenizers also emit token_type_ids, which mark the second segment"""
+    return [name for name in ['input_ids', 'attention_mask', 'token_type_ids'] if name in tokenizer.model_input_names]
+
+
+def export_to_onnx(model, tokenizer, output_name, path_to_onnx_model, input_names=('input_ids', 'attention_mask')):
+    """Export model with dynamic batch size and sequence length"""
+    model.eval()
+    input_names = list(input_names)
+    # Trace a sentence pair - cross encoders use the second segment
+    dummy_inputs = tokenizer(['[COL]name[VAL]dummy entity'], ['[COL]name[VAL]other entity'], return_tensors='pt',
+                             padding=True, truncation=True)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes[output_name] = {0: 'batch'}
+
+    torch.onnx.export(model, tuple([dummy_inputs[name] for name in input_names]), path_to_onnx_model,
+                      input_names=input_names, output_names=[output_name],
+                      dynamic_axes=dynamic_axes, opset_version=13)
+    logging.getLogger().info('Exported model to {}'.format(path_to_onnx_model))
+
+
+def quantize_onnx_model(path_to_onnx_model, path_to_quantized_model):
+    """Apply dynamic int8 quantization to the weights of the exported model"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(path_to_onnx_model, path_to_quantized_model, weight_type=QuantType.QInt8)
+    logging.getLogger().info('Quantized model saved to {}'.format(path_to_quantized_model))
+
+
+@click.command()
+@click.option('--model_name', help='Model directory in DATA_DIR/models/open_book/')
+@click.option('--model_type', type=click.Choice(['huggingface_bi_encoder', 'supcon_bi_encoder', 'huggingface_re_ranker']))
+@click.option('--base_model', default='roberta-base', help='Base model of supcon bi encoders')
+@click.option('--with_projection', type=bool, default=False, help='Projection of supcon bi encoders')
+@click.option('--quantize/--no-quantize', default=True)
+def export_model(model_name, model_type, base_model, with_projection, quantize):
+    """Export a bi encoder or cross encoder to ONNX"""
+    model_path = '{}/models/open_book/{}'.format(os.environ['DATA_DIR'], model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    input_names = determine_input_names(tokenizer)
+
+    if model_type == 'huggingface_bi_encoder':
+        model = FirstOutputWrapper(AutoModel.from_pretrained(model_path))
+        output_name = 'last_hidden_state'
+    elif model_type == 'supcon_bi_encoder':
+        contrastive_model = ContrastiveModel(len_tokenizer=len(tokenizer), model=base_model, with_proj=with_projection)
+        contrastive_model.load_state_dict(torch.load('{}/pytorch_model.bin'.format(model_path),
+                                                     map_location=torch.device('cpu')))
+        model = ContrastiveOutputWrapper(contrastive_model)
+        output_name = 'pooled_output'
+        # The contrastive model does not use token type ids
+        input_names = ['input_ids', 'attention_mask']
+    else:
+        model = FirstOutputWrapper(AutoModelForSequenceClassification.from_pretrained(model_path, num_labels=2))
+        output_name = 'logits'
+
+    path_to_onnx_model = determine_path_to_onnx_model(model_path, 'onnx')
+    export_to_onnx(model, tokenizer, output_name, path_to_onnx_model, input_names)
+
+    if quantize:
+        quantize_onnx_model(path_to_onnx_model, determine_path_to_onnx_model(model_path, 'onnx_quantized'))
+
+
+if __name__ == '__main__':
+    log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    logging.basicConfig(level=logging.INFO, format=log_fmt)
+
+    export_model()
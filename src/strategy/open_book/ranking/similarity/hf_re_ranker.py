@@ -3,7 +3,10 @@ import os
 import torch
 import torch.nn.functional as F
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from transformers.modeling_outputs import SequenceClassifierOutput
 
+from src.strategy.model_registry import load_shared_model
+from src.strategy.open_book.onnx_inference import OnnxModel, determine_path_to_onnx_model
 from src.strategy.open_book.ranking.similarity.similarity_re_ranker import SimilarityReRanker
 
 
@@ -17,9 +20,13 @@ def determine_path_to_model(model_name, schema_org_class, context_attributes):
 
 class HuggingfaceSimilarityReRanker(SimilarityReRanker):
 
-    def __init__(self, schema_org_class, model_name, context_attributes=None):
+    def __init__(self, schema_org_class, model_name, context_attributes=None, inference_backend='pytorch',
+                 batch_size=64):
         super().__init__(schema_org_class, 'Huggingface Cross Encoder', context_attributes)
 
+        # Number of entity pairs that are scored at once
+        self.batch_size = batch_size
+
         # Initialize tokenizer and model for BERT if necessary
         if model_name is not None:
             model_path = '{}/models/open_book/{}'.format(os.environ['DATA_DIR'], model_name)
@@ -40,52 +47,77 @@ class HuggingfaceSimilarityReRanker(SimilarityReRanker):
                 model.save_pretrained(model_path)
                 tokenizer.save_pretrained(model_path)
 
-            self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-            # Load model from checkpoint for testing purposes --> example: '/checkpoint-90000'
-            self.model = AutoModelForSequenceClassification.from_pretrained(model_path,
-                                                                            num_labels=2).to(self.device)
-
-    def predict_matches(self, entities1, entities2, excluded_attributes1=None, excluded_attributes2=None):
-
+            self.tokenizer = load_shared_model(('tokenizer', model_path),
+                                               lambda: AutoTokenizer.from_pretrained(model_path), self)
+            if inference_backend == 'pytorch':
+                # Load model from checkpoint for testing purposes --> example: '/checkpoint-90000'
+                self.model = load_shared_model(('sequence_classification_model', model_path, str(self.device)),
+                                               lambda: AutoModelForSequenceClassification.from_pretrained(
+                                                   model_path, num_labels=2).to(self.device), self)
+            else:
+                # Exported graphs run on CPU with ONNX Runtime
+                self.device = torch.device('cpu')
+                path_to_onnx_model = determine_path_to_onnx_model(model_path, inference_backend)
+                self.model = load_shared_model(('onnx_model', path_to_onnx_model),
+                                               lambda: OnnxModel(path_to_onnx_model, SequenceClassifierOutput), self)
+
+    def serialize_entity_pairs(self, entities1, entities2, excluded_attributes1=None, excluded_attributes2=None):
         entities1_serial = [self.entity_serializer.convert_to_str_representation(entity1, excluded_attributes1)
                             for entity1 in entities1]
         entities2_serial = [self.entity_serializer.convert_to_str_representation(entity2, excluded_attributes2)
                             for entity2 in entities2]
 
-        con_entities_serial = [entity1 + '[SEP]' + entity2 for entity1, entity2 in
-                               zip(entities1_serial, entities2_serial)]
+        return [entity1 + '[SEP]' + entity2 for entity1, entity2 in zip(entities1_serial, entities2_serial)]
+
+    def predict_matches(self, entities1, entities2, excluded_attributes1=None, excluded_attributes2=None):
+
+        con_entities_serial = self.serialize_entity_pairs(entities1, entities2, excluded_attributes1,
+                                                          excluded_attributes2)
 
         encoded_entities = self.tokenizer(con_entities_serial, return_tensors='pt', padding=True, truncation=True).to(
             self.device)
 
-        with torch.no_grad():
+        with torch.inference_mode():
             pred = self.model(**encoded_entities)
 
         return pred
 
+    def predict_match_probabilities(self, con_entities_serial):
+        """Predict match probabilities of serialized entity pairs
+            - Pairs are sorted by token length and batched to minimize padding"""
+        encoded_pairs = self.tokenizer(con_entities_serial, truncation=True)
+        input_ids = encoded_pairs['input_ids']
+        sorted_positions = sorted(range(len(input_ids)), key=lambda position: len(input_ids[position]))
+
+        probabilities = [None] * len(input_ids)
+        for start in range(0, len(sorted_positions), self.batch_size):
+            batch_positions = sorted_positions[start:start + self.batch_size]
+            batch = self.tokenizer.pad([{key: encoded_pairs[key][position] for key in encoded_pairs.keys()}
+                                        for position in batch_positions], return_tensors='pt').to(self.device)
+
+            with torch.inference_mode():
+                preds = F.softmax(self.model(**batch).logits, dim=1)[:, 1].tolist()
+
+            for position, pred in zip(batch_positions, preds):
+                probabilities[position] = pred
+
+        return probabilities
+
     def re_rank_evidences(self, query_table, evidences):
         """Re-rank evidences based on confidence of a cross encoder"""
-        for row in query_table.table:
-            rel_evidences = [evidence for evidence in evidences if evidence.entity_id == row['entityId']]
-
-            if len(rel_evidences) > 0:
-
-                # Create smaller batches of entities
-                def batches(lst, chunk_size):
-                    for i in range(0, len(lst), chunk_size):
-                        yield lst[i:i + chunk_size]
-
-                for evidence_chunk in batches(rel_evidences, 8):
-                    left_entities = [row] * len(evidence_chunk)
-                    right_entities = [rel_evidence.context for rel_evidence in evidence_chunk]
-                    preds = self.predict_matches(entities1=left_entities, entities2=right_entities)
-
-                    preds = F.softmax(preds.logits, dim=1)
-                    for evidence, pred in zip(evidence_chunk, preds):
-                        # Overwrite existing scores
-                        #evidence.scores = {self.name: pred[1].item()}
-                        evidence.scores[self.name] = pred[1].item()
-                        evidence.similarity_score = pred[1].item()
+        rows_by_entity_id = {row['entityId']: row for row in query_table.table}
+
+        # Score all (row, evidence) pairs of the query table at once
+        rel_evidences = [evidence for evidence in evidences if evidence.entity_id in rows_by_entity_id]
+        if len(rel_evidences) > 0:
+            left_entities = [rows_by_entity_id[evidence.entity_id] for evidence in rel_evidences]
+            right_entities = [evidence.context for evidence in rel_evidences]
+            preds = self.predict_match_probabilities(self.serialize_entity_pairs(left_entities, right_entities))
+
+            for evidence, pred in zip(rel_evidences, preds):
+                # Overwrite existing scores
+                evidence.scores[self.name] = pred
+                evidence.similarity_score = pred
 
         updated_evidences = sorted(evidences, key=lambda evidence: evidence.similarity_score, reverse=True)
 
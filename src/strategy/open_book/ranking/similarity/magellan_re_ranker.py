@@ -1,9 +1,11 @@
 import os
 import pickle
 
+import numpy as np
 import pandas as pd
 import py_entitymatching as em
 
+from src.strategy.model_registry import load_shared_model
 from src.strategy.open_book.ranking.similarity.similarity_re_ranker import SimilarityReRanker
 
 
@@ -22,18 +24,68 @@ def determine_path_to_model(model_name, schema_org_class, context_attributes):
     return model_path
 
 
-def prepare_df_for_magellan(entities, excluded_attributes):
-    df_entities = pd.DataFrame(entities)
-
-    # Drop to be excluded attributes
-    if excluded_attributes is not None:
-        df_entities = df_entities.drop(columns=excluded_attributes)
-
-    # Set ID
-    df_entities['ID'] = range(0, len(df_entities))
-    em.set_key(df_entities, 'ID')
-
-    return df_entities
+class MagellanFeatureEvaluator:
+    """Evaluate the features of a Magellan feature table directly on the attribute values of entity pairs
+        - Replaces em.extract_feature_vecs, which requires data frames registered in the Magellan catalog.
+        - Tokenizations are computed once per distinct attribute value."""
+
+    def __init__(self, feature_table):
+        tokenizers = em.get_tokenizers_for_matching()
+        similarity_functions = em.get_sim_funs_for_matching()
+
+        self.features = []
+        for feature in feature_table.to_dict('records'):
+            left_tokenizer = feature.get('left_attr_tokenizer')
+            right_tokenizer = feature.get('right_attr_tokenizer')
+            similarity_function = feature.get('simfunction')
+            if feature.get('is_auto_generated', False) and similarity_function in similarity_functions \
+                    and (left_tokenizer in tokenizers or pd.isnull(left_tokenizer)) \
+                    and (right_tokenizer in tokenizers or pd.isnull(right_tokenizer)):
+                # Auto generated feature: sim(tokenizer(left value), tokenizer(right value))
+                self.features.append({'name': feature['feature_name'],
+                                      'left_attribute': feature['left_attribute'],
+                                      'right_attribute': feature['right_attribute'],
+                                      'left_tokenizer': left_tokenizer if left_tokenizer in tokenizers else None,
+                                      'right_tokenizer': right_tokenizer if right_tokenizer in tokenizers else None,
+                                      'similarity_function': similarity_functions[similarity_function],
+                                      'function': None})
+            else:
+                # User defined feature: Fall back to the feature function
+                self.features.append({'name': feature['feature_name'], 'function': feature['function']})
+
+        self.feature_names = [feature['name'] for feature in self.features]
+        self.tokenizers = tokenizers
+        self.tokenized_values = {tokenizer_name: {} for tokenizer_name in tokenizers}
+
+    def tokenize(self, tokenizer_name, value):
+        if tokenizer_name is None:
+            return value
+        tokenized_values = self.tokenized_values[tokenizer_name]
+        if value not in tokenized_values:
+            tokenized_values[value] = self.tokenizers[tokenizer_name](value)
+        return tokenized_values[value]
+
+    def evaluate(self, entities1, entities2):
+        """Return a feature matrix with one row per entity pair and one column per feature - missing values are 0"""
+        feature_vectors = np.zeros((len(entities1), len(self.features)))
+        for j, feature in enumerate(self.features):
+            for i, (entity1, entity2) in enumerate(zip(entities1, entities2)):
+                if feature['function'] is not None:
+                    value = feature['function'](entity1, entity2)
+                else:
+                    left_value = entity1[feature['left_attribute']]
+                    right_value = entity2[feature['right_attribute']]
+                    if pd.isnull(left_value) or pd.isnull(right_value):
+                        continue
+                    value = feature['similarity_function'](self.tokenize(feature['left_tokenizer'], left_value),
+                                                           self.tokenize(feature['right_tokenizer'], right_value))
+                if not pd.isnull(value):
+                    feature_vectors[i, j] = value
+
+        # Tokenizations are only reused within one query table
+        self.tokenized_values = {tokenizer_name: {} for tokenizer_name in self.tokenizers}
+
+        return feature_vectors
 
 
 class MagellanSimilarityReRanker(SimilarityReRanker):
@@ -44,14 +96,20 @@ class MagellanSimilarityReRanker(SimilarityReRanker):
 
         path_to_feature_table = determine_path_to_feature_table(schema_org_class,
                                                                 self.entity_serializer.context_attributes)
-        self.feature_table = em.load_object(path_to_feature_table)
+        self.feature_table = load_shared_model(('magellan_feature_table', path_to_feature_table),
+                                               lambda: em.load_object(path_to_feature_table), self)
 
         path_to_model = determine_path_to_model(model_name, schema_org_class,
                                                 self.entity_serializer.context_attributes)
         self.model_name = '{}_{}_{}'.format(model_name, schema_org_class, '_'.join(self.entity_serializer.context_attributes))
-        self.model = pickle.load(open(path_to_model, 'rb'))
+        self.model = load_shared_model(('magellan_model', path_to_model),
+                                       lambda: pickle.load(open(path_to_model, 'rb')), self)
+        self.feature_evaluator = MagellanFeatureEvaluator(self.feature_table)
 
-    def predict_matches(self, entities1, entities2, excluded_attributes1=None, excluded_attributes2=None):
+    def predict_matches(self, entities1, entities2, excluded_attributes1=None, excluded_attributes2=None,
+                        groups=None):
+        """Predict matches of the entity pairs
+            :param groups group of every pair, e.g. the query table row - Missing attributes are filled per group"""
 
         # Project entities to only contain relevant attributes
         entities1 = [self.entity_serializer.project_entity(entity, excluded_attributes=excluded_attributes1)
@@ -59,38 +117,28 @@ class MagellanSimilarityReRanker(SimilarityReRanker):
         entities2 = [self.entity_serializer.project_entity(entity, excluded_attributes=excluded_attributes2)
                      for entity in entities2]
 
-        df_entities1 = pd.DataFrame(entities1)
-        df_entities1['id'] = range(0, len(df_entities1))
-        em.set_key(df_entities1, 'id')
-
-        df_entities2 = pd.DataFrame(entities2)
-        df_entities2['id'] = range(0, len(df_entities2))
-        em.set_key(df_entities2, 'id')
-
-        # Make sure that all context attributes are present in the data frame
-        for attr in self.entity_serializer.context_attributes:
-            if attr not in df_entities1.columns:
-                df_entities1[attr] = ""
-            if attr not in df_entities2.columns:
-                df_entities2[attr] = ""
-
-        data_links = [[value, value, value]for value in range(0, len(df_entities1))]
-        df_links = pd.DataFrame(data_links, columns=['_id', 'entities1_id', 'entities2_id'])
-        em.set_key(df_links, '_id')
-
-        # Set foreign key relationships
-        em.set_ltable(df_links, df_entities1)
-        em.set_fk_ltable(df_links, 'entities1_id')
-        em.set_rtable(df_links, df_entities2)
-        em.set_fk_rtable(df_links, 'entities2_id')
-
-        df_feature_vector = em.extract_feature_vecs(df_links, feature_table=self.feature_table,
-                                                    show_progress=False)
-
-        df_feature_vector.fillna(value=0, inplace=True)
-
-        predictions = self.model.predict(table=df_feature_vector,
-                                         exclude_attrs=['_id', 'entities1_id', 'entities2_id'],
+        # Make sure that all context attributes are present - Like in a data frame of the entities of a group,
+        # attributes missing in all entities are empty strings and attributes missing in some entities are null
+        if groups is None:
+            groups = [None] * len(entities1)
+        pair_indices_by_group = {}
+        for i, group in enumerate(groups):
+            pair_indices_by_group.setdefault(group, []).append(i)
+
+        for pair_indices in pair_indices_by_group.values():
+            for entities in [entities1, entities2]:
+                group_entities = [entities[i] for i in pair_indices]
+                for attr in self.entity_serializer.context_attributes:
+                    default_value = np.nan if any(attr in entity for entity in group_entities) else ""
+                    for entity in group_entities:
+                        entity.setdefault(attr, default_value)
+
+        # Same layout as the output of em.extract_feature_vecs - missing feature values are 0
+        df_feature_vector = pd.DataFrame(self.feature_evaluator.evaluate(entities1, entities2),
+                                         columns=self.feature_evaluator.feature_names)
+        df_feature_vector.insert(0, '_id', range(0, len(df_feature_vector)))
+
+        predictions = self.model.predict(table=df_feature_vector, exclude_attrs=['_id'],
                                          append=True, target_attr='predicted', inplace=False, return_probs=True,
                                          probs_attr='proba')
 
@@ -98,22 +146,24 @@ class MagellanSimilarityReRanker(SimilarityReRanker):
 
     def re_rank_evidences(self, query_table, evidences):
         """Re-rank evidences based on confidence of a cross encoder"""
-        for row in query_table.table:
-            rel_evidences = [evidence for evidence in evidences if evidence.entity_id == row['entityId']]
-
-            if len(rel_evidences) > 0:
-
-                left_entities = [row] * len(rel_evidences)
-                right_entities = [rel_evidence.context for rel_evidence in rel_evidences]
-                exclude_attributes = []
-                if hasattr(query_table, 'target_attribute'):
-                    exclude_attributes.append(query_table.target_attribute)
-                preds = self.predict_matches(entities1=left_entities, entities2=right_entities,
-                                             excluded_attributes1=exclude_attributes)
-
-                for evidence, pred in zip(rel_evidences, preds['predicted'].values):
-                    evidence.scores['{}-{}'.format(self.name, self.model_name)] = pred
-                    evidence.similarity_score = pred
+        rows_by_entity_id = {row['entityId']: row for row in query_table.table}
+
+        # Predict matches of all (row, evidence) pairs of the query table at once
+        rel_evidences = [evidence for evidence in evidences if evidence.entity_id in rows_by_entity_id]
+        if len(rel_evidences) > 0:
+            left_entities = [rows_by_entity_id[evidence.entity_id] for evidence in rel_evidences]
+            right_entities = [evidence.context for evidence in rel_evidences]
+            exclude_attributes = []
+            if hasattr(query_table, 'target_attribute'):
+                exclude_attributes.append(query_table.target_attribute)
+            # The evidences of every row are evaluated like one em.extract_feature_vecs call
+            preds = self.predict_matches(entities1=left_entities, entities2=right_entities,
+                                         excluded_attributes1=exclude_attributes,
+                                         groups=[evidence.entity_id for evidence in rel_evidences])
+
+            for evidence, pred in zip(rel_evidences, preds['predicted'].values):
+                evidence.scores['{}-{}'.format(self.name, self.model_name)] = pred
+                evidence.similarity_score = pred
 
         updated_evidences = sorted(evidences, key=lambda evidence: evidence.similarity_score, reverse=True)
 
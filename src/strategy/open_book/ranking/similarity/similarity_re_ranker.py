@@ -16,3 +16,8 @@ class SimilarityReRanker:
         logger.warning('Method not implemented!')
 
         return evidences
+
+    def re_rank_evidences_of_entity(self, query_table, evidences, entity_id):
+        """Re-rank evidences of a single entity - Only the row of the entity is compared to the evidences"""
+        return self.re_rank_evidences(query_table.project_to_entity(entity_id),
+                                      [evidence for evidence in evidences if evidence.entity_id == entity_id])
@@ -21,13 +21,16 @@ def select_similarity_re_ranker(re_ranking_strategy, schema_org_class, context_a
 
     if re_ranking_strategy_name == 'huggingface_re_ranker':
         re_ranking_strategy = HuggingfaceSimilarityReRanker(schema_org_class, re_ranking_strategy['model_name'],
-                                                            context_attributes)
+                                                            context_attributes,
+                                                            re_ranking_strategy.get('inference_backend', 'pytorch'),
+                                                            re_ranking_strategy.get('batch_size', 64))
     elif re_ranking_strategy_name == 'magellan_re_ranker':
             re_ranking_strategy = MagellanSimilarityReRanker(schema_org_class, re_ranking_strategy['model_name'],
                                                              context_attributes)
     elif re_ranking_strategy_name == 'symbolic_re_ranker':
             re_ranking_strategy = SymbolicSimilarityReRanker(schema_org_class, re_ranking_strategy['similarity_measure'],
-                                                             context_attributes)
+                                                             context_attributes,
+                                                             re_ranking_strategy.get('num_permutations', 128))
     elif re_ranking_strategy_name is None:
         # Do not supply a re-ranking strategy
         re_ranking_strategy = None
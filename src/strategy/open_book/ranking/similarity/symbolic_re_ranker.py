@@ -1,64 +1,127 @@
-import os
+import zlib
+from collections import OrderedDict
 
-import torch
-import torch.nn.functional as F
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+import numpy as np
+from scipy.sparse import csr_matrix
 
 from src.strategy.open_book.ranking.similarity.similarity_re_ranker import SimilarityReRanker
 
+# Parameters of the MinHash permutations h(x) = (a * x + b) mod prime
+MINHASH_PRIME = (1 << 61) - 1
+
+
 def jaccard_similarity(list1, list2):
     s1 = set(list1)
     s2 = set(list2)
     return float(len(s1.intersection(s2)) / len(s1.union(s2)))
 
 
+def determine_minhash_signature(tokens, permutations):
+    """Determine the MinHash signature of a token set
+        :param permutations array of shape (2, number of permutations) containing a and b of the permutations"""
+    token_hashes = np.array([zlib.crc32(token.encode('utf-8')) for token in tokens], dtype='uint64')
+    if len(token_hashes) == 0:
+        return np.full(permutations.shape[1], MINHASH_PRIME, dtype='uint64')
+
+    # Python integers avoid overflows of a * x for 32 bit hashes and 61 bit parameters
+    a, b = permutations[0].astype(object), permutations[1].astype(object)
+    permuted_hashes = (np.outer(token_hashes.astype(object), a) + b) % MINHASH_PRIME
+    return permuted_hashes.min(axis=0).astype('uint64')
+
+
 class SymbolicSimilarityReRanker(SimilarityReRanker):
 
-    def __init__(self, schema_org_class, similarity_measure, context_attributes=None):
+    def __init__(self, schema_org_class, similarity_measure, context_attributes=None, num_permutations=128,
+                 max_cached_entities=100000):
         super().__init__(schema_org_class, 'Symbolic re-ranker', context_attributes)
+        if similarity_measure not in ['jaccard', 'cosine', 'minhash_jaccard']:
+            raise ValueError('Similarity Measure {} is unknown!'.format(similarity_measure))
         self.similarity_measure = similarity_measure
 
-    def similarity(self, entities1, entities2, excluded_attributes1=None, excluded_attributes2=None):
+        # Token sets (and MinHash signatures) of evidences by (table, row_id)
+        self.max_cached_entities = max_cached_entities
+        self.evidence_cache = OrderedDict()
+
+        random_state = np.random.RandomState(42)
+        self.permutations = np.stack([random_state.randint(1, MINHASH_PRIME, size=num_permutations, dtype='int64'),
+                                      random_state.randint(0, MINHASH_PRIME, size=num_permutations, dtype='int64')])
+
+    def tokenize_entity(self, entity, excluded_attributes=None):
+        entity_serial = self.entity_serializer.convert_to_str_representation(entity, excluded_attributes,
+                                                                             without_special_tokens=True)
+        tokens = frozenset(entity_serial.lower().split(' '))
+        signature = determine_minhash_signature(tokens, self.permutations) \
+            if self.similarity_measure == 'minhash_jaccard' else None
+        return tokens, signature
+
+    def tokenize_evidence(self, evidence):
+        """Tokenize the evidence context once per (table, row_id)"""
+        key = (evidence.table, evidence.row_id)
+        if key in self.evidence_cache:
+            self.evidence_cache.move_to_end(key)
+        else:
+            self.evidence_cache[key] = self.tokenize_entity(evidence.context)
+            if len(self.evidence_cache) > self.max_cached_entities:
+                self.evidence_cache.popitem(last=False)
+
+        return self.evidence_cache[key]
+
+    def score_candidates(self, tokenized_entity, tokenized_candidates):
+        """Score all candidates of one entity in a single pass
+            :return list of similarity scores in the order of the candidates"""
+        tokens, signature = tokenized_entity
+        if self.similarity_measure == 'minhash_jaccard':
+            candidate_signatures = np.stack([candidate_signature for _, candidate_signature in tokenized_candidates])
+            return (candidate_signatures == signature).mean(axis=1).tolist()
+
+        # Binary token matrix of the candidates restricted to the tokens of the entity
+        vocabulary = {token: position for position, token in enumerate(tokens)}
+        indices, indptr, candidate_sizes = [], [0], []
+        for candidate_tokens, _ in tokenized_candidates:
+            indices.extend([vocabulary[token] for token in candidate_tokens if token in vocabulary])
+            indptr.append(len(indices))
+            candidate_sizes.append(len(candidate_tokens))
+        candidate_matrix = csr_matrix((np.ones(len(indices)), indices, indptr),
+                                      shape=(len(tokenized_candidates), len(vocabulary)))
+
+        intersections = np.asarray(candidate_matrix.sum(axis=1)).ravel()
+        candidate_sizes = np.array(candidate_sizes, dtype='float64')
+        if self.similarity_measure == 'jaccard':
+            denominators = len(tokens) + candidate_sizes - intersections
+        else:
+            denominators = np.sqrt(len(tokens) * candidate_sizes)
+
+        scores = np.divide(intersections, denominators, out=np.zeros(len(intersections)), where=denominators > 0)
+        return scores.tolist()
 
-        entities1_serial = [self.entity_serializer.convert_to_str_representation(entity1, excluded_attributes1, without_special_tokens=True)
-                            for entity1 in entities1]
-        entities2_serial = [self.entity_serializer.convert_to_str_representation(entity2, excluded_attributes2, without_special_tokens=True)
-                            for entity2 in entities2]
+    def similarity(self, entities1, entities2, excluded_attributes1=None, excluded_attributes2=None):
 
         similarity_scores = []
-        for entity1_serial, entity2_serial in zip(entities1_serial, entities2_serial):
-            if self.similarity_measure == 'jaccard':
-                entity1_serial_strings = entity1_serial.lower().split(' ')
-                entity2_serial_strings = entity2_serial.lower().split(' ')
-                similarity_score = jaccard_similarity(entity1_serial_strings, entity2_serial_strings)
-                similarity_scores.append(similarity_score)
-            else:
-                ValueError('Similarity Measure {} is unknown!'.format(self.similarity_measure))
+        for entity1, entity2 in zip(entities1, entities2):
+            similarity_scores.extend(self.score_candidates(self.tokenize_entity(entity1, excluded_attributes1),
+                                                           [self.tokenize_entity(entity2, excluded_attributes2)]))
 
         return similarity_scores
 
     def re_rank_evidences(self, query_table, evidences):
-        """Re-rank evidences based on confidence of a cross encoder"""
+        """Re-rank evidences based on the token similarity to their query table row"""
+        evidences_by_entity_id = {}
+        for evidence in evidences:
+            evidences_by_entity_id.setdefault(evidence.entity_id, []).append(evidence)
+
         for row in query_table.table:
-            rel_evidences = [evidence for evidence in evidences if evidence.entity_id == row['entityId']]
+            rel_evidences = evidences_by_entity_id.get(row['entityId'], [])
 
             if len(rel_evidences) > 0:
-
-                # Create smaller batches of entities
-                def batches(lst, chunk_size):
-                    for i in range(0, len(lst), chunk_size):
-                        yield lst[i:i + chunk_size]
-
-                for evidence_chunk in batches(rel_evidences, 8):
-                    left_entities = [row] * len(evidence_chunk)
-                    right_entities = [rel_evidence.context for rel_evidence in evidence_chunk]
-                    similarity_scores = self.similarity(entities1=left_entities, entities2=right_entities)
-
-                    for evidence, similarity_score in zip(evidence_chunk, similarity_scores):
-                        # Overwrite existing scores
-                        #evidence.scores = {self.name: pred[1].item()}
-                        evidence.scores[self.name] = similarity_score
-                        evidence.similarity_score = similarity_score
+                # Tokenize the row once and score all of its evidences at once
+                similarity_scores = self.score_candidates(self.tokenize_entity(row),
+                                                          [self.tokenize_evidence(rel_evidence)
+                                                           for rel_evidence in rel_evidences])
+
+                for evidence, similarity_score in zip(rel_evidences, similarity_scores):
+                    # Overwrite existing scores
+                    evidence.scores[self.name] = similarity_score
+                    evidence.similarity_score = similarity_score
 
         updated_evidences = sorted(evidences, key=lambda evidence: evidence.similarity_score, reverse=True)
 
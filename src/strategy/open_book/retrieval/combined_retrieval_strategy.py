@@ -1,68 +1,121 @@
+import asyncio
+import heapq
+from concurrent.futures import ThreadPoolExecutor
 
 from src.strategy.open_book.retrieval.retrieval_strategy import RetrievalStrategy
 
 
+def group_evidences_by_entity_id(evidences):
+    """Group evidences by entity id - Evidences of an entity are sorted by similarity score"""
+    evidences_by_entity_id = {}
+    for evidence in evidences:
+        evidences_by_entity_id.setdefault(evidence.entity_id, []).append(evidence)
+
+    for entity_evidences in evidences_by_entity_id.values():
+        entity_evidences.sort(key=lambda evidence: evidence.similarity_score, reverse=True)
+
+    return evidences_by_entity_id
+
+
 class CombinedRetrievalStrategy(RetrievalStrategy):
 
-    def __init__(self, schema_org_class, retrieval_strategy_1, retrieval_strategy_2, clusters):
+    def __init__(self, schema_org_class, retrieval_strategies, clusters, fusion='interleave', rrf_k=60):
         super().__init__(schema_org_class, 'combined_retrieval_strategy')
 
-        self.retrieval_strategy_1 = retrieval_strategy_1
-        self.retrieval_strategy_2 = retrieval_strategy_2
+        self.retrieval_strategies = retrieval_strategies
         self.clusters = clusters
+        # Choose 'interleave' (round robin over the ranked evidences) or 'reciprocal_rank' fusion
+        if fusion not in ['interleave', 'reciprocal_rank']:
+            raise ValueError('Fusion {} is unknown!'.format(fusion))
+        self.fusion = fusion
+        self.rrf_k = rrf_k
 
-        self.model_name = '{}+{}'.format(self.retrieval_strategy_1.model_name, self.retrieval_strategy_2.model_name)
+        self.model_name = '+'.join([str(retrieval_strategy.model_name) for retrieval_strategy in retrieval_strategies])
 
     def retrieve_evidence(self, query_table, evidence_count, entity_id):
         """Retrieve evidences from multiple retrieval strategies"""
 
-        evidences_1 = self.retrieval_strategy_1.retrieve_evidence(query_table, evidence_count, entity_id)
+        # Retrieval strategies wait for ES or run BLAS, hence they can run concurrently
+        with ThreadPoolExecutor(max_workers=len(self.retrieval_strategies)) as executor:
+            futures = [executor.submit(retrieval_strategy.retrieve_evidence, query_table, evidence_count, entity_id)
+                       for retrieval_strategy in self.retrieval_strategies]
+            evidences_per_strategy = [future.result() for future in futures]
+
+        return self.merge_evidences(query_table, evidence_count, evidences_per_strategy)
 
-        evidences_2 = self.retrieval_strategy_2.retrieve_evidence(query_table, evidence_count, entity_id)
+    async def retrieve_evidence_async(self, query_table, evidence_count, entity_id):
+        evidences_per_strategy = await asyncio.gather(
+            *[retrieval_strategy.retrieve_evidence_async(query_table, evidence_count, entity_id)
+              for retrieval_strategy in self.retrieval_strategies])
+
+        return self.merge_evidences(query_table, evidence_count, evidences_per_strategy)
+
+    def merge_evidences(self, query_table, evidence_count, evidences_per_strategy):
+        """Merge the evidences of the retrieval strategies per row of the query table"""
+        grouped_evidences = [group_evidences_by_entity_id(evidences) for evidences in evidences_per_strategy]
 
         merged_evidences = []
         new_evidence_id = 1
         for row in query_table.table:
-            evidences_1_per_entity = [evidence for evidence in evidences_1 if evidence.entity_id == row['entityId']]
-            evidences_1_per_entity.sort(key=lambda evidence: evidence.similarity_score, reverse=True)
+            ranked_evidences = [evidences_by_entity_id.get(row['entityId'], [])
+                                for evidences_by_entity_id in grouped_evidences]
 
-            evidences_2_per_entity = [evidence for evidence in evidences_2 if evidence.entity_id == row['entityId']]
-            evidences_2_per_entity.sort(key=lambda evidence: evidence.similarity_score, reverse=True)
+            if self.fusion == 'interleave':
+                merged_evidences_per_entity = self.interleave(ranked_evidences, evidence_count)
+            else:
+                merged_evidences_per_entity = self.fuse_reciprocal_ranks(ranked_evidences, evidence_count)
 
-            merged_evidences_per_entity = []
+            for evidence in merged_evidences_per_entity:
+                evidence.identifier = new_evidence_id
+                new_evidence_id += 1
 
-            while True:
-                if len(merged_evidences_per_entity) >= evidence_count:
-                    break
+            merged_evidences.extend(merged_evidences_per_entity)
 
-                if len(evidences_1_per_entity) > 0:
-                    next_evidence = evidences_1_per_entity.pop(0)
-                    if next_evidence not in merged_evidences_per_entity:
-                        #self.logger.info('Added entity!')
-                        next_evidence.identifier = new_evidence_id
-                        similarity_score = 1 - (len(merged_evidences_per_entity) / evidence_count)
-                        next_evidence.scores = {self.name: similarity_score}
-                        next_evidence.similarity_score = similarity_score
-                        new_evidence_id += 1
-                        merged_evidences_per_entity.append(next_evidence)
+        return merged_evidences
 
-                if len(merged_evidences_per_entity) >= evidence_count:
+    def interleave(self, ranked_evidences, evidence_count):
+        """Take evidences from the rankings in turn and skip evidences that were already taken"""
+        merged_evidences = []
+        seen_evidences = set()
+        positions = [0] * len(ranked_evidences)
+
+        while len(merged_evidences) < evidence_count \
+                and any(position < len(ranking) for position, ranking in zip(positions, ranked_evidences)):
+            for i, ranking in enumerate(ranked_evidences):
+                if len(merged_evidences) >= evidence_count:
                     break
 
-                if len(evidences_2_per_entity) > 0:
-                    next_evidence = evidences_2_per_entity.pop(0)
-                    if next_evidence not in merged_evidences_per_entity:
-                        #self.logger.info('Added neural entity!')
-                        next_evidence.identifier = new_evidence_id
-                        similarity_score = 1 - (len(merged_evidences_per_entity) / evidence_count)
+                if positions[i] < len(ranking):
+                    next_evidence = ranking[positions[i]]
+                    positions[i] += 1
+                    if next_evidence not in seen_evidences:
+                        seen_evidences.add(next_evidence)
+                        similarity_score = 1 - (len(merged_evidences) / evidence_count)
                         next_evidence.scores = {self.name: similarity_score}
                         next_evidence.similarity_score = similarity_score
-                        new_evidence_id += 1
-                        merged_evidences_per_entity.append(next_evidence)
+                        merged_evidences.append(next_evidence)
 
-                if len(evidences_1_per_entity) == 0 and len(evidences_2_per_entity) == 0:
-                    break
+        return merged_evidences
 
-            merged_evidences.extend(merged_evidences_per_entity)
+    def fuse_reciprocal_ranks(self, ranked_evidences, evidence_count):
+        """Score evidences by the sum of 1 / (rrf_k + rank) over all rankings and keep the best evidences"""
+        fused_scores = {}
+        first_occurrences = {}
+        for ranking in ranked_evidences:
+            for rank, evidence in enumerate(ranking, start=1):
+                if evidence not in fused_scores:
+                    fused_scores[evidence] = 0
+                    first_occurrences[evidence] = (len(first_occurrences), evidence)
+                fused_scores[evidence] += 1 / (self.rrf_k + rank)
+
+        # Ties are broken by the first occurrence of the evidence
+        best_evidences = heapq.nsmallest(evidence_count, first_occurrences.values(),
+                                         key=lambda occurrence: (-fused_scores[occurrence[1]], occurrence[0]))
+
+        merged_evidences = []
+        for _, evidence in best_evidences:
+            evidence.scores = {self.name: fused_scores[evidence]}
+            evidence.similarity_score = fused_scores[evidence]
+            merged_evidences.append(evidence)
 
         return merged_evidences
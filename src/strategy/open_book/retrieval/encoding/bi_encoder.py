@@ -1,6 +1,9 @@
 import logging
 
+import numpy as np
+
 from src.strategy.open_book.entity_serialization import EntitySerializer
+from src.strategy.open_book.retrieval.encoding.embedding_cache import EmbeddingCache
 
 
 class BiEncoder:
@@ -8,11 +11,37 @@ class BiEncoder:
     def __init__(self, schema_org_class, context_attributes=None):
         self.schema_org_class = schema_org_class
         self.entity_serializer = EntitySerializer(schema_org_class, context_attributes)
+        self.embedding_cache = None
+
+    def enable_embedding_cache(self, namespace):
+        """Consult a persistent embedding cache before encoding entities
+            :param namespace Identifies the model configuration (model, pooling, ...) that produced the embeddings
+        """
+        self.embedding_cache = EmbeddingCache(namespace)
 
-    def encode_entities_and_return_pooled_outputs(self, entity, excluded_attributes=None):
-        """Fills the provided query table and delivers evidence if expected
-            :param entity entity to be encoded
+    def encode_entities_and_return_pooled_outputs(self, entities, excluded_attributes=None):
+        """Encode the provided entities and return their pooled outputs
+            :param entities entities to be encoded
             :param excluded_attributes   Attributes, which will be excluded
+            :return list of pooled outputs - one vector per entity, also for a single entity
+        """
+        entity_strs = [self.entity_serializer.convert_to_str_representation(entity, excluded_attributes)
+                       for entity in entities]
+        if len(entity_strs) == 0:
+            return []
+
+        if self.embedding_cache is None:
+            pooled_outputs = self.encode_entity_strs_and_return_pooled_outputs(entity_strs)
+        else:
+            pooled_outputs = self.embedding_cache.get_or_encode(entity_strs,
+                                                                self.encode_entity_strs_and_return_pooled_outputs)
+
+        return np.asarray(pooled_outputs).reshape(len(entity_strs), -1).tolist()
+
+    def encode_entity_strs_and_return_pooled_outputs(self, entity_strs):
+        """Encode the provided serialized entities
+            :param entity_strs serialized entities
+            :return numpy array of pooled outputs (one row per entity)
         """
 
         logger = logging.getLogger()
@@ -1,6 +1,7 @@
 import logging
 
 from src.strategy.open_book.retrieval.encoding.bi_encoder import BiEncoder
+from src.strategy.open_book.retrieval.encoding.embedding_cache import determine_model_fingerprint
 from src.strategy.open_book.retrieval.encoding.glove_bi_encoder import GloveBiEncoder
 from src.strategy.open_book.retrieval.encoding.hf_bi_encoder import HuggingfaceBiEncoder
 from src.strategy.open_book.retrieval.encoding.sbert_bi_encoder import SBERTBiEncoder
@@ -14,14 +15,16 @@ def select_bi_encoder(bi_encoder_config, schema_org_class):
 
     if bi_encoder_config['name'] == 'huggingface_bi_encoder':
         bi_encoder = HuggingfaceBiEncoder(bi_encoder_config['model_name'], bi_encoder_config['pooling'],
-                                          bi_encoder_config['normalize'], schema_org_class)
+                                          bi_encoder_config['normalize'], schema_org_class,
+                                          bi_encoder_config.get('inference_backend', 'pytorch'))
     elif bi_encoder_config['name'] == 'sbert_bi_encoder':
         bi_encoder = SBERTBiEncoder(bi_encoder_config['model_name'], bi_encoder_config['pooling'],
-                                          bi_encoder_config['normalize'], schema_org_class)
+                                    bi_encoder_config['normalize'], schema_org_class)
     elif bi_encoder_config['name'] == 'supcon_bi_encoder':
         bi_encoder = SupConBiEncoder(bi_encoder_config['model_name'], bi_encoder_config['base_model'],
                                      bi_encoder_config['with_projection'], bi_encoder_config['pooling'],
-                                     bi_encoder_config['normalize'], schema_org_class)
+                                     bi_encoder_config['normalize'], schema_org_class,
+                                     bi_encoder_config.get('inference_backend', 'pytorch'))
     elif bi_encoder_config['name'] == 'word2vec_bi_encoder':
         bi_encoder = Word2VecBiEncoder(bi_encoder_config['model_name'])
     elif bi_encoder_config['name'] == 'glove_bi_encoder':
@@ -30,4 +33,13 @@ def select_bi_encoder(bi_encoder_config, schema_org_class):
         # Fall back to default open book strategy
         bi_encoder = BiEncoder(schema_org_class)
 
+    if bi_encoder_config.get('embedding_cache', False):
+        # Embeddings are only valid for the exact model configuration and model files that produced them
+        namespace = '-'.join([str(bi_encoder_config.get(key)) for key in
+                              ['name', 'model_name', 'base_model', 'with_projection', 'pooling', 'normalize',
+                               'inference_backend']])
+        namespace = '{}-{}'.format(namespace, determine_model_fingerprint(bi_encoder_config.get('model_name')))
+        logger.info('Use embedding cache for namespace {}'.format(namespace))
+        bi_encoder.enable_embedding_cache(namespace)
+
     return bi_encoder
@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+def determine_path_to_embedding_cache():
+    path_to_cache_dir = '{}/cache/'.format(os.environ['DATA_DIR'])
+    if not os.path.isdir(path_to_cache_dir):
+        os.makedirs(path_to_cache_dir, exist_ok=True)
+    return '{}embeddings.sqlite'.format(path_to_cache_dir)
+
+
+def determine_model_fingerprint(model_name):
+    """Fingerprint of the model files in DATA_DIR/models/open_book - Changes if the model is retrained or replaced
+        - Covers the content of config.json and the size and mtime of all model files and exported ONNX graphs"""
+    fingerprint = hashlib.sha1()
+    if model_name is None:
+        return fingerprint.hexdigest()
+
+    path_to_model = '{}/models/open_book/{}'.format(os.environ['DATA_DIR'], model_name)
+    for path in [path_to_model, '{}.onnx'.format(path_to_model), '{}_quantized.onnx'.format(path_to_model)]:
+        if os.path.isdir(path):
+            file_paths = sorted([os.path.join(directory, file_name) for directory, _, file_names in os.walk(path)
+                                 for file_name in file_names])
+        elif os.path.isfile(path):
+            file_paths = [path]
+        else:
+            continue
+
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            fingerprint.update('{}\n{}\n{}\n'.format(os.path.relpath(file_path, os.path.dirname(path_to_model)),
+                                                     stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+            if os.path.basename(file_path) == 'config.json':
+                with open(file_path, 'rb') as f:
+                    fingerprint.update(f.read())
+
+    return fingerprint.hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent cache of entity embeddings - Embeddings are stored as float32 blobs in sqlite.
+        Keys are content hashes of the model configuration (namespace) and the serialized entity string.
+        If the cache exceeds its maximal size, the least recently used embeddings are evicted.
+        Access times of looked up embeddings are kept in memory and written with the next write or eviction.
+        The sqlite connection is shared by threads - every use of the connection holds the lock."""
+
+    def __init__(self, namespace, path_to_cache=None, max_size=2 * 1024 ** 3, access_flush_interval=10000):
+        self.namespace = namespace
+        self.max_size = max_size
+        # Key --> last access time of looked up embeddings, which is not yet written to sqlite
+        self.accessed_keys = {}
+        self.access_flush_interval = access_flush_interval
+        self.path_to_cache = path_to_cache if path_to_cache is not None else determine_path_to_embedding_cache()
+
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.path_to_cache, timeout=60, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS embeddings '
+                                '(key TEXT PRIMARY KEY, embedding BLOB, last_access REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)')
+        self.connection.commit()
+
+        self.size = self.connection.execute('SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings') \
+            .fetchone()[0]
+
+    def determine_key(self, entity_str):
+        return hashlib.sha1('{}\n{}'.format(self.namespace, entity_str).encode('utf-8')).hexdigest()
+
+    def get_embeddings(self, keys):
+        """Look up embeddings and return a dict key --> embedding for all found keys"""
+        found_embeddings = {}
+        unique_keys = list(set(keys))
+        with self.lock:
+            # Stay below the maximal number of sqlite variables per statement
+            for start in range(0, len(unique_keys), 500):
+                key_chunk = unique_keys[start:start + 500]
+                placeholders = ','.join(['?'] * len(key_chunk))
+                for key, embedding in self.connection.execute(
+                        'SELECT key, embedding FROM embeddings WHERE key IN ({})'.format(placeholders), key_chunk):
+                    found_embeddings[key] = np.frombuffer(embedding, dtype='float32')
+
+            # Lookups do not write - access times are flushed with the next write
+            now = time.time()
+            self.accessed_keys.update((key, now) for key in found_embeddings)
+            if len(self.accessed_keys) >= self.access_flush_interval:
+                self.flush_access_times()
+                self.connection.commit()
+
+        return found_embeddings
+
+    def flush_access_times(self):
+        """Write the access times of looked up embeddings - The caller commits"""
+        with self.lock:
+            if len(self.accessed_keys) > 0:
+                self.connection.executemany('UPDATE embeddings SET last_access = ? WHERE key = ?',
+                                            [(last_access, key) for key, last_access in self.accessed_keys.items()])
+                self.accessed_keys = {}
+
+    def determine_stored_size(self, keys):
+        """Size of the stored embeddings of the keys"""
+        size = 0
+        for start in range(0, len(keys), 500):
+            key_chunk = keys[start:start + 500]
+            placeholders = ','.join(['?'] * len(key_chunk))
+            size += self.connection.execute('SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings '
+                                            'WHERE key IN ({})'.format(placeholders), key_chunk).fetchone()[0]
+        return size
+
+    def add_embeddings(self, keys, embeddings):
+        now = time.time()
+        # The last embedding of a key is stored
+        rows = {key: (key, np.asarray(embedding, dtype='float32').tobytes(), now)
+                for key, embedding in zip(keys, embeddings)}
+        with self.lock:
+            # Replaced embeddings only change the size by the difference of the blobs
+            replaced_size = self.determine_stored_size(list(rows))
+            self.flush_access_times()
+            self.connection.executemany('INSERT OR REPLACE INTO embeddings (key, embedding, last_access) '
+                                        'VALUES (?, ?, ?)', rows.values())
+            self.connection.commit()
+
+            self.size += sum([len(row[1]) for row in rows.values()]) - replaced_size
+            if self.size > self.max_size:
+                self.evict()
+
+    def close(self):
+        with self.lock:
+            self.flush_access_times()
+            self.connection.commit()
+            self.connection.close()
+
+    def evict(self):
+        """Evict least recently used embeddings until the cache uses at most 90% of its maximal size"""
+        with self.lock:
+            self.flush_access_times()
+            self.connection.commit()
+            no_embeddings, size = self.connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings').fetchone()
+            if no_embeddings == 0:
+                self.size = 0
+                return
+
+            no_evictions = int((size - 0.9 * self.max_size) / (size / no_embeddings)) + 1
+            if no_evictions > 0:
+                self.connection.execute('DELETE FROM embeddings WHERE key IN '
+                                        '(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)', (no_evictions,))
+                self.connection.commit()
+                logging.getLogger().info('Evicted {} embeddings from cache {}'.format(no_evictions,
+                                                                                    self.path_to_cache))
+
+            self.size = self.connection.execute('SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM embeddings') \
+                .fetchone()[0]
+
+    def get_or_encode(self, entity_strs, encode_function):
+        """Return embeddings of the entity strings - Only strings that are not cached are encoded
+            :param encode_function function that encodes a list of strings and returns a 2D numpy array
+            :return 2D numpy array of embeddings in the order of the entity strings"""
+        keys = [self.determine_key(entity_str) for entity_str in entity_strs]
+        embeddings = self.get_embeddings(keys)
+
+        # Encode every missing string only once
+        missing_keys = []
+        missing_keys_set = set()
+        missing_entity_strs = []
+        for key, entity_str in zip(keys, entity_strs):
+            if key not in embeddings and key not in missing_keys_set:
+                missing_keys_set.add(key)
+                missing_keys.append(key)
+                missing_entity_strs.append(entity_str)
+
+        if len(missing_entity_strs) > 0:
+            new_embeddings = np.asarray(encode_function(missing_entity_strs), dtype='float32')
+            new_embeddings = new_embeddings.reshape(len(missing_entity_strs), -1)
+            self.add_embeddings(missing_keys, new_embeddings)
+            embeddings.update(zip(missing_keys, new_embeddings))
+
+        logging.getLogger().debug('Found {} of {} embeddings in cache'.format(len(keys) - len(missing_keys), len(keys)))
+
+        return np.stack([embeddings[key] for key in keys])
@@ -5,9 +5,12 @@ import numpy as np
 import random
 import torch
 from transformers import AutoTokenizer, AutoModel
+from transformers.modeling_outputs import BaseModelOutput
 
 import torch.nn.functional as F
 
+from src.strategy.model_registry import load_shared_model
+from src.strategy.open_book.onnx_inference import OnnxModel, determine_path_to_onnx_model
 from src.strategy.open_book.retrieval.encoding.bi_encoder import BiEncoder
 
 
@@ -25,7 +28,7 @@ def select_pooled_output(inputs, outputs, pooling, normalize):
         # Necessary for cosine similarity
         pooled_output = F.normalize(pooled_output, p=2, dim=1)
 
-    return pooled_output.squeeze().tolist()
+    return pooled_output
 
 
 # Mean Pooling - Take attention mask into account for correct averaging - Inspired by s-bert
@@ -35,7 +38,7 @@ def mean_pooling(token_embeddings, attention_mask):
 
 
 class HuggingfaceBiEncoder(BiEncoder):
-    def __init__(self, model_name, pooling, normalize, schema_org_class):
+    def __init__(self, model_name, pooling, normalize, schema_org_class, inference_backend='pytorch'):
         """Initialize Entity Biencoder"""
         super().__init__(schema_org_class)
 
@@ -66,8 +69,17 @@ class HuggingfaceBiEncoder(BiEncoder):
                 model.save_pretrained(model_path)
                 tokenizer.save_pretrained(model_path)
 
-            self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-            self.model = AutoModel.from_pretrained(model_path).to(self.device)
+            self.tokenizer = load_shared_model(('tokenizer', model_path),
+                                               lambda: AutoTokenizer.from_pretrained(model_path), self)
+            if inference_backend == 'pytorch':
+                self.model = load_shared_model(('auto_model', model_path, str(self.device)),
+                                               lambda: AutoModel.from_pretrained(model_path).to(self.device), self)
+            else:
+                # Exported graphs run on CPU with ONNX Runtime
+                self.device = torch.device('cpu')
+                path_to_onnx_model = determine_path_to_onnx_model(model_path, inference_backend)
+                self.model = load_shared_model(('onnx_model', path_to_onnx_model),
+                                               lambda: OnnxModel(path_to_onnx_model, BaseModelOutput), self)
 
     def encode_entity(self, entity, excluded_attributes=None):
         """Encode the provided entity"""
@@ -86,6 +98,10 @@ class HuggingfaceBiEncoder(BiEncoder):
         entity_strs = [self.entity_serializer.convert_to_str_representation(entity, excluded_attributes)
                        for entity in entities]
 
+        return self.encode_entity_strs(entity_strs)
+
+    def encode_entity_strs(self, entity_strs):
+        """Encode the provided serialized entities"""
         inputs = self.tokenizer(entity_strs, return_tensors='pt', padding=True,
                                 truncation=True, max_length=128).to(self.device)
         with torch.no_grad():
@@ -93,9 +109,9 @@ class HuggingfaceBiEncoder(BiEncoder):
 
         return inputs, outputs
 
-    def encode_entities_and_return_pooled_outputs(self, entity, excluded_attributes=None):
-        inputs, outputs = self.encode_entities(entity, excluded_attributes)
+    def encode_entity_strs_and_return_pooled_outputs(self, entity_strs):
+        inputs, outputs = self.encode_entity_strs(entity_strs)
 
         pooled_output = select_pooled_output(inputs, outputs, self.pooling, self.normalize)
 
-        return pooled_output
+        return pooled_output.cpu().numpy()
@@ -6,6 +6,7 @@ import torch
 from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer, AutoModel
 
+from src.strategy.model_registry import load_shared_model
 from src.strategy.open_book.retrieval.encoding.bi_encoder import BiEncoder
 
 
@@ -41,7 +42,8 @@ class SBERTBiEncoder(BiEncoder):
                 model.save_pretrained(model_path)
                 tokenizer.save_pretrained(model_path)
 
-            self.model = SentenceTransformer(model_path).to(self.device)
+            self.model = load_shared_model(('sentence_transformer', model_path, str(self.device)),
+                                           lambda: SentenceTransformer(model_path).to(self.device), self)
 
     def encode_entity(self, entity, excluded_attributes=None):
         """Encode the provided entity"""
@@ -58,15 +60,19 @@ class SBERTBiEncoder(BiEncoder):
         entity_strs = [self.entity_serializer.convert_to_str_representation(entity, excluded_attributes)
                        for entity in entities]
 
+        return self.encode_entity_strs(entity_strs)
+
+    def encode_entity_strs(self, entity_strs):
+        """Encode the provided serialized entities"""
         inputs = None
         with torch.no_grad():
             outputs = self.model.encode(entity_strs, show_progress_bar=False, normalize_embeddings=self.normalize)
 
         return inputs, outputs
 
-    def encode_entities_and_return_pooled_outputs(self, entity, excluded_attributes=None):
-        inputs, outputs = self.encode_entities(entity, excluded_attributes)
+    def encode_entity_strs_and_return_pooled_outputs(self, entity_strs):
+        inputs, outputs = self.encode_entity_strs(entity_strs)
 
         # Train SBert models always with poolings, hence no additional pooling is necessary
 
-        return outputs.squeeze().tolist()
+        return outputs
@@ -7,11 +7,14 @@ import torch
 from transformers import AutoTokenizer, AutoModel
 
 from src.finetuning.open_book.contrastive.models.modeling import ContrastiveModel
+from src.strategy.model_registry import load_shared_model
+from src.strategy.open_book.onnx_inference import OnnxModel, determine_path_to_onnx_model
 from src.strategy.open_book.retrieval.encoding.bi_encoder import BiEncoder
 
 
 class SupConBiEncoder(BiEncoder):
-    def __init__(self, model_name, base_model, with_projection, pooling, normalize, schema_org_class):
+    def __init__(self, model_name, base_model, with_projection, pooling, normalize, schema_org_class,
+                 inference_backend='pytorch'):
         """Initialize Entity Biencoder"""
         super().__init__(schema_org_class)
 
@@ -24,6 +27,7 @@ class SupConBiEncoder(BiEncoder):
 
         self.pooling = pooling
         self.normalize = normalize
+        self.inference_backend = inference_backend
 
         # Initialize tokenizer and model for BERT if necessary
         if model_name is not None:
@@ -42,10 +46,23 @@ class SupConBiEncoder(BiEncoder):
                 model.save_pretrained(model_path)
                 tokenizer.save_pretrained(model_path)
 
-            self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+            self.tokenizer = load_shared_model(('tokenizer', model_path),
+                                               lambda: AutoTokenizer.from_pretrained(model_path), self)
             # Note: Normalization + pooling happen in the model
-            self.model = ContrastiveModel(len_tokenizer=len(self.tokenizer), model=base_model, with_proj=with_projection).to(self.device)
-            self.model.load_state_dict(torch.load('{}/pytorch_model.bin'.format(model_path), map_location=torch.device(self.device)))
+            if inference_backend == 'pytorch':
+                def load_contrastive_model():
+                    model = ContrastiveModel(len_tokenizer=len(self.tokenizer), model=base_model, with_proj=with_projection).to(self.device)
+                    model.load_state_dict(torch.load('{}/pytorch_model.bin'.format(model_path), map_location=torch.device(self.device)))
+                    return model
+
+                self.model = load_shared_model(('contrastive_model', model_path, base_model, with_projection,
+                                                str(self.device)), load_contrastive_model, self)
+            else:
+                # Exported graphs run on CPU with ONNX Runtime
+                self.device = torch.device('cpu')
+                path_to_onnx_model = determine_path_to_onnx_model(model_path, inference_backend)
+                self.model = load_shared_model(('onnx_model', path_to_onnx_model),
+                                               lambda: OnnxModel(path_to_onnx_model), self)
 
     def encode_entity(self, entity, excluded_attributes=None):
         """Encode the provided entity"""
@@ -54,25 +71,31 @@ class SupConBiEncoder(BiEncoder):
         inputs = self.tokenizer(entity_str, return_tensors='pt', padding=True,
                                 truncation=True, max_length=128).to(self.device)
 
-        with torch.no_grad():
-            outputs = self.model(input_ids=inputs['input_ids'], attention_mask=inputs['attention_mask'])
-
-        return inputs, outputs[1]
+        return inputs, self.pool_entities(inputs)
 
     def encode_entities(self, entities, excluded_attributes=None):
         """Encode the provided entities"""
         entity_strs = [self.entity_serializer.convert_to_str_representation(entity, excluded_attributes)
                        for entity in entities]
 
+        return self.encode_entity_strs(entity_strs)
+
+    def encode_entity_strs(self, entity_strs):
+        """Encode the provided serialized entities"""
         inputs = self.tokenizer(entity_strs, return_tensors='pt', padding=True,
                                 truncation=True, max_length=128).to(self.device)
 
+        return inputs, self.pool_entities(inputs)
+
+    def pool_entities(self, inputs):
+        """Run the model and return the pooled & normalized entity representations"""
         with torch.no_grad():
             outputs = self.model(input_ids=inputs['input_ids'], attention_mask=inputs['attention_mask'])
 
-        return inputs, outputs[1]
+        # The exported graph only returns the pooled output
+        return outputs[1] if self.inference_backend == 'pytorch' else outputs[0]
 
-    def encode_entities_and_return_pooled_outputs(self, entity, excluded_attributes=None):
-        inputs, outputs = self.encode_entities(entity, excluded_attributes)
+    def encode_entity_strs_and_return_pooled_outputs(self, entity_strs):
+        inputs, outputs = self.encode_entity_strs(entity_strs)
 
-        return outputs.squeeze().tolist()
+        return outputs.cpu().numpy()
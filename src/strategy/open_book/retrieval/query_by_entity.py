@@ -7,25 +7,46 @@ from src.strategy.open_book.retrieval.retrieval_strategy import RetrievalStrateg
 
 class QueryByEntity(RetrievalStrategy):
 
-    def __init__(self, schema_org_class, clusters=False, rank_evidences_by_table=False):
+    def __init__(self, schema_org_class, clusters=False, rank_evidences_by_table=False, batch_size=50):
         name = 'query_by_entity' if not rank_evidences_by_table else 'query_by_entity_rank_by_table'
         super().__init__(schema_org_class, name, clusters=clusters)
         self.rank_evidences_by_table = rank_evidences_by_table
         self.model_name = 'BM25'
+        # Number of row queries that are sent to ES within a single _msearch request
+        self.batch_size = batch_size
+
+    def select_rows(self, query_table, entity_id):
+        return [row for row in query_table.table
+                if entity_id is None or entity_id == row['entityId'] or self.rank_evidences_by_table]
 
     def retrieve_evidence(self, query_table, evidence_count, entity_id):
+        rows = self.select_rows(query_table, entity_id)
+
+        # Send the queries of all rows in batches to ES - The results keep the order of the rows
+        index_name = determine_es_index_name(self.schema_org_class, clusters=self.clusters)
+        entity_results = self.query_tables_index_multi(rows, query_table.context_attributes, evidence_count,
+                                                       index_name, self.batch_size)
+
+        return self.collect_evidences(query_table, rows, entity_results)
+
+    async def retrieve_evidence_async(self, query_table, evidence_count, entity_id):
+        rows = self.select_rows(query_table, entity_id)
+
+        # All batches of row queries are in flight concurrently
+        index_name = determine_es_index_name(self.schema_org_class, clusters=self.clusters)
+        entity_results = await self.query_tables_index_multi_async(rows, query_table.context_attributes,
+                                                                   evidence_count, index_name, self.batch_size)
+
+        return self.collect_evidences(query_table, rows, entity_results)
+
+    def collect_evidences(self, query_table, rows, entity_results):
+        """Convert the search results of the rows to evidences"""
         logger = logging.getLogger()
         evidence_id = 1
         evidences = []
 
         # Iterate through query table
-        for row in query_table.table:
-
-            if entity_id is not None and entity_id != row['entityId'] and not self.rank_evidences_by_table:
-                continue
-
-            index_name = determine_es_index_name(self.schema_org_class, clusters=self.clusters)
-            entity_result = self.query_tables_index(row, query_table.context_attributes, evidence_count,index_name)
+        for row, entity_result in zip(rows, entity_results):
             logger.info('Found {} results for entity {} of query table {}!'.format(len(entity_result['hits']['hits']),
                                                                                     row['entityId'],
                                                                                     query_table.identifier))
@@ -45,7 +66,7 @@ class QueryByEntity(RetrievalStrategy):
 
                 if query_table.type == 'retrieval':
                     evidence = RetrievalEvidence(evidence_id, query_table.identifier, row['entityId'],
-                                                 table_name, rowId, hit['_source'], found_value, query_table.target_attribute)
+                                                 table_name, rowId, hit['_source'])
                 elif query_table.type == 'augmentation':
                     evidence = AugmentationEvidence(evidence_id, query_table.identifier, row['entityId'], table_name,
                                                     rowId,  hit['_source'], found_value, query_table.target_attribute)
@@ -14,10 +14,9 @@ class QueryByGoldStandard(RetrievalStrategy):
 
         # Early on filter by ground truth tables to retrieve as many evidences as possible
         evidences = []
-        verified_evidences = self.filter_evidences_by_ground_truth_tables(query_table.verified_evidences)
-
         for row in query_table.table:
-            new_evidences = [evidence for evidence in verified_evidences if evidence.entity_id == row['entityId']]
+            new_evidences = self.filter_evidences_by_ground_truth_tables(
+                query_table.get_verified_evidences(row['entityId']))
             evidences.extend(new_evidences[:evidence_count])
 
         #Retrieve contexts of verified evidences
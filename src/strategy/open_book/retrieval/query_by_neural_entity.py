@@ -1,18 +1,22 @@
 import logging
-import os
 
 import faiss
 import numpy as np
 
 from src.model.evidence_new import RetrievalEvidence, AugmentationEvidence
+from src.strategy.model_registry import load_shared_model
 from src.strategy.open_book.es_helper import determine_es_index_name
+from src.strategy.open_book.indexing.faiss_collector import determine_path_to_faiss_index, set_faiss_search_parameters
+from src.strategy.open_book.indexing.faiss_entity_store import EntityStore, entity_store_exists
 from src.strategy.open_book.retrieval.encoding.bi_encoder_factory import select_bi_encoder
 from src.strategy.open_book.retrieval.retrieval_strategy import RetrievalStrategy
 
 
 class QueryByNeuralEntity(RetrievalStrategy):
 
-    def __init__(self, schema_org_class, bi_encoder_name, clusters, model_name, base_model, with_projection, pooling, similarity):
+    def __init__(self, schema_org_class, bi_encoder_name, clusters, model_name, base_model, with_projection, pooling,
+                 similarity, index_type='flat', nprobe=None, ef_search=None, inference_backend='pytorch',
+                 embedding_cache=False):
         super().__init__(schema_org_class, 'query_by_neural_entity', clusters=clusters)
 
         logger = logging.getLogger()
@@ -23,22 +27,44 @@ class QueryByNeuralEntity(RetrievalStrategy):
         normalize = self.similarity == 'cos'
         bi_encoder_config = {'name': bi_encoder_name, 'model_name': model_name, 'base_model': base_model,
                              'with_projection': with_projection, 'pooling': pooling,
-                             'normalize': normalize}
+                             'normalize': normalize, 'inference_backend': inference_backend,
+                             'embedding_cache': embedding_cache}
         self.entity_biencoder = select_bi_encoder(bi_encoder_config, schema_org_class)
 
         self.rank_evidences_by_table = False
 
-        # Load entity representations - TO-DO: Move to central method!
-        if self.clusters:
-            path_to_faiss_index = '{}/faiss/{}_faiss_{}_{}_{}_with_clusters.index'.format(os.environ['DATA_DIR'], schema_org_class,
-                                                                            model_name.replace('/', ''), pooling,
-                                                                            similarity)
+        # Load entity representations
+        path_to_faiss_index = determine_path_to_faiss_index(schema_org_class, model_name, pooling, similarity,
+                                                            self.clusters, index_type)
+        def load_faiss_index():
+            logger.info('Load Faiss index from {}'.format(path_to_faiss_index))
+            index = faiss.read_index(path_to_faiss_index)
+
+            # Query time parameters of approximate indices - Trade recall for speed
+            if index_type != 'flat':
+                set_faiss_search_parameters(index, nprobe, ef_search)
+            return index
+
+        # Search parameters are set on the index, hence they are part of the key
+        self.index = load_shared_model(('faiss_index', path_to_faiss_index, nprobe, ef_search), load_faiss_index, self)
+
+        # Hydrate hits from the entity store of the index if available - Fall back to ES otherwise
+        self.entity_store = None
+        if entity_store_exists(path_to_faiss_index):
+            logger.info('Load entity store of faiss index {}'.format(path_to_faiss_index))
+            self.entity_store = load_shared_model(('faiss_entity_store', path_to_faiss_index),
+                                                  lambda: EntityStore(path_to_faiss_index), self)
         else:
-            path_to_faiss_index = '{}/faiss/{}_faiss_{}_{}_{}.index'.format(os.environ['DATA_DIR'], schema_org_class,
-                                                                        model_name.replace('/', ''), pooling,
-                                                                        similarity)
-        logger.info('Load Faiss index from {}'.format(path_to_faiss_index))
-        self.index = faiss.read_index(path_to_faiss_index)
+            logger.info('No entity store found for faiss index {} - Hits are retrieved from ES'
+                        .format(path_to_faiss_index))
+
+    def retrieve_hits_by_faiss_ids(self, ids, index_name):
+        """Retrieve the entities of the provided faiss ids in the order of the ids"""
+        if self.entity_store is not None:
+            return [{'_id': str(identifier), '_source': entity}
+                    for identifier, entity in zip(ids, self.entity_store.get_entities(ids)) if entity is not None]
+
+        return self.query_tables_index_by_id(ids, index_name)['hits']['hits']
 
     # Apply Bi-Encoder
     def retrieve_evidence(self, query_table, evidence_count, entity_id):
@@ -67,8 +93,11 @@ class QueryByNeuralEntity(RetrievalStrategy):
                     raise ValueError('Query Table Type {} is not defined!'.format(query_table.type))
                 entity_vectors.append(pooled_output) # DO NOT CHANGE ORDER OF THIS LIST!
 
-        # Query Faiss index
-        entity_vectors = np.array(entity_vectors).astype('float32')
+        if len(entity_vectors) == 0:
+            return evidences
+
+        # Query Faiss index - faiss expects one row per entity, also for a single entity
+        entity_vectors = np.array(entity_vectors, dtype='float32').reshape(len(entity_vectors), -1)
         D, I = self.index.search(entity_vectors, evidence_count * 5)
 
         # Determine ES Index name
@@ -76,12 +105,17 @@ class QueryByNeuralEntity(RetrievalStrategy):
 
         for i in range(0, len(I)):
 
-            entity_result = self.query_tables_index_by_id(I[i], index_name)
-
-            hits = entity_result['hits']['hits']
+            hits = self.retrieve_hits_by_faiss_ids(I[i], index_name)
+            # Map faiss ids to distances once per row - faiss marks missing neighbours with id -1
+            id_to_distance = {identifier: distance for identifier, distance in zip(I[i].tolist(), D[i].tolist())
+                              if identifier >= 0}
+            no_missing_hits = len(id_to_distance) - len(hits)
+            if no_missing_hits > 0:
+                logger.debug('Could not retrieve {} of {} faiss hits for row {}'.format(no_missing_hits,
+                                                                                       len(id_to_distance), i))
             # Uncomment following block to make sure that all hits contain the target attribute
             #hits = \
-            #    list(filter(lambda hit: query_table.target_attribute in hit['_source'], entity_result['hits']['hits']))
+            #    list(filter(lambda hit: query_table.target_attribute in hit['_source'], hits))
 
             for hit in hits[:evidence_count]:
                 found_value = None
@@ -102,15 +136,11 @@ class QueryByNeuralEntity(RetrievalStrategy):
                     raise ValueError('Query Table Type {} is not defined!'.format(query_table.type))
 
                 # Determine similarity
-                similarity_not_found = True
-                for distance, instance in zip(D[i], I[i]):
-                    if int(instance) == int(hit['_id']):
-                        evidence.scores[self.name] = distance.item()
-                        evidence.similarity_score = distance.item()
-                        similarity_not_found = False
-                        break
-
-                if similarity_not_found:
+                distance = id_to_distance.get(int(hit['_id']))
+                if distance is not None:
+                    evidence.scores[self.name] = distance
+                    evidence.similarity_score = distance
+                else:
                     logger.warning('Could not find similarity score for entity {} in faiss index!'.format(hit['_id']))
 
                 evidences.append(evidence)
@@ -1,8 +1,11 @@
+import asyncio
 import logging
 import os
 import json
 
-from elasticsearch import Elasticsearch
+from elasticsearch.exceptions import HTTP_EXCEPTIONS, TransportError
+
+from src.strategy.open_book.es_helper import get_es_client, get_async_es_client
 
 
 def load_ground_truth_tables_for_filtering(schema_org_class):
@@ -27,9 +30,8 @@ class RetrievalStrategy:
         self.name = name
         self.clusters = clusters
 
-        # Connect to Elasticsearch
-        elastic_instance = os.environ['ES_INSTANCE']
-        self._es = Elasticsearch([{'host': elastic_instance, 'port': 9200}])
+        # Share one pooled Elasticsearch client per process
+        self._es = get_es_client()
 
         self.path_to_table_corpus = '{}corpus/'.format(os.environ['DATA_DIR'])
 
@@ -49,13 +51,24 @@ class RetrievalStrategy:
 
         raise NotImplementedError('Method not implemented!')
 
+    def retrieve_evidence_of_entity(self, query_table, evidence_count, entity_id):
+        """Retrieve evidences of a single entity - Only the row of the entity is sent to the strategy"""
+        return self.retrieve_evidence(query_table.project_to_entity(entity_id), evidence_count, None)
+
+    async def retrieve_evidence_async(self, query_table, evidence_count, entity_id):
+        """Asynchronous variant of retrieve_evidence
+            - Strategies without asynchronous ES requests run retrieve_evidence in a thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.retrieve_evidence, query_table, evidence_count, entity_id)
+
     def filter_evidences_by_ground_truth_tables(self, evidences):
         filtered_evidences = [evidence for evidence in evidences
                               if evidence.table not in self.ground_truth_tables]
 
         return filtered_evidences
 
-    def query_tables_index(self, row, context_attributes, evidence_count, index, target_attribute=None):
+    def build_entity_query_body(self, row, context_attributes, evidence_count, target_attribute=None):
+        """Build the bool query body that retrieves entities similar to the provided row"""
         # TO-DO: Check for context attributes!
         matching_attributes = (attribute for attribute in row.keys()
                                if attribute != 'entityId'
@@ -88,8 +101,68 @@ class RetrievalStrategy:
                 }
         }
 
+        return query_body
+
+    def query_tables_index(self, row, context_attributes, evidence_count, index, target_attribute=None):
+        query_body = self.build_entity_query_body(row, context_attributes, evidence_count, target_attribute)
+
         return self._es.search(body=json.dumps(query_body), index=index, request_timeout=60)
 
+    def query_tables_index_multi(self, rows, context_attributes, evidence_count, index, batch_size,
+                                 target_attribute=None):
+        """Query the index for multiple rows at once using the _msearch API
+            :param rows list of query table rows
+            :param batch_size maximal number of queries that are sent within a single _msearch request
+            :return list of search results - one result per row in the order of the provided rows
+        """
+        entity_results = []
+        for start in range(0, len(rows), batch_size):
+            request_body = self.build_multi_search_body(rows[start:start + batch_size], context_attributes,
+                                                        evidence_count, index, target_attribute)
+            multi_search_result = self._es.msearch(body=request_body, index=index, request_timeout=60)
+            entity_results.extend(self.collect_multi_search_responses(multi_search_result))
+
+        return entity_results
+
+    async def query_tables_index_multi_async(self, rows, context_attributes, evidence_count, index, batch_size,
+                                             target_attribute=None):
+        """Asynchronous variant of query_tables_index_multi - All batches are in flight concurrently"""
+        es_async = get_async_es_client()
+        requests = [es_async.msearch(body=self.build_multi_search_body(rows[start:start + batch_size],
+                                                                       context_attributes, evidence_count, index,
+                                                                       target_attribute),
+                                     index=index, request_timeout=60)
+                    for start in range(0, len(rows), batch_size)]
+
+        entity_results = []
+        for multi_search_result in await asyncio.gather(*requests):
+            entity_results.extend(self.collect_multi_search_responses(multi_search_result))
+
+        return entity_results
+
+    def build_multi_search_body(self, rows, context_attributes, evidence_count, index, target_attribute=None):
+        request_body = []
+        for row in rows:
+            request_body.append({'index': index})
+            request_body.append(self.build_entity_query_body(row, context_attributes, evidence_count,
+                                                             target_attribute))
+
+        # _msearch expects newline delimited json
+        return '\n'.join([json.dumps(line) for line in request_body]) + '\n'
+
+    def collect_multi_search_responses(self, multi_search_result):
+        """Collect the search results of all rows - A failed row raises the error a single search would raise"""
+        entity_results = []
+        for entity_result in multi_search_result['responses']:
+            if 'error' in entity_result:
+                status = entity_result.get('status', 500)
+                error = entity_result['error']
+                error_type = error.get('type', str(error)) if isinstance(error, dict) else str(error)
+                raise HTTP_EXCEPTIONS.get(status, TransportError)(status, error_type, entity_result)
+            entity_results.append(entity_result)
+
+        return entity_results
+
     def query_tables_index_by_table_row_id(self, table, row_id, index):
         # To-Do: Do not analyze table and row_id during indexing to enable exact matches
         query_body = {
@@ -167,33 +240,28 @@ class RetrievalStrategy:
         search_result = self._es.search(body=json.dumps(query_body), index=index, request_timeout=60)
         return search_result['hits']['hits']
 
-    def query_tables_index_by_id(self, ids, index):
-        query_body = {
-            'size': len(ids),
-            'query': {
-                'terms': {
-                    '_id': [str(identifier) for identifier in ids]
-                }
-            }
-        }
-        sorted_hits = []
-        query_results = self._es.search(body=json.dumps(query_body), index=index, request_timeout=60)
-
-        hits = query_results['hits']['hits'].copy()
-        for identifier in ids:
-            found_hit = None
-            for hit in hits:
-                if str(identifier) == hit['_id']:
-                    found_hit = hit
-                    sorted_hits.append(hit)
-                    break
+    def query_tables_index_by_id(self, ids, index, source_includes=None):
+        """Fetch entities by their ES ids using the _mget API
+            :param ids list of ES document ids
+            :param source_includes optional list of fields that are returned as part of the _source
+            :return search result like structure - hits are sorted in the order of the provided ids
+        """
+        params = {}
+        if source_includes is not None:
+            params['_source_includes'] = ','.join(source_includes)
 
-            if found_hit is not None:
-                hits.remove(found_hit)
+        query_body = {'ids': [str(identifier) for identifier in ids]}
+        query_results = self._es.mget(body=json.dumps(query_body), index=index, request_timeout=60, params=params)
 
-        query_results['hits']['hits'] = sorted_hits
-        return query_results
+        # _mget returns documents in request order - drop ids that are not part of the index
+        found_ids = set()
+        sorted_hits = []
+        for doc in query_results['docs']:
+            if doc.get('found') and doc['_id'] not in found_ids:
+                found_ids.add(doc['_id'])
+                sorted_hits.append(doc)
 
+        return {'hits': {'hits': sorted_hits}}
 
     def get_no_index_entities(self, index):
         return int(self._es.cat.count(index, params={"format": "json"})[0]['count'])
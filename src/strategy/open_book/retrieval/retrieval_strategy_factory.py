@@ -26,22 +26,37 @@ def select_retrieval_strategy(retrieval_strategy, schema_org_class, clusters):
     elif strategy_name == 'query_by_table_boolean':
         strategy_obj = QueryByTable(schema_org_class, clusters)
     elif strategy_name == 'query_by_entity':
-        strategy_obj = QueryByEntity(schema_org_class, rank_evidences_by_table=True)
+        strategy_obj = QueryByEntity(schema_org_class, rank_evidences_by_table=True,
+                                     batch_size=retrieval_strategy.get('batch_size', 50))
     elif strategy_name == 'query_by_entity_rank_by_table':
-        strategy_obj = QueryByEntity(schema_org_class, clusters, rank_evidences_by_table=True)
+        strategy_obj = QueryByEntity(schema_org_class, clusters, rank_evidences_by_table=True,
+                                     batch_size=retrieval_strategy.get('batch_size', 50))
     elif strategy_name == 'query_by_neural_entity':
         strategy_obj = QueryByNeuralEntity(schema_org_class, retrieval_strategy['bi-encoder'], clusters,
                                            retrieval_strategy['model_name'], retrieval_strategy['base_model'],
                                            retrieval_strategy['with_projection'],
-                                           retrieval_strategy['pooling'], retrieval_strategy['similarity'])
+                                           retrieval_strategy['pooling'], retrieval_strategy['similarity'],
+                                           retrieval_strategy.get('index_type', 'flat'),
+                                           retrieval_strategy.get('nprobe'), retrieval_strategy.get('ef_search'),
+                                           retrieval_strategy.get('inference_backend', 'pytorch'),
+                                           retrieval_strategy.get('embedding_cache', False))
     elif strategy_name == 'combined_retrieval_strategy':
-        # Initialize both combined retrieval strategies before handing them over to the combined retrieval strategy
-        retrieval_strategy_1 = select_retrieval_strategy(retrieval_strategy['retrieval_strategy_1'], schema_org_class, clusters)
-        retrieval_strategy_2 = select_retrieval_strategy(retrieval_strategy['retrieval_strategy_2'], schema_org_class,
-                                                         clusters)
-        strategy_obj = CombinedRetrievalStrategy(schema_org_class, retrieval_strategy_1, retrieval_strategy_2, clusters)
+        # Initialize all combined retrieval strategies before handing them over to the combined retrieval strategy
+        if 'retrieval_strategies' in retrieval_strategy:
+            child_configurations = retrieval_strategy['retrieval_strategies']
+        else:
+            child_configurations = [retrieval_strategy['retrieval_strategy_1'],
+                                    retrieval_strategy['retrieval_strategy_2']]
+        retrieval_strategies = [select_retrieval_strategy(child_configuration, schema_org_class, clusters)
+                                for child_configuration in child_configurations]
+        strategy_obj = CombinedRetrievalStrategy(schema_org_class, retrieval_strategies, clusters,
+                                                 retrieval_strategy.get('fusion', 'interleave'),
+                                                 retrieval_strategy.get('rrf_k', 60))
     elif strategy_name == 'generate_entity':
-        strategy_obj = TargetAttributeValueGenerator(schema_org_class, retrieval_strategy['model_name'], retrieval_strategy['training_data_type'])
+        strategy_obj = TargetAttributeValueGenerator(schema_org_class, retrieval_strategy['model_name'],
+                                                     retrieval_strategy['training_data_type'],
+                                                     retrieval_strategy.get('batch_size', 16),
+                                                     retrieval_strategy.get('max_new_tokens'))
     elif strategy_name == 'query_by_goldstandard':
         strategy_obj = QueryByGoldStandard(schema_org_class, clusters)
     else:
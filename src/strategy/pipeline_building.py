@@ -51,7 +51,14 @@ def build_pipelines_from_configuration(config):
                                                        'base_model': retrieval_strategy['base_model'],
                                                        'with_projection': retrieval_strategy['with_projection'],
                                                        'pooling': pooling,
-                                                       'similarity': similarity}
+                                                       'similarity': similarity,
+                                                       'index_type': retrieval_strategy.get('index_type', 'flat'),
+                                                       'nprobe': retrieval_strategy.get('nprobe'),
+                                                       'ef_search': retrieval_strategy.get('ef_search'),
+                                                       'inference_backend': retrieval_strategy.get('inference_backend',
+                                                                                                   'pytorch'),
+                                                       'embedding_cache': retrieval_strategy.get('embedding_cache',
+                                                                                                 False)}
                         pipelines.append({'retrieval_strategy': specific_retrieval_strategy,
                                           'similarity_re_ranking_strategy': similarity_re_ranking_strategy,
                                           'source_re_ranking_strategy': source_re_ranking_strategy,
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 
+import gc
 import logging
-import time
+from collections import deque
 from datetime import datetime
 from multiprocessing import Pool
 
@@ -10,8 +11,11 @@ import yaml
 from tqdm import tqdm
 
 from src.evaluation.evaluate_query_tables import evaluate_query_table
-from src.model.querytable_new import load_query_table_from_file, get_gt_tables, get_query_table_paths
+from src.model.result_sink import select_result_sink
+from src.model.querytable_new import load_query_table_from_file, get_gt_tables, get_query_table_paths, \
+    find_query_table_path
 from src.strategy.open_book.ranking.similarity.similarity_re_ranking_factory import select_similarity_re_ranker
+from src.strategy.open_book.es_helper import use_async_retrieval, run_async
 from src.strategy.open_book.ranking.source.source_re_ranking_factory import select_source_re_ranker
 from src.strategy.open_book.retrieval.retrieval_strategy_factory import select_retrieval_strategy
 from src.strategy.pipeline_building import build_pipelines_from_configuration, validate_configuration
@@ -20,8 +24,9 @@ from src.strategy.pipeline_building import build_pipelines_from_configuration, v
 @click.command()
 @click.option('--path_to_config')
 @click.option('--worker', type=int, default=0)
+@click.option('--max_in_flight', type=int, default=0, help='Maximal number of scheduled query tables - default 2 * worker')
 
-def run_experiments_from_configuration(path_to_config, worker):
+def run_experiments_from_configuration(path_to_config, worker, max_in_flight):
     logger = logging.getLogger()
 
     # Load yaml configuration
@@ -55,111 +60,135 @@ def run_experiments_from_configuration(path_to_config, worker):
     clusters = config['general']['clusters']
     #os.environ["ES_INSTANCE"] = config['general']['es_instance']
 
-    pool = None
-    async_results = None
-    if worker > 0:
-        pool = Pool(worker)
-        async_results = []
-
     file_name = 'results_{}.json'.format(string_timestamp)
+    # Write results as 'jsonl' (optionally 'gzip' or 'zstd' compressed) or 'parquet'
+    result_sink = select_result_sink(schema_org_class, file_name, config['general'].get('result_format', 'jsonl'),
+                                     config['general'].get('result_compression'))
 
     # Build pipelines from yaml configuration
     pipelines = build_pipelines_from_configuration(config)
 
-    # Start run experiments by combining pipelines and query tables
-    for pipeline in pipelines:
-        retrieval_strategy = pipeline['retrieval_strategy']
-        similarity_re_ranking_strategy = pipeline['similarity_re_ranking_strategy']
-        source_re_ranking_strategy = pipeline['source_re_ranking_strategy']
-        voting_strategies = pipeline['voting_strategies']
-
-        if worker == 0:
-            results = run_experiments(experiment_type, retrieval_strategy, similarity_re_ranking_strategy,
-                                      source_re_ranking_strategy,
-                                      voting_strategies, query_table_paths, schema_org_class, evidence_count,
-                                      context_attributes, clusters=clusters)
-            if results is not None:
-                for result in results:
-                    result.save_result(file_name, save_results_with_evidences)
-        elif worker > 0:
-            async_results.append(pool.apply_async(run_experiments, (experiment_type, retrieval_strategy,
-                                                                    similarity_re_ranking_strategy,
-                                                                    source_re_ranking_strategy, voting_strategies,
-                                                                    query_table_paths, schema_org_class, evidence_count,
-                                                                    context_attributes, clusters)))
-
-    if worker > 0:
-        logger.info('Waiting for all experiments to finish!')
-
-        while len(async_results) > 0:
-            logger.info('Number of chunks: {}'.format(len(async_results)))
-            time.sleep(5)
-            async_results = collect_results_of_finished_experiments(async_results, file_name,
-                                                                    save_results_with_evidences)
-
-        logger.info('Finished running experiments!')
-
-
-def run_experiments(experiment_type, retrieval_str_conf, similarity_re_ranking_str_conf, source_re_ranking_str_conf,
-                    voting_strategies, query_table_paths, schema_org_class, evidence_count, context_attributes=None, clusters=False):
-    """Run Pipeline on query tables"""
-
-    logger = logging.getLogger()
-    # Initialize strategy
-    retrieval_strategy = select_retrieval_strategy(retrieval_str_conf, schema_org_class, clusters)
-
-    #similarity_re_ranker = select_similarity_re_ranker(similarity_re_ranking_str_conf, schema_org_class,
-    #                                                   context_attributes)
-    source_re_ranker = select_source_re_ranker(source_re_ranking_str_conf, schema_org_class)
-    logger.info('Run experiments on {} query tables'.format(len(query_table_paths)))
+    # Start run experiments by combining pipelines and query tables - one work unit per pipeline and query table
+    work_units = [(experiment_type, pipeline_number, pipeline, query_table_path, schema_org_class, evidence_count,
+                   context_attributes, clusters)
+                  for pipeline_number, pipeline in enumerate(pipelines)
+                  for query_table_path in query_table_paths]
+    logger.info('Run {} pipelines on {} query tables'.format(len(pipelines), len(query_table_paths)))
+
+    if max_in_flight <= 0:
+        max_in_flight = 2 * worker
+    with result_sink:
+        schedule_work_units(work_units, worker, max_in_flight, result_sink, save_results_with_evidences)
+
+    logger.info('Finished running experiments!')
+
+
+def schedule_work_units(work_units, worker, max_in_flight, result_sink, with_evidences=False):
+    """Run work units and save the results of every query table as soon as they are available
+        - Results are saved in the order of the work units
+        - At most max_in_flight work units are scheduled on the worker pool at the same time"""
+    if worker == 0:
+        for work_unit in tqdm(work_units):
+            save_results(run_experiment_on_query_table(*work_unit), result_sink, with_evidences)
+        return
+
+    with Pool(worker) as pool:
+        in_flight = deque()
+        with tqdm(total=len(work_units)) as progress_bar:
+            for work_unit in work_units:
+                in_flight.append(pool.apply_async(run_experiment_on_query_table, work_unit))
+                if len(in_flight) >= max_in_flight:
+                    # Wait for the oldest work unit before scheduling the next one
+                    save_results(in_flight.popleft().get(), result_sink, with_evidences)
+                    progress_bar.update(1)
+
+            while len(in_flight) > 0:
+                save_results(in_flight.popleft().get(), result_sink, with_evidences)
+                progress_bar.update(1)
+
+
+def save_results(results, result_sink, with_evidences=False):
+    if results is not None:
+        for result in results:
+            result_sink.write_result(result, with_evidences)
+
+
+# Initialized components of the current pipeline of this process by pipeline number
+pipeline_components = {}
+
+
+def initialize_pipeline(pipeline_number, pipeline, schema_org_class, context_attributes=None, clusters=False):
+    """Initialize the strategies of a pipeline once per process
+        - Only the components of the current pipeline are kept. Work units are ordered by pipeline,
+          hence a process switches pipelines rarely and unused models can be evicted by the model registry."""
+    if pipeline_number not in pipeline_components:
+        pipeline_components.clear()
+        gc.collect()
+
+        retrieval_strategy = select_retrieval_strategy(pipeline['retrieval_strategy'], schema_org_class, clusters)
+        similarity_re_ranker = select_similarity_re_ranker(pipeline['similarity_re_ranking_strategy'],
+                                                           schema_org_class, context_attributes)
+        source_re_ranker = select_source_re_ranker(pipeline['source_re_ranking_strategy'], schema_org_class)
+        pipeline_components[pipeline_number] = (retrieval_strategy, similarity_re_ranker, source_re_ranker)
+
+    return pipeline_components[pipeline_number]
+
+
+def run_experiment_on_query_table(experiment_type, pipeline_number, pipeline, query_table_path, schema_org_class,
+                                  evidence_count, context_attributes=None, clusters=False):
+    """Run a pipeline on a single query table - Work unit of run_experiments_from_configuration"""
+    retrieval_strategy, similarity_re_ranker, source_re_ranker = initialize_pipeline(pipeline_number, pipeline,
+                                                                                     schema_org_class,
+                                                                                     context_attributes, clusters)
+    query_table = load_query_table_from_file(query_table_path)
+
+    return run_pipeline_on_query_table(experiment_type, query_table, pipeline['retrieval_strategy'],
+                                       retrieval_strategy, similarity_re_ranker, source_re_ranker,
+                                       pipeline['voting_strategies'], evidence_count, context_attributes)
+
+
+def run_pipeline_on_query_table(experiment_type, query_table, retrieval_str_conf, retrieval_strategy,
+                                similarity_re_ranker, source_re_ranker, voting_strategies, evidence_count,
+                                context_attributes=None):
+    """Retrieve evidences for the query table and evaluate them
+        :return list of results"""
     results = []
+    # FIX context attributes
+    if experiment_type == 'augmentation' and context_attributes is not None:
+        if query_table.target_attribute in query_table.context_attributes:
+            return results
+        # Run experiments only on a subset of context attributes
+        removable_attributes = [attr for attr in query_table.context_attributes
+                                if attr not in context_attributes and attr != 'name']
+        for attr in removable_attributes:
+            query_table.remove_context_attribute(attr)
+
+    evidences = retrieve_evidences_with_pipeline(query_table,retrieval_strategy, evidence_count,
+                                                 similarity_re_ranker, source_re_ranker, entity_id=None)
+    logging.info(f'Number of evidences: {len(evidences)}')
+
+    if retrieval_str_conf['name'] == 'generate_entity':
+        k_intervals = [5]
+    else:
+        #k_intervals = [1, 5, 10, 20, 50, evidence_count]
+        k_intervals = [1, 2, 5, 10, 20, 30, 50]
+
+    for voting_str_conf in voting_strategies:
+        new_results = evaluate_query_table(query_table, experiment_type, retrieval_strategy, similarity_re_ranker,
+                                           source_re_ranker, evidences, k_intervals, voting_str_conf['name'])
+        results.extend(new_results)
 
-    for query_table_path in tqdm(query_table_paths):
-
-        query_table = load_query_table_from_file(query_table_path)
-        similarity_re_ranker = select_similarity_re_ranker(similarity_re_ranking_str_conf, schema_org_class, context_attributes)
-        # FIX context attributes
-        if experiment_type == 'augmentation' and context_attributes is not None:
-            if query_table.target_attribute in query_table.context_attributes:
-                continue
-            # Run experiments only on a subset of context attributes
-            removable_attributes = [attr for attr in query_table.context_attributes
-                                    if attr not in context_attributes and attr != 'name']
-            for attr in removable_attributes:
-                query_table.remove_context_attribute(attr)
-
-        evidences = retrieve_evidences_with_pipeline(query_table,retrieval_strategy, evidence_count,
-                                                     similarity_re_ranker, source_re_ranker, entity_id=None)
-        logging.info(f'Number of evidences: {len(evidences)}')
-
-        if retrieval_str_conf['name'] == 'generate_entity':
-            k_intervals = [5]
-        else:
-            #k_intervals = [1, 5, 10, 20, 50, evidence_count]
-            k_intervals = [1, 2, 5, 10, 20, 30, 50]
-
-        for voting_str_conf in voting_strategies:
-            new_results = evaluate_query_table(query_table, experiment_type, retrieval_strategy, similarity_re_ranker,
-                                               source_re_ranker, evidences, k_intervals, voting_str_conf['name'])
-            results.extend(new_results)
-        # else:
-        #     k_intervals = [5, 10, 20, 50, 70]
-        #     #k_intervals = [5, 10]
-        #
-        #     for voting_str_conf in voting_strategies:
-        #         new_results = evaluate_query_table(query_table, retrieval_strategy, similarity_re_ranker, source_re_ranker,
-        #                                        evidences, k_intervals, voting_str_conf['name'])
-        #         results.extend(new_results)
-
-    logger.info('Finished running experiments on subset of query tables!')
     return results
 
 
 def retrieve_evidences_with_pipeline(query_table, retrieval_strategy, evidence_count,
                                      similarity_re_ranker, source_re_ranker, entity_id=None, data_type='origin'):
     logger = logging.getLogger()
-    # Run retrieval strategy
-    evidences = retrieval_strategy.retrieve_evidence(query_table, evidence_count, entity_id)
+    # Run retrieval strategy - All ES requests of the query table are in flight concurrently if ES_ASYNC_RETRIEVAL is set
+    if use_async_retrieval():
+        evidences = run_async(retrieval_strategy.retrieve_evidence_async(query_table, evidence_count, entity_id))
+    else:
+        evidences = retrieval_strategy.retrieve_evidence(query_table, evidence_count, entity_id)
 
     # Filter evidences by ground truth tables
     evidences = retrieval_strategy.filter_evidences_by_ground_truth_tables(evidences)
@@ -176,25 +205,57 @@ def retrieve_evidences_with_pipeline(query_table, retrieval_strategy, evidence_c
     return evidences
 
 
-def collect_results_of_finished_experiments(async_results, file_name, with_evidences=False):
-    """Collect results and write them to file"""
-    logger = logging.getLogger()
-    collected_results = []
-    for async_result in async_results:
-        if async_result.ready():
-            results = async_result.get()
-            collected_results.append(async_result)
+def initialize_pipeline_to_retrieve_evidence(schema_org_class, retrieval_str_conf, similarity_re_ranking_str_conf,
+                                             source_re_ranking_str_conf):
+    """Initialize retrieval strategy and re-rankers - the components can be reused for many entities"""
+    #To-Do: Does it make sense to set clusters always to true?
+    retrieval_strategy = select_retrieval_strategy(retrieval_str_conf, schema_org_class, clusters=True)
+    similarity_re_ranker = select_similarity_re_ranker(similarity_re_ranking_str_conf, schema_org_class)
+    source_re_ranker = select_source_re_ranker(source_re_ranking_str_conf, schema_org_class)
+
+    return retrieval_strategy, similarity_re_ranker, source_re_ranker
+
+
+def load_query_table_to_retrieve_evidence(query_table_id, schema_org_class, context_attributes=None):
+    """Load query table by id and restrict it to the context attributes"""
+    query_table_path = find_query_table_path('retrieval', query_table_id, schema_org_class)
+    if query_table_path is None:
+        return None
+
+    return load_query_table_from_path_to_retrieve_evidence(query_table_path, context_attributes)
+
+
+def load_query_table_from_path_to_retrieve_evidence(query_table_path, context_attributes=None):
+    """Load query table from a resolved path and restrict it to the context attributes"""
+    if context_attributes is None:
+        context_attributes = ['name', 'addresslocality']
 
-            # Save query table to file
-            if results is not None:
-                logger.info('Will collect {} results now!'.format(len(results)))
-                for result in results:
-                    result.save_result(file_name, with_evidences)
+    query_table = load_query_table_from_file(query_table_path)
+    # Run experiments only on a subset of context attributes
+    removable_attributes = [attr for attr in query_table.context_attributes
+                            if attr not in context_attributes and attr != 'name']
+    for attr in removable_attributes:
+        query_table.remove_context_attribute(attr)
 
-    # Remove collected results from list of results
-    async_results = [async_result for async_result in async_results if async_result not in collected_results]
+    return query_table
 
-    return async_results
+
+def retrieve_evidences_of_entity(query_table, pipeline, entity_id, evidence_count=30):
+    """Retrieve evidences of one entity of the query table with an initialized pipeline
+        - Retrieval and re-ranking only touch the row of the entity"""
+    retrieval_strategy, similarity_re_ranker, source_re_ranker = pipeline
+    evidences = retrieval_strategy.retrieve_evidence_of_entity(query_table, evidence_count, entity_id)
+
+    # Filter evidences by ground truth tables
+    evidences = retrieval_strategy.filter_evidences_by_ground_truth_tables(evidences)
+
+    if similarity_re_ranker is not None:
+        evidences = similarity_re_ranker.re_rank_evidences_of_entity(query_table, evidences, entity_id)
+
+    if source_re_ranker is not None:
+        evidences = source_re_ranker.re_rank_evidences(query_table, evidences)
+
+    return evidences[:evidence_count]
 
 
 def run_strategy_to_retrieve_evidence(query_table_id, schema_org_class, experiment_type, retrieval_str_conf,
@@ -204,32 +265,11 @@ def run_strategy_to_retrieve_evidence(query_table_id, schema_org_class, experime
     evidence_count = 30  # Deliver 20 evidence records for now
 
     print(retrieval_str_conf)
-    #To-Do: Does it make sense to set clusters always to true?
-    retrieval_strategy = select_retrieval_strategy(retrieval_str_conf, schema_org_class, clusters=True)
-    similarity_re_ranker = select_similarity_re_ranker(similarity_re_ranking_str_conf, schema_org_class)
-    source_re_ranker = select_source_re_ranker(source_re_ranking_str_conf, schema_org_class)
-
-    query_table = None
-    context_attributes = ['name', 'addresslocality']
-
-    for gt_table in get_gt_tables(experiment_type, schema_org_class):
-        for query_table_path in get_query_table_paths('retrieval', schema_org_class, gt_table):
-            if query_table_path.endswith('_{}.json'.format(query_table_id)):
-                query_table = load_query_table_from_file(query_table_path)
-                # Run experiments only on a subset of context attributes
-                removable_attributes = [attr for attr in query_table.context_attributes
-                                        if attr not in context_attributes and attr != 'name']
-                for attr in removable_attributes:
-                    query_table.remove_context_attribute(attr)
-
-    evidences = retrieve_evidences_with_pipeline(query_table, retrieval_strategy, evidence_count,
-                                                 similarity_re_ranker, source_re_ranker, entity_id=entity_id)
-
-    # Return evidence --> (Filter for single entity)
-    requested_evidence = [evidence for evidence in evidences
-                          if evidence.entity_id == entity_id]
+    pipeline = initialize_pipeline_to_retrieve_evidence(schema_org_class, retrieval_str_conf,
+                                                        similarity_re_ranking_str_conf, source_re_ranking_str_conf)
+    query_table = load_query_table_to_retrieve_evidence(query_table_id, schema_org_class)
 
-    return requested_evidence[:evidence_count]
+    return retrieve_evidences_of_entity(query_table, pipeline, entity_id, evidence_count)
 
 
 if __name__ == '__main__':
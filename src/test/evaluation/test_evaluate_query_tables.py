@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+from src.evaluation.evaluate_query_tables import collect_ranked_evidence_statistics
+from src.model.evidence_new import AugmentationEvidence
+
+
+class TestEvaluateQueryTables(TestCase):
+
+    def test_collect_ranked_evidence_statistics(self):
+        # Setup
+        values = ['Paris', 'Berlin', 'Paris', None]
+        tables = ['table_a', 'table_b', 'table_a', 'table_c']
+        ranked_evidences = [AugmentationEvidence(i, 7, 0, table, i, {'name': 'Hyatt'}, value, 'addresslocality')
+                            for i, (value, table) in enumerate(zip(values, tables))]
+        for evidence, similarity_score in zip(ranked_evidences, [0.9, 0.6, 0.3, 0.2]):
+            evidence.similarity_score = similarity_score
+        corner_case = AugmentationEvidence(10, 7, 0, 'table_a', 0, None, 'Paris', 'addresslocality')
+        corner_case.corner_case = True
+        positive_evidence_set = {ranked_evidences[0], ranked_evidences[3]}
+        annotated_evidence_set = positive_evidence_set.union([ranked_evidences[1]])
+
+        # Test
+        statistics = collect_ranked_evidence_statistics(ranked_evidences, {1, 3, 4}, positive_evidence_set,
+                                                        annotated_evidence_set, {corner_case: True}, True,
+                                                        'simple')
+
+        self.assertEqual(set(statistics.keys()), {1, 3, 4})
+        self.assertEqual(statistics[3]['no_pos_evidences'], 1)
+        self.assertEqual(statistics[3]['no_not_annotated'], 1)
+        self.assertEqual(statistics[4]['no_pos_evidences'], 2)
+        self.assertEqual(statistics[4]['no_retrieved_corner_cases'], 1)
+        self.assertEqual(statistics[3]['tables'], ['table_a', 'table_b'])
+        self.assertEqual([evidence['row_id'] for evidence in statistics[3]['result_evidences']], [0, 1, 2])
+        self.assertEqual(statistics[3]['value_counts'][0], ('Paris', 2))
+        self.assertEqual(statistics[4]['no_values'], 3)
+        self.assertEqual(statistics[1]['value_counts'], [('Paris', 1)])
@@ -0,0 +1,33 @@
+import pickle
+from unittest import TestCase
+
+from src.model.evidence_new import AugmentationEvidence
+
+
+class TestEvidenceNew(TestCase):
+
+    def test_shared_context_and_scores(self):
+        # Setup
+        evidence = AugmentationEvidence(1, 7, 0, 'localbusiness_hotels.com', 3, {'name': 'Hyatt'}, 'Paris',
+                                        'addresslocality')
+        duplicate = AugmentationEvidence(2, 7, 0, 'localbusiness_hotels.com', 3, {'name': 'Hyatt'}, 'Paris',
+                                         'addresslocality')
+
+        # Test
+        self.assertEqual(evidence, duplicate)
+        self.assertIs(evidence.context, duplicate.context)
+
+        evidence.scores['bm25'] = 0.5
+        evidence.scores['sequence_scores'] = None
+        self.assertNotIn('sequence_scores', evidence.scores)
+        evidence.aggregate_scores_to_similarity_score()
+        self.assertEqual(evidence.similarity_score, 0.5)
+        self.assertEqual(evidence.to_json(with_evidence_context=False, without_score=False)['scores'], {'bm25': 0.5})
+
+        unpickled_evidence = pickle.loads(pickle.dumps(evidence))
+        self.assertEqual(unpickled_evidence, evidence)
+        self.assertEqual(unpickled_evidence.scores['bm25'], 0.5)
+
+        # The cached hash changes with the identifying attributes
+        duplicate.entity_id = 1
+        self.assertNotEqual(evidence, duplicate)
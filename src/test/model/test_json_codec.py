@@ -0,0 +1,74 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, mock
+
+import numpy as np
+
+from src.model.json_codec import to_camel_case, dumps, loads, save_json_file, load_json_file_with_sidecar, \
+    determine_path_to_binary_sidecar, save_binary_sidecar, load_binary_sidecar
+
+
+class TestJsonCodec(TestCase):
+
+    def test_round_trip(self):
+        # Setup
+        value = {'id': 7, 'table': [{'entityId': 0, 'name': 'Café de Flore'}], 'scale': None}
+
+        # Test
+        self.assertEqual(loads(dumps(value)), value)
+        self.assertIn('Café', dumps(value, indent=True))
+        self.assertEqual(to_camel_case('verified_evidences'), 'verifiedEvidences')
+
+    def test_binary_sidecar(self):
+        try:
+            import msgpack
+        except ImportError:
+            self.skipTest('msgpack is not installed')
+
+        # Setup
+        value = {'id': 7, 'verifiedEvidences': [{'id': 1, 'rowId': 3, 'context': {'name': 'Hyatt'}}]}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'gs_querytable_hotels_7.json')
+            save_json_file(value, path, indent=True)
+
+            # Test
+            with mock.patch.dict(os.environ, {'QUERY_TABLE_BINARY_CACHE': 'true'}):
+                self.assertEqual(load_json_file_with_sidecar(path), value)
+                self.assertTrue(os.path.isfile(determine_path_to_binary_sidecar(path)))
+                self.assertEqual(load_json_file_with_sidecar(path), value)
+
+    def test_non_finite_floats(self):
+        # Test - NaN and Infinity are written like the standard library does, independent of orjson
+        serialized_value = dumps({'precision': float('nan'), 'recall': None, 'scores': np.array([0.5, np.inf])})
+        self.assertIn('NaN', serialized_value)
+        self.assertIn('Infinity', serialized_value)
+
+        value = loads(serialized_value)
+        self.assertTrue(np.isnan(value['precision']))
+        self.assertIsNone(value['recall'])
+        self.assertEqual(value['scores'], [0.5, float('inf')])
+        self.assertEqual(loads(serialized_value.encode('utf-8'))['scores'], [0.5, float('inf')])
+
+        with self.assertRaises(ValueError):
+            loads('{"precision": nan')
+
+    def test_concurrent_binary_sidecar_writes(self):
+        try:
+            import msgpack
+        except ImportError:
+            self.skipTest('msgpack is not installed')
+
+        # Setup
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'gs_querytable_hotels_7.json')
+            values = [{'id': 7, 'table': [{'entityId': i, 'name': 'Hyatt' * 1000}] * 50} for i in range(8)]
+            save_json_file(values[0], path)
+
+            # Test - Concurrent writers do not share a temporary file
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda value: save_binary_sidecar(value, path), values * 4))
+
+            self.assertIn(load_binary_sidecar(path), values)
+            self.assertEqual(sorted(os.listdir(directory)),
+                             ['gs_querytable_hotels_7.json', 'gs_querytable_hotels_7.json.msgpack'])
@@ -0,0 +1,81 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.model.json_codec import save_json_file
+from src.model.querytable_catalog import QueryTableCatalog
+
+
+class TestQueryTableCatalog(TestCase):
+
+    def test_incremental_refresh(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Setup
+            path_to_gt_table = '{}/localbusiness/retrieval/hotels'.format(directory)
+            os.makedirs(path_to_gt_table)
+            os.makedirs('{}/localbusiness/retrieval/restaurants'.format(directory))
+            save_json_file({'id': 7, 'type': 'retrieval', 'table': [{'entityId': 0}, {'entityId': 1}]},
+                           '{}/gs_querytable_hotels_7.json'.format(path_to_gt_table))
+            catalog = QueryTableCatalog(directory, refresh_interval=0)
+
+            # Test
+            self.assertEqual(catalog.get_schema_org_classes(), ['localbusiness'])
+            self.assertEqual(sorted(catalog.get_gt_tables('retrieval', 'localbusiness')), ['hotels', 'restaurants'])
+            path = catalog.find_query_table_path('retrieval', 7)
+            self.assertEqual(path, '{}/gs_querytable_hotels_7.json'.format(path_to_gt_table))
+            self.assertEqual(catalog.get_entries('retrieval')[0][1]['noRows'], 2)
+
+            # The persisted catalog is reused and new query tables are found
+            save_json_file({'id': 8, 'type': 'retrieval', 'table': []},
+                           '{}/gs_querytable_hotels_8.json'.format(path_to_gt_table))
+            reloaded_catalog = QueryTableCatalog(directory, refresh_interval=0)
+            self.assertIsNotNone(reloaded_catalog.find_query_table_path('retrieval', '8'))
+            self.assertIsNone(reloaded_catalog.find_query_table_path('augmentation', 7))
+
+            os.remove(path)
+            self.assertIsNone(reloaded_catalog.find_query_table_path('retrieval', 7))
+
+    def test_refresh_query_tables_edited_in_place(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Setup
+            path_to_gt_table = '{}/localbusiness/augmentation/hotels'.format(directory)
+            os.makedirs(path_to_gt_table)
+            path = '{}/gs_querytable_hotels_7.json'.format(path_to_gt_table)
+            save_json_file({'id': 7, 'type': 'augmentation', 'targetAttribute': 'telephone',
+                            'table': [{'entityId': 0}]}, path)
+            catalog = QueryTableCatalog(directory, refresh_interval=0)
+            other_catalog = QueryTableCatalog(directory, refresh_interval=0)
+            self.assertEqual(catalog.get_entries()[0][1]['targetAttribute'], 'telephone')
+            directory_mtime = os.path.getmtime(path_to_gt_table)
+
+            # Test - Editing a query table does not change the mtime of its directory
+            save_json_file({'id': 7, 'type': 'augmentation', 'targetAttribute': 'addresslocality',
+                            'table': [{'entityId': 0}, {'entityId': 1}]}, path)
+            os.utime(path, (os.path.getmtime(path) + 10, os.path.getmtime(path) + 10))
+            os.utime(path_to_gt_table, (directory_mtime, directory_mtime))
+
+            entry = catalog.get_entries()[0][1]
+            self.assertEqual(entry['targetAttribute'], 'addresslocality')
+            self.assertEqual(entry['noRows'], 2)
+
+            # Catalogs of other processes load the updated catalog.json
+            other_catalog.refresh()
+            self.assertEqual(other_catalog.catalog_mtime, catalog.catalog_mtime)
+            self.assertEqual(other_catalog.get_entries()[0][1]['noRows'], 2)
+
+    def test_query_tables_with_non_finite_values(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Setup
+            path_to_gt_table = '{}/localbusiness/retrieval/hotels'.format(directory)
+            os.makedirs(path_to_gt_table)
+            with open('{}/gs_querytable_hotels_7.json'.format(path_to_gt_table), 'w') as f:
+                f.write('{"id": 7, "type": "retrieval", "table": [{"entityId": 0, "ratingvalue": NaN}]}')
+            with open('{}/gs_querytable_hotels_8.json'.format(path_to_gt_table), 'w') as f:
+                f.write('{"id": 8, "type": "retrieval", "table": [')
+
+            # Test - NaN values are valid, only invalid json is not added and reported
+            catalog = QueryTableCatalog(directory, refresh_interval=0)
+            with self.assertLogs(level='ERROR') as logs:
+                self.assertIsNotNone(catalog.find_query_table_path('retrieval', 7))
+            self.assertIsNone(catalog.find_query_table_path('retrieval', 8))
+            self.assertIn('gs_querytable_hotels_8.json', logs.output[0])
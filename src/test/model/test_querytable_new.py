@@ -0,0 +1,38 @@
+from unittest import TestCase
+
+from src.model.evidence_new import AugmentationEvidence
+from src.model.querytable_new import AugmentationQueryTable
+
+
+class TestQuerytableNew(TestCase):
+
+    def test_entity_index(self):
+        # Setup
+        table = [{'entityId': 0, 'name': 'Hyatt Paris Madeleine', 'addresslocality': 'Paris'},
+                 {'entityId': 1, 'name': 'Ibis Berlin', 'addresslocality': 'Berlin'}]
+        evidences = [AugmentationEvidence(i, 7, entity_id, 'localbusiness_hotels.com', i, None, 'Paris',
+                                          'addresslocality')
+                     for i, entity_id in enumerate([0, 0, 1])]
+        for evidence, scale in zip(evidences, [3, 1, 0]):
+            evidence.scale = scale
+        query_table = AugmentationQueryTable(7, 'augmentation', 'assembling', 'hotels', 'localbusiness',
+                                             ['name', 'addresslocality'], table, evidences[:2], 'addresslocality',
+                                             'use_case')
+
+        # Test
+        self.assertEqual(query_table.calculate_evidence_statistics_of_row(0), (2, 1, 0, 1, 0))
+        self.assertEqual(query_table.get_verified_evidences(1), [])
+        self.assertNotIn('entityIndex', query_table.to_json(with_evidence_context=False))
+
+        # The index is rebuilt after changes of the query table
+        query_table.add_verified_evidence(evidences[2])
+        self.assertEqual(query_table.calculate_evidence_statistics_of_row(1), (1, 0, 0, 0, 1))
+        query_table.verified_evidences.pop(0)
+        self.assertEqual(query_table.get_verified_evidences(0), [evidences[1]])
+
+        # Projections only contain the row and the verified evidences of the entity
+        projected_query_table = query_table.project_to_entity(1)
+        self.assertEqual(projected_query_table.table, [table[1]])
+        self.assertEqual(projected_query_table.verified_evidences, [evidences[2]])
+        self.assertEqual(len(query_table.table), 2)
+        self.assertEqual(query_table.project_to_entity(5).table, [])
@@ -0,0 +1,59 @@
+import gzip
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from src.model.result_sink import JsonLinesResultSink, ParquetResultSink
+
+
+class Test(TestCase):
+    def test_write_json_lines(self):
+        # Setup
+        rows = [{'querytableId': 1, 'k': 1, 'entityId': 0, 'precision': 1.0},
+                {'querytableId': 1, 'k': 5, 'entityId': 0, 'precision': 0.4}]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for compression, open_function in [(None, open), ('gzip', gzip.open)]:
+                path_to_results = os.path.join(tmp_dir, 'results_{}.json'.format(compression))
+
+                # Test - Rows of multiple writes and runs are appended
+                with JsonLinesResultSink(path_to_results, compression) as result_sink:
+                    result_sink.write_rows(rows[:1])
+                    result_sink.write_rows(rows[1:])
+                with JsonLinesResultSink(path_to_results, compression) as result_sink:
+                    result_sink.write_rows(rows)
+                    self.assertEqual(result_sink.no_rows, 2)
+
+                with open_function(path_to_results, 'rt', encoding='utf-8') as file:
+                    self.assertEqual([json.loads(line) for line in file], rows + rows)
+
+    def test_write_parquet_with_heterogeneous_row_groups(self):
+        # Setup - pyarrow is an optional dependency
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        first_rows = [{'querytableId': 1, 'k': 1, 'precision': 1, 'targetAttribute': None}]
+        second_rows = [{'querytableId': 2, 'k': 5, 'precision': 0.4, 'targetAttribute': 'addresslocality',
+                        'foundValues': {'Mannheim': 2}}]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path_to_results = os.path.join(tmp_dir, 'results.parquet')
+
+            # Test - Rows of later row groups add columns and widen types
+            with ParquetResultSink(path_to_results, row_group_size=1) as result_sink:
+                result_sink.write_rows(first_rows)
+                result_sink.write_rows(second_rows)
+
+            table = pq.read_table(path_to_results)
+            self.assertEqual(table.column_names, ['querytableId', 'k', 'precision', 'targetAttribute', 'foundValues'])
+            self.assertEqual(str(table.schema.field('precision').type), 'double')
+            self.assertEqual(table.to_pylist(),
+                             [{'querytableId': 1, 'k': 1, 'precision': 1.0, 'targetAttribute': None,
+                               'foundValues': None},
+                              {'querytableId': 2, 'k': 5, 'precision': 0.4, 'targetAttribute': 'addresslocality',
+                               'foundValues': '{"Mannheim": 2}'}])
+            self.assertEqual(pq.ParquetFile(path_to_results).num_row_groups, 2)
+            self.assertEqual(os.listdir(tmp_dir), ['results.parquet'])
@@ -0,0 +1,34 @@
+import gzip
+import math
+import os
+import tempfile
+from unittest import TestCase
+
+from src.preprocessing.corpus_reader import CorpusFileReader, read_raw_entities
+
+
+class TestCorpusReader(TestCase):
+
+    def test_stream_raw_entities(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # Setup
+            path = os.path.join(directory, 'LocalBusiness_hotels.com_September2020.json.gz')
+            with gzip.open(path, 'wb') as f:
+                f.write('{"name": "Hôtel Madeleine", "row_id": 1}\n\nno json\n{"row_id": 2, "ratingvalue": NaN}\n'
+                        .encode('utf-8'))
+
+            # Test
+            with CorpusFileReader(path, backend='gzip') as reader, self.assertLogs(level='WARNING') as logs:
+                raw_entities = list(reader)
+
+            # NaN and Infinity are valid values, like for json.loads
+            self.assertEqual(raw_entities[0], {'name': 'Hôtel Madeleine', 'row_id': 1})
+            self.assertEqual(raw_entities[1]['row_id'], 2)
+            self.assertTrue(math.isnan(raw_entities[1]['ratingvalue']))
+            self.assertEqual(reader.statistics['lines'], 4)
+            self.assertEqual(reader.statistics['entities'], 2)
+            self.assertEqual(reader.statistics['invalid_lines'], 1)
+            self.assertIn('Skipped 1 invalid lines of 4 lines', logs.output[0])
+
+            with self.assertRaises(ValueError):
+                list(read_raw_entities(path, backend='zip'))
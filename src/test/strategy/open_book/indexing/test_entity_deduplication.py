@@ -0,0 +1,27 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.strategy.open_book.indexing.entity_deduplication import determine_entity_hash, BloomFilter, DiskHashSet
+
+
+class TestEntityDeduplication(TestCase):
+
+    def test_entity_hash(self):
+        # Setup
+        entity = {'name': 'Hyatt Paris Madeleine', 'addresslocality': 'Paris', 'description': 'Hotel'}
+        reordered_entity = {'addresslocality': 'Paris', 'name': 'Hyatt Paris Madeleine'}
+
+        # Test - the description is not considered
+        self.assertEqual(determine_entity_hash(entity), determine_entity_hash(reordered_entity))
+        self.assertNotEqual(determine_entity_hash(entity), determine_entity_hash({'name': 'Hyatt Paris Madeleine'}))
+
+    def test_seen_entity_sets(self):
+        entity_hashes = [determine_entity_hash({'name': 'Hotel {}'.format(i)}) for i in range(100)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            for seen_entities in [BloomFilter(1000), DiskHashSet(os.path.join(directory, 'entity_hashes.sqlite'))]:
+                # Test
+                self.assertTrue(all([seen_entities.add(entity_hash) for entity_hash in entity_hashes]))
+                self.assertFalse(any([seen_entities.add(entity_hash) for entity_hash in entity_hashes]))
+                seen_entities.close()
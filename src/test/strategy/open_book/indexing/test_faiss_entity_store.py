@@ -0,0 +1,35 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.strategy.open_book.indexing.faiss_entity_store import EntityStoreWriter, EntityStore, entity_store_exists
+
+
+class Test(TestCase):
+    def test_write_and_read_entity_store(self):
+        # Setup
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path_to_faiss_index = os.path.join(tmp_dir, 'localbusiness_faiss_roberta-base_mean_cos.index')
+            entities = [{'name': 'Hyatt Paris Madeleine', 'table': 'localbusiness_hyatt.com', 'row_id': 1,
+                         'entity_vector_mean_norm': [0.1, 0.2]},
+                        {'name': 'Café Ümlaut', 'table': 'localbusiness_cafe.de', 'row_id': 7}]
+
+            self.assertFalse(entity_store_exists(path_to_faiss_index))
+            with EntityStoreWriter(path_to_faiss_index) as writer:
+                for entity in entities:
+                    writer.append(entity)
+            # Closing twice does not rewrite the store
+            writer.close()
+
+            # Test
+            self.assertTrue(entity_store_exists(path_to_faiss_index))
+            entity_store = EntityStore(path_to_faiss_index)
+            self.assertEqual(len(entity_store), 2)
+            self.assertEqual(entity_store.get_entity(1), entities[1])
+
+            # Entity representations are not stored and unknown ids are returned as None
+            hydrated_entities = entity_store.get_entities([1, 0, -1, 2])
+            self.assertNotIn('entity_vector_mean_norm', hydrated_entities[1])
+            self.assertEqual(hydrated_entities[1]['row_id'], 1)
+            self.assertIsNone(hydrated_entities[2])
+            self.assertIsNone(hydrated_entities[3])
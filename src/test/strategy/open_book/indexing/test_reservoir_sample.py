@@ -0,0 +1,33 @@
+from unittest import TestCase
+
+import numpy as np
+
+from src.strategy.open_book.indexing.reservoir_sample import ReservoirSample
+
+
+class Test(TestCase):
+    def test_sample_is_uniform_over_stream(self):
+        # Setup - the stream is ordered, a prefix sample would only contain the first vectors
+        vectors = np.arange(10000, dtype='float32').reshape(-1, 1)
+        reservoir_sample = ReservoirSample(500)
+        for start in range(0, len(vectors), 64):
+            reservoir_sample.add(vectors[start:start + 64])
+
+        # Test
+        sample = reservoir_sample.get_sample()
+        self.assertEqual(sample.shape, (500, 1))
+        self.assertEqual(len(np.unique(sample)), 500)
+        self.assertGreater(sample.max(), 9000)
+        self.assertAlmostEqual(sample.mean() / len(vectors), 0.5, delta=0.05)
+
+        # The sample is reproducible
+        second_reservoir_sample = ReservoirSample(500)
+        second_reservoir_sample.add(vectors)
+        np.testing.assert_array_equal(np.sort(second_reservoir_sample.get_sample(), axis=0), np.sort(sample, axis=0))
+
+    def test_small_stream_is_sampled_completely(self):
+        reservoir_sample = ReservoirSample(100)
+        reservoir_sample.add(np.ones((3, 4)))
+        reservoir_sample.add(np.zeros((0, 4)))
+
+        self.assertEqual(reservoir_sample.get_sample().shape, (3, 4))
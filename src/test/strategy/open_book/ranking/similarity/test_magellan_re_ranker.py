@@ -1,8 +1,13 @@
 import os
 from unittest import TestCase
 
+import numpy as np
+import pandas as pd
+import py_entitymatching as em
+
 from src.model.querytable import load_query_tables_by_class, load_query_table_from_file
-from src.strategy.open_book.ranking.similarity.magellan_re_ranker import MagellanSimilarityReRanker
+from src.strategy.open_book.ranking.similarity.magellan_re_ranker import MagellanSimilarityReRanker, \
+    MagellanFeatureEvaluator
 from src.strategy.open_book.ranking.similarity.similarity_re_ranking_factory import select_similarity_re_ranker
 
 
@@ -39,3 +44,38 @@ class Test(TestCase):
 
         # To-Do: Implement Tests for re-ranking!
         #evidences = magellan_re_ranker.re_rank_evidences(query_table, query_table.verified_evidences)
+
+    def test_feature_evaluator_matches_extract_feature_vecs(self):
+        # Setup
+        entities1 = [{'name': "Harry Potter and the Sorcerer's Stone", 'director': 'Chris Columbus',
+                      'datepublished': '2001-11-16'},
+                     {'name': 'Harry Potter and the Chamber of Secrets', 'director': 'Chris Columbus',
+                      'datepublished': np.nan}]
+        entities2 = [{'name': "Harry Potter and the Philosopher's Stone", 'director': 'C. Columbus',
+                      'datepublished': '2001-11-04'},
+                     {'name': 'Harry Potter and the Chamber of Secrets', 'director': 'Chris Columbus',
+                      'datepublished': '2002-11-15'}]
+        df_entities1 = pd.DataFrame(entities1)
+        df_entities1['ID'] = range(0, len(df_entities1))
+        em.set_key(df_entities1, 'ID')
+        df_entities2 = pd.DataFrame(entities2)
+        df_entities2['ID'] = range(0, len(df_entities2))
+        em.set_key(df_entities2, 'ID')
+        feature_table = em.get_features_for_matching(df_entities1, df_entities2, validate_inferred_attr_types=False)
+
+        df_links = pd.DataFrame([[value, value, value] for value in range(0, len(entities1))],
+                                columns=['_id', 'entities1_id', 'entities2_id'])
+        em.set_key(df_links, '_id')
+        em.set_ltable(df_links, df_entities1)
+        em.set_fk_ltable(df_links, 'entities1_id')
+        em.set_rtable(df_links, df_entities2)
+        em.set_fk_rtable(df_links, 'entities2_id')
+        df_feature_vector = em.extract_feature_vecs(df_links, feature_table=feature_table, show_progress=False)
+        df_feature_vector.fillna(value=0, inplace=True)
+
+        # Test - The evaluator returns the feature matrix of em.extract_feature_vecs
+        feature_evaluator = MagellanFeatureEvaluator(feature_table)
+        feature_vectors = feature_evaluator.evaluate(df_entities1.to_dict('records'), df_entities2.to_dict('records'))
+
+        self.assertEqual(feature_evaluator.feature_names, list(feature_table['feature_name']))
+        np.testing.assert_allclose(feature_vectors, df_feature_vector[feature_evaluator.feature_names].values)
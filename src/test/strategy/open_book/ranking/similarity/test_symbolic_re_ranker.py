@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+from src.model.evidence_new import RetrievalEvidence
+from src.strategy.open_book.ranking.similarity.symbolic_re_ranker import SymbolicSimilarityReRanker, \
+    jaccard_similarity
+
+
+class QueryTable:
+    def __init__(self, table):
+        self.table = table
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.row = {'entityId': 0, 'name': 'Hyatt Paris Madeleine', 'addresslocality': 'Paris'}
+        self.contexts = [{'name': 'Hyatt Paris Madeleine', 'addresslocality': 'Paris'},
+                         {'name': 'Hotel Madeleine', 'addresslocality': 'Paris'},
+                         {'name': 'Ibis Berlin', 'addresslocality': 'Berlin'}]
+
+    def create_evidences(self):
+        return [RetrievalEvidence(i, 1, 0, 'localbusiness_hotels.com', i, context)
+                for i, context in enumerate(self.contexts)]
+
+    def test_re_rank_evidences_jaccard(self):
+        # Setup
+        re_ranker = SymbolicSimilarityReRanker('localbusiness', 'jaccard', ['name', 'addresslocality'])
+        serializer = re_ranker.entity_serializer
+        expected_scores = [jaccard_similarity(
+            serializer.convert_to_str_representation(self.row, without_special_tokens=True).lower().split(' '),
+            serializer.convert_to_str_representation(context, without_special_tokens=True).lower().split(' '))
+            for context in self.contexts]
+
+        # Test
+        evidences = re_ranker.re_rank_evidences(QueryTable([self.row]), self.create_evidences())
+        self.assertEqual([evidence.row_id for evidence in evidences], [0, 1, 2])
+        for evidence in evidences:
+            self.assertAlmostEqual(evidence.similarity_score, expected_scores[evidence.row_id])
+        self.assertEqual(len(re_ranker.evidence_cache), 3)
+
+    def test_re_rank_evidences_cosine_and_minhash(self):
+        for similarity_measure in ['cosine', 'minhash_jaccard']:
+            # Setup
+            re_ranker = SymbolicSimilarityReRanker('localbusiness', similarity_measure, ['name', 'addresslocality'])
+
+            # Test
+            evidences = re_ranker.re_rank_evidences(QueryTable([self.row]), self.create_evidences())
+            self.assertEqual(evidences[0].row_id, 0)
+            self.assertAlmostEqual(evidences[0].similarity_score, 1.0)
+            self.assertEqual(evidences[-1].row_id, 2)
+
+        with self.assertRaises(ValueError):
+            SymbolicSimilarityReRanker('localbusiness', 'levenshtein')
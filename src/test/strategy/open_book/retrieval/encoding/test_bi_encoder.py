@@ -0,0 +1,32 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from src.strategy.open_book.retrieval.encoding.bi_encoder import BiEncoder
+from src.strategy.open_book.retrieval.encoding.embedding_cache import EmbeddingCache
+
+
+class StaticBiEncoder(BiEncoder):
+    def encode_entity_strs_and_return_pooled_outputs(self, entity_strs):
+        return np.array([[len(entity_str), 1.0, 2.0, 3.0] for entity_str in entity_strs])
+
+
+class Test(TestCase):
+    def test_encode_single_entity_and_return_pooled_outputs(self):
+        # Setup
+        bi_encoder = StaticBiEncoder('localbusiness', context_attributes=['name'])
+        entities = [{'name': 'Hyatt'}, {'name': 'Ibis'}]
+
+        # Test - A single entity keeps the batch axis
+        pooled_outputs = bi_encoder.encode_entities_and_return_pooled_outputs(entities[:1])
+        self.assertEqual(np.array(pooled_outputs).shape, (1, 4))
+        self.assertEqual(len(bi_encoder.encode_entities_and_return_pooled_outputs(entities[:1])[0]), 4)
+        self.assertEqual(np.array(bi_encoder.encode_entities_and_return_pooled_outputs(entities)).shape, (2, 4))
+
+        # The embedding cache returns the same shape
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bi_encoder.embedding_cache = EmbeddingCache('static', os.path.join(tmp_dir, 'embeddings.sqlite'))
+            self.assertEqual(np.array(bi_encoder.encode_entities_and_return_pooled_outputs(entities[:1])).shape,
+                             (1, 4))
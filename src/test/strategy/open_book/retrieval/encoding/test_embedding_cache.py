@@ -0,0 +1,107 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase, mock
+
+import numpy as np
+
+from src.strategy.open_book.retrieval.encoding.embedding_cache import EmbeddingCache, determine_model_fingerprint
+
+
+class Test(TestCase):
+    def test_get_or_encode(self):
+        # Setup
+        encoded_strs = []
+
+        def encode(entity_strs):
+            encoded_strs.extend(entity_strs)
+            return np.array([[len(entity_str), 1.0] for entity_str in entity_strs])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path_to_cache = os.path.join(tmp_dir, 'embeddings.sqlite')
+            cache = EmbeddingCache('supcon_bi_encoder-roberta-base-mean', path_to_cache)
+
+            # Test - Duplicates are encoded once and the order of the strings is kept
+            embeddings = cache.get_or_encode(['[COL]name[VAL]Hyatt', '[COL]name[VAL]Ibis', '[COL]name[VAL]Hyatt'],
+                                             encode)
+            self.assertEqual(embeddings.shape, (3, 2))
+            self.assertEqual(embeddings[:, 0].tolist(), [19.0, 18.0, 19.0])
+            self.assertEqual(len(encoded_strs), 2)
+
+            # Cached embeddings survive a new cache instance, other namespaces do not share them
+            cache = EmbeddingCache('supcon_bi_encoder-roberta-base-mean', path_to_cache)
+            embeddings = cache.get_or_encode(['[COL]name[VAL]Ibis'], encode)
+            self.assertEqual(embeddings.tolist(), [[18.0, 1.0]])
+            self.assertEqual(len(encoded_strs), 2)
+
+            other_cache = EmbeddingCache('huggingface_bi_encoder-roberta-base-cls', path_to_cache)
+            other_cache.get_or_encode(['[COL]name[VAL]Ibis'], encode)
+            self.assertEqual(len(encoded_strs), 3)
+
+    def test_evict_least_recently_used_embeddings(self):
+        # Setup
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = EmbeddingCache('test', os.path.join(tmp_dir, 'embeddings.sqlite'), max_size=4 * 8 * 10)
+            old_keys = [cache.determine_key(str(i)) for i in range(6)]
+            new_keys = [cache.determine_key(str(i)) for i in range(6, 12)]
+            cache.add_embeddings(old_keys, np.ones((6, 8)))
+            cache.get_embeddings(old_keys[:2])
+
+            # Test - Embeddings that were not accessed recently are evicted first
+            cache.add_embeddings(new_keys, np.ones((6, 8)))
+            self.assertLessEqual(cache.size, 4 * 8 * 10 * 0.9)
+            self.assertEqual(len(cache.get_embeddings(old_keys[:2] + new_keys)), 8)
+            self.assertEqual(len(cache.get_embeddings(old_keys[2:])), 0)
+
+    def test_lookups_do_not_write_and_replacements_keep_the_size(self):
+        # Setup
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = EmbeddingCache('test', os.path.join(tmp_dir, 'embeddings.sqlite'))
+            keys = [cache.determine_key(str(i)) for i in range(4)]
+            cache.add_embeddings(keys, np.ones((4, 8)))
+            self.assertEqual(cache.size, 4 * 4 * 8)
+
+            # Test - Lookups only record the access times in memory
+            total_changes = cache.connection.total_changes
+            self.assertEqual(len(cache.get_embeddings(keys[:2])), 2)
+            self.assertEqual(cache.connection.total_changes, total_changes)
+            self.assertEqual(set(cache.accessed_keys), set(keys[:2]))
+
+            # Replaced embeddings are counted once
+            cache.add_embeddings(keys[:2] + keys[:1], np.zeros((3, 8)))
+            self.assertEqual(cache.size, 4 * 4 * 8)
+            self.assertEqual(cache.accessed_keys, {})
+            cache.close()
+
+    def test_model_fingerprint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.dict(os.environ, {'DATA_DIR': tmp_dir}):
+            # Setup
+            path_to_model = os.path.join(tmp_dir, 'models', 'open_book', 'supcon-roberta-base')
+            os.makedirs(path_to_model)
+            with open(os.path.join(path_to_model, 'config.json'), 'w') as f:
+                f.write('{"hidden_size": 768}')
+            with open(os.path.join(path_to_model, 'pytorch_model.bin'), 'wb') as f:
+                f.write(b'weights')
+            fingerprint = determine_model_fingerprint('supcon-roberta-base')
+
+            # Test - The fingerprint changes if the model is retrained under the same name
+            self.assertEqual(determine_model_fingerprint('supcon-roberta-base'), fingerprint)
+            with open(os.path.join(path_to_model, 'pytorch_model.bin'), 'wb') as f:
+                f.write(b'retrained weights')
+            self.assertNotEqual(determine_model_fingerprint('supcon-roberta-base'), fingerprint)
+
+    def test_get_or_encode_from_multiple_threads(self):
+        # Setup
+        def encode(entity_strs):
+            return np.array([[len(entity_str), 1.0] for entity_str in entity_strs])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = EmbeddingCache('test', os.path.join(tmp_dir, 'embeddings.sqlite'), max_size=4 * 2 * 200)
+            entity_strs = [['{}-{}'.format(thread, i) for i in range(50)] for thread in range(8)]
+
+            # Test - Threads share the connection of the cache
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                all_embeddings = list(executor.map(lambda strs: cache.get_or_encode(strs, encode), entity_strs * 3))
+
+            for strs, embeddings in zip(entity_strs * 3, all_embeddings):
+                self.assertEqual(embeddings[:, 0].tolist(), [float(len(entity_str)) for entity_str in strs])
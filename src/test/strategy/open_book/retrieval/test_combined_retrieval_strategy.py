@@ -0,0 +1,77 @@
+import os
+from unittest import TestCase, mock
+
+from src.model.evidence_new import RetrievalEvidence
+from src.model.querytable_new import RetrievalQueryTable
+from src.strategy.open_book.es_helper import run_async
+from src.strategy.open_book.retrieval.combined_retrieval_strategy import CombinedRetrievalStrategy
+from src.strategy.open_book.retrieval.retrieval_strategy import RetrievalStrategy
+
+
+class StaticRetrievalStrategy(RetrievalStrategy):
+    """Return the same ranked evidences for every query table - rankings: entity id --> list of (table, score)"""
+
+    def __init__(self, model_name, rankings):
+        super().__init__('localbusiness', model_name)
+        self.model_name = model_name
+        self.rankings = rankings
+
+    def retrieve_evidence(self, query_table, evidence_count, entity_id):
+        evidences = []
+        for ranked_entity_id, ranking in self.rankings.items():
+            for table, score in ranking[:evidence_count]:
+                evidence = RetrievalEvidence(len(evidences) + 1, query_table.identifier, ranked_entity_id, table, 1,
+                                             {'name': table})
+                evidence.similarity_score = score
+                evidences.append(evidence)
+        return evidences
+
+
+class Test(TestCase):
+    def setUp(self):
+        patches = [mock.patch.dict(os.environ, {'ES_INSTANCE': 'localhost', 'DATA_DIR': ''}),
+                   mock.patch('src.strategy.open_book.retrieval.retrieval_strategy.get_es_client')]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.query_table = RetrievalQueryTable(7, 'retrieval', 'assembling', 'hotels', 'localbusiness', ['name'],
+                                               [{'entityId': 0, 'name': 'Hyatt'}, {'entityId': 1, 'name': 'Ibis'}],
+                                               [])
+        self.retrieval_strategies = [
+            StaticRetrievalStrategy('BM25', {0: [('a1', 0.9), ('a2', 0.8), ('shared', 0.7)], 1: [('ibis', 0.5)]}),
+            StaticRetrievalStrategy('supcon', {0: [('shared', 0.9), ('b1', 0.5)], 1: [('ibis', 0.9)]}),
+            StaticRetrievalStrategy('sbert', {0: [('c1', 0.6)]})]
+
+    def test_interleave(self):
+        # Setup
+        strategy = CombinedRetrievalStrategy('localbusiness', self.retrieval_strategies, False)
+
+        # Test - The rankings are taken in turn and evidences found by several strategies are skipped
+        evidences = strategy.retrieve_evidence(self.query_table, 10, None)
+        self.assertEqual([(evidence.entity_id, evidence.table) for evidence in evidences],
+                         [(0, 'a1'), (0, 'shared'), (0, 'c1'), (0, 'a2'), (0, 'b1'), (1, 'ibis')])
+        self.assertEqual([evidence.identifier for evidence in evidences], [1, 2, 3, 4, 5, 6])
+        self.assertEqual([evidence.similarity_score for evidence in evidences[:5]], [1.0, 0.9, 0.8, 0.7, 0.6])
+
+        # Evidences are truncated to evidence_count per row, the async retrieval yields the same evidences
+        evidences = run_async(strategy.retrieve_evidence_async(self.query_table, 3, None))
+        self.assertEqual([(evidence.entity_id, evidence.table) for evidence in evidences],
+                         [(0, 'a1'), (0, 'shared'), (0, 'c1'), (1, 'ibis')])
+
+    def test_reciprocal_rank_fusion(self):
+        # Setup
+        strategy = CombinedRetrievalStrategy('localbusiness', self.retrieval_strategies, False,
+                                             fusion='reciprocal_rank', rrf_k=60)
+
+        # Test - Evidences are ordered by their summed reciprocal ranks, ties keep the first occurrence
+        evidences = strategy.retrieve_evidence(self.query_table, 10, None)
+        self.assertEqual([evidence.table for evidence in evidences if evidence.entity_id == 0],
+                         ['shared', 'a1', 'c1', 'a2', 'b1'])
+        self.assertAlmostEqual(evidences[0].similarity_score, 1 / 63 + 1 / 61)
+        self.assertAlmostEqual(evidences[-1].similarity_score, 1 / 61 + 1 / 61)
+
+        # The children only deliver evidence_count evidences, hence shared is only found at the first rank of supcon
+        evidences = strategy.retrieve_evidence(self.query_table, 2, None)
+        self.assertEqual([(evidence.entity_id, evidence.table) for evidence in evidences],
+                         [(0, 'a1'), (0, 'shared'), (1, 'ibis')])
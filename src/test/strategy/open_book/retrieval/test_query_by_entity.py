@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+from unittest import TestCase, mock
+
+from elasticsearch.exceptions import NotFoundError
+
+from src.model.querytable_new import AugmentationQueryTable
+from src.strategy.open_book import es_helper
+from src.strategy.open_book.retrieval.query_by_entity import QueryByEntity
+
+
+def answer_multi_search(body):
+    """Return one hit per row query - The hit repeats the queried name"""
+    queries = [json.loads(line) for line in body.strip().split('\n')][1::2]
+    responses = []
+    for query in queries:
+        name = query['query']['bool']['should'][0]['match']['name']['query']
+        responses.append({'hits': {'hits': [{'_score': 2.0, '_source': {'name': name, 'table': 'hotels.com',
+                                                                          'row_id': len(responses)}}]}})
+    return {'responses': responses}
+
+
+class StaticEsClient:
+    def msearch(self, body, index, request_timeout):
+        return answer_multi_search(body)
+
+
+class FailingEsClient:
+    def msearch(self, body, index, request_timeout):
+        responses = answer_multi_search(body)['responses']
+        responses[1] = {'error': {'type': 'index_not_found_exception', 'reason': 'no such index'}, 'status': 404}
+        return {'responses': responses}
+
+
+class StaticAsyncEsClient:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def msearch(self, body, index, request_timeout):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0)
+        self.in_flight -= 1
+        return answer_multi_search(body)
+
+
+class Test(TestCase):
+    def test_retrieve_evidence_async(self):
+        # Setup
+        async_es_client = StaticAsyncEsClient()
+        with mock.patch.dict(os.environ, {'ES_INSTANCE': 'localhost', 'DATA_DIR': ''}), \
+                mock.patch('src.strategy.open_book.retrieval.retrieval_strategy.get_es_client',
+                           return_value=StaticEsClient()), \
+                mock.patch('src.strategy.open_book.retrieval.retrieval_strategy.get_async_es_client',
+                           return_value=async_es_client):
+            strategy = QueryByEntity('localbusiness', batch_size=2)
+            table = [{'entityId': entity_id, 'name': 'Hotel {}'.format(entity_id)} for entity_id in range(5)]
+            query_table = AugmentationQueryTable(7, 'augmentation', 'assembling', 'hotels', 'localbusiness',
+                                                 ['name'], table, [], 'telephone', None)
+
+            # Test - All batches are in flight concurrently and the evidences match the synchronous retrieval
+            evidences = es_helper.run_async(strategy.retrieve_evidence_async(query_table, 1, None))
+            expected_evidences = strategy.retrieve_evidence(query_table, 1, None)
+
+        self.assertEqual(async_es_client.max_in_flight, 3)
+        self.assertEqual([(evidence.entity_id, evidence.context['name']) for evidence in evidences],
+                         [(entity_id, 'Hotel {}'.format(entity_id)) for entity_id in range(5)])
+        self.assertEqual([evidence.context for evidence in evidences],
+                         [evidence.context for evidence in expected_evidences])
+
+    def test_failed_row_raises(self):
+        # Setup
+        with mock.patch.dict(os.environ, {'ES_INSTANCE': 'localhost', 'DATA_DIR': ''}), \
+                mock.patch('src.strategy.open_book.retrieval.retrieval_strategy.get_es_client',
+                           return_value=FailingEsClient()):
+            strategy = QueryByEntity('localbusiness')
+            table = [{'entityId': entity_id, 'name': 'Hotel {}'.format(entity_id)} for entity_id in range(3)]
+            query_table = AugmentationQueryTable(7, 'augmentation', 'assembling', 'hotels', 'localbusiness',
+                                                 ['name'], table, [], 'telephone', None)
+
+            # Test - A failed row is not turned into a row without evidences
+            with self.assertRaises(NotFoundError):
+                strategy.retrieve_evidence(query_table, 1, None)
+
+    def test_async_es_client_per_event_loop(self):
+        try:
+            import aiohttp
+        except ImportError:
+            self.skipTest('aiohttp is not installed')
+
+        async def get_client():
+            return es_helper.get_async_es_client()
+
+        async def get_and_close_client():
+            client = es_helper.get_async_es_client()
+            await es_helper.close_async_es_client()
+            return client
+
+        with mock.patch.dict(os.environ, {'ES_INSTANCE': 'localhost'}):
+            # Test - run_async keeps its loop and reuses the client, other loops get their own client
+            client = es_helper.run_async(get_client())
+            self.assertIs(es_helper.run_async(get_client()), client)
+            self.assertIsNot(asyncio.run(get_and_close_client()), client)
+            self.assertIs(es_helper.run_async(get_and_close_client()), client)
+            self.assertIsNot(es_helper.run_async(get_client()), client)
@@ -0,0 +1,56 @@
+import logging
+from unittest import TestCase
+
+import faiss
+import numpy as np
+
+from src.model.querytable_new import RetrievalQueryTable
+from src.strategy.open_book.retrieval.encoding.bi_encoder import BiEncoder
+from src.strategy.open_book.retrieval.query_by_neural_entity import QueryByNeuralEntity
+
+
+class StaticBiEncoder(BiEncoder):
+    def encode_entity_strs_and_return_pooled_outputs(self, entity_strs):
+        return np.array([[1.0, 0.0, 0.0, 0.0] if 'Hyatt' in entity_str else [0.0, 1.0, 0.0, 0.0]
+                         for entity_str in entity_strs])
+
+
+class StaticEntityStore:
+    def __init__(self, entities):
+        self.entities = entities
+
+    def get_entities(self, faiss_ids):
+        return [self.entities[faiss_id] if 0 <= faiss_id < len(self.entities) else None for faiss_id in faiss_ids]
+
+
+class Test(TestCase):
+    def test_retrieve_evidence_of_entity(self):
+        # Setup - The strategy is assembled without a trained model and without ES
+        entities = [{'name': 'Hyatt Paris', 'table': 'localbusiness_hyatt.com', 'row_id': 1},
+                    {'name': 'Ibis Berlin', 'table': 'localbusiness_ibis.com', 'row_id': 2}]
+        index = faiss.IndexFlatIP(4)
+        index.add(np.array([[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]], dtype='float32'))
+
+        strategy = QueryByNeuralEntity.__new__(QueryByNeuralEntity)
+        strategy.logger = logging.getLogger()
+        strategy.name = 'query_by_neural_entity'
+        strategy.schema_org_class = 'localbusiness'
+        strategy.clusters = False
+        strategy.rank_evidences_by_table = False
+        strategy.entity_biencoder = StaticBiEncoder('localbusiness', context_attributes=['name'])
+        strategy.index = index
+        strategy.entity_store = StaticEntityStore(entities)
+
+        table = [{'entityId': 0, 'name': 'Hyatt Paris'}, {'entityId': 1, 'name': 'Ibis Berlin'}]
+        query_table = RetrievalQueryTable(7, 'retrieval', 'assembling', 'hotels', 'localbusiness', ['name'],
+                                          table, [])
+
+        # Test - Only the row of the entity is encoded and searched
+        evidences = strategy.retrieve_evidence_of_entity(query_table, 1, 1)
+        self.assertEqual(len(evidences), 1)
+        self.assertEqual(evidences[0].entity_id, 1)
+        self.assertEqual(evidences[0].table, 'localbusiness_ibis.com')
+        self.assertAlmostEqual(evidences[0].similarity_score, 1.0)
+
+        # Unknown entities do not have evidences
+        self.assertEqual(strategy.retrieve_evidence_of_entity(query_table, 1, 5), [])
@@ -0,0 +1,50 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import torch
+from transformers import BertConfig, BertForSequenceClassification, BertTokenizer
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+from src.strategy.open_book.onnx_inference import FirstOutputWrapper, OnnxModel, determine_input_names, \
+    export_to_onnx
+
+
+class Test(TestCase):
+    def test_exported_cross_encoder_matches_pytorch(self):
+        try:
+            import onnxruntime
+        except ImportError:
+            self.skipTest('onnxruntime is not installed')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Setup - Tiny BERT cross encoder, BERT uses token type ids for the second entity
+            path_to_vocab = os.path.join(tmp_dir, 'vocab.txt')
+            with open(path_to_vocab, 'w') as f:
+                f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', '[COL]', '[VAL]', 'name', 'hyatt',
+                                   'paris', 'ibis', 'berlin', 'dummy', 'entity', 'other']))
+            tokenizer = BertTokenizer(path_to_vocab, never_split=['[COL]', '[VAL]'])
+            torch.manual_seed(42)
+            model = BertForSequenceClassification(BertConfig(vocab_size=15, hidden_size=16, num_hidden_layers=2,
+                                                             num_attention_heads=2, intermediate_size=32,
+                                                             num_labels=2))
+            model.eval()
+
+            input_names = determine_input_names(tokenizer)
+            self.assertIn('token_type_ids', input_names)
+            path_to_onnx_model = os.path.join(tmp_dir, 'cross_encoder.onnx')
+            export_to_onnx(FirstOutputWrapper(model), tokenizer, 'logits', path_to_onnx_model, input_names)
+
+            # Test - The exported graph scores entity pairs like the pytorch model
+            inputs = tokenizer(['[COL]name[VAL]hyatt paris', '[COL]name[VAL]ibis'],
+                               ['[COL]name[VAL]hyatt', '[COL]name[VAL]ibis berlin paris'],
+                               return_tensors='pt', padding=True, truncation=True)
+            with torch.no_grad():
+                expected_logits = model(**inputs).logits.numpy()
+                logits_without_segments = model(input_ids=inputs['input_ids'],
+                                                attention_mask=inputs['attention_mask']).logits.numpy()
+            logits = OnnxModel(path_to_onnx_model, SequenceClassifierOutput)(**inputs).logits.numpy()
+
+            np.testing.assert_allclose(logits, expected_logits, atol=1e-5)
+            self.assertFalse(np.allclose(logits, logits_without_segments, atol=1e-5))
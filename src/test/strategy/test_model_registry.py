@@ -0,0 +1,66 @@
+import gc
+import threading
+from unittest import TestCase
+
+from src.strategy.model_registry import ModelRegistry
+
+
+class Owner:
+    pass
+
+
+class Test(TestCase):
+    def test_share_and_evict_models(self):
+        # Setup
+        registry = ModelRegistry(max_resident_models=1)
+        loaded_models = []
+
+        def load_model(name):
+            loaded_models.append(name)
+            return {'name': name}
+
+        owner_1, owner_2, owner_3 = Owner(), Owner(), Owner()
+
+        # Test - Owners of the same key share one loaded model
+        model_1 = registry.acquire(('auto_model', 'roberta-base', 'cpu'), lambda: load_model('roberta'), owner_1)
+        model_2 = registry.acquire(('auto_model', 'roberta-base', 'cpu'), lambda: load_model('roberta'), owner_2)
+        self.assertIs(model_1, model_2)
+        self.assertEqual(loaded_models, ['roberta'])
+
+        # Referenced models are not evicted, even if the registry exceeds its bound
+        registry.acquire(('tokenizer', 'roberta-base'), lambda: load_model('tokenizer'), owner_3)
+        self.assertEqual(len(registry), 2)
+
+        # Models are evicted once all owners are gone
+        del owner_1, owner_2
+        gc.collect()
+        self.assertEqual(len(registry), 1)
+        self.assertNotIn(('auto_model', 'roberta-base', 'cpu'), registry)
+
+    def test_load_outside_of_registry_lock(self):
+        # Setup
+        registry = ModelRegistry(max_resident_models=2)
+        started_loading, finish_loading = threading.Event(), threading.Event()
+        loaded_models = []
+
+        def load_slow_model():
+            started_loading.set()
+            finish_loading.wait(10)
+            loaded_models.append('slow')
+            return {'name': 'slow'}
+
+        owners = [Owner() for _ in range(3)]
+        threads = [threading.Thread(target=registry.acquire, args=(('slow_model',), load_slow_model, owner))
+                   for owner in owners[:2]]
+        for thread in threads:
+            thread.start()
+        started_loading.wait(10)
+
+        # Test - Other models are loaded while the slow model is loading, the slow model is loaded once
+        self.assertEqual(registry.acquire(('fast_model',), lambda: {'name': 'fast'}, owners[2]), {'name': 'fast'})
+        self.assertNotIn(('slow_model',), registry)
+        finish_loading.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(loaded_models, ['slow'])
+        self.assertEqual(registry.reference_counts[('slow_model',)], 2)
@@ -0,0 +1,114 @@
+import time
+from unittest import TestCase, mock
+
+from src.strategy import run_strategy
+from src.strategy.run_strategy import schedule_work_units, initialize_pipeline
+
+
+def run_fake_experiment(number_of_work_units, index):
+    """Later work units finish first - Work unit 1 has no results"""
+    time.sleep(0.02 * (number_of_work_units - index))
+    if index == 1:
+        return None
+    return ['result {}.{}'.format(index, part) for part in range(2)]
+
+
+class RecordingResultSink:
+    def __init__(self):
+        self.written_results = []
+
+    def write_result(self, result, with_evidences=False):
+        self.written_results.append((result, with_evidences))
+
+
+class FakeAsyncResult:
+    def __init__(self, pool, results):
+        self.pool = pool
+        self.results = results
+
+    def get(self):
+        self.pool.in_flight -= 1
+        return self.results
+
+
+class FakePool:
+    """Run work units synchronously and record the maximal number of scheduled work units"""
+
+    def __init__(self, worker):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        FakePool.instance = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def apply_async(self, function, arguments):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return FakeAsyncResult(self, function(*arguments))
+
+
+class Test(TestCase):
+    def setUp(self):
+        self.work_units = [(5, index) for index in range(5)]
+        self.expected_results = ['result {}.{}'.format(index, part) for index in [0, 2, 3, 4] for part in range(2)]
+
+        patch = mock.patch('src.strategy.run_strategy.run_experiment_on_query_table', run_fake_experiment)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_schedule_work_units_without_worker(self):
+        # Setup
+        result_sink = RecordingResultSink()
+
+        # Test - Work units run in this process and their results are written in order
+        schedule_work_units(self.work_units, 0, 0, result_sink, True)
+        self.assertEqual(result_sink.written_results, [(result, True) for result in self.expected_results])
+
+    def test_schedule_work_units_with_pool(self):
+        # Setup
+        result_sink = RecordingResultSink()
+
+        # Test - Later work units finish first, but results are written in the order of the work units
+        schedule_work_units(self.work_units, 2, 2, result_sink)
+        self.assertEqual(result_sink.written_results, [(result, False) for result in self.expected_results])
+
+    def test_schedule_work_units_bounds_in_flight(self):
+        # Setup
+        result_sink = RecordingResultSink()
+
+        # Test - No more than max_in_flight work units are scheduled at the same time
+        with mock.patch('src.strategy.run_strategy.Pool', FakePool):
+            schedule_work_units(self.work_units, 2, 3, result_sink)
+
+        self.assertEqual(FakePool.instance.max_in_flight, 3)
+        self.assertEqual(FakePool.instance.in_flight, 0)
+        self.assertEqual([result for result, _ in result_sink.written_results], self.expected_results)
+
+    def test_initialize_pipeline(self):
+        # Setup
+        pipelines = [{'retrieval_strategy': 'BM25', 'similarity_re_ranking_strategy': 'cross_encoder',
+                      'source_re_ranking_strategy': None},
+                     {'retrieval_strategy': 'supcon', 'similarity_re_ranking_strategy': None,
+                      'source_re_ranking_strategy': None}]
+        self.addCleanup(run_strategy.pipeline_components.clear)
+
+        with mock.patch('src.strategy.run_strategy.select_retrieval_strategy',
+                        side_effect=lambda config, schema_org_class, clusters: config) as select_retrieval_strategy, \
+                mock.patch('src.strategy.run_strategy.select_similarity_re_ranker',
+                           side_effect=lambda config, schema_org_class, context_attributes: config), \
+                mock.patch('src.strategy.run_strategy.select_source_re_ranker',
+                           side_effect=lambda config, schema_org_class: config):
+            # Test 1 - The components of a pipeline are initialized once per process
+            components = initialize_pipeline(0, pipelines[0], 'localbusiness')
+            self.assertEqual(components, ('BM25', 'cross_encoder', None))
+            self.assertIs(initialize_pipeline(0, pipelines[0], 'localbusiness'), components)
+            self.assertEqual(select_retrieval_strategy.call_count, 1)
+
+            # Test 2 - Switching the pipeline drops the components of the previous pipeline
+            self.assertEqual(initialize_pipeline(1, pipelines[1], 'localbusiness'), ('supcon', None, None))
+            self.assertEqual(list(run_strategy.pipeline_components.keys()), [1])
+            self.assertEqual(select_retrieval_strategy.call_count, 2)
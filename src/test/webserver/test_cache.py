@@ -0,0 +1,24 @@
+from unittest import TestCase, mock
+
+from src.webserver.cache import TTLCache
+
+
+class TestTTLCache(TestCase):
+
+    def test_lru_and_ttl_eviction(self):
+        # Setup
+        cache = TTLCache(max_size=2, ttl=10)
+
+        with mock.patch('src.webserver.cache.time.time', return_value=100):
+            cache.put('a', 1)
+            cache.put('b', 2)
+            # Reading a makes b the least recently used value
+            self.assertEqual(cache.get('a'), 1)
+            cache.put('c', 3)
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('c'), 3)
+
+        # Values expire after ttl seconds
+        with mock.patch('src.webserver.cache.time.time', return_value=111):
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(len(cache), 1)
@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose values expire ttl seconds after they were stored"""
+
+    def __init__(self, max_size=1024, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.values:
+                return default
+
+            stored_at, value = self.values[key]
+            if time.time() - stored_at > self.ttl:
+                del self.values[key]
+                return default
+
+            self.values.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.values[key] = (time.time(), value)
+            self.values.move_to_end(key)
+            while len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop the value of the key - all values are dropped if no key is given"""
+        with self.lock:
+            if key is None:
+                self.values.clear()
+            else:
+                self.values.pop(key, None)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.values)
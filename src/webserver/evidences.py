@@ -1,49 +1,137 @@
+import logging
+import os
+import threading
 from datetime import datetime
 
+from src.model.querytable_new import find_query_table_path
 from src.strategy import run_strategy
+from src.webserver.cache import TTLCache
 
 
 def get_timestamp():
     return datetime.now().strftime(("%Y-%m-%d %H:%M:%S"))
 
 
-# Create a handler for our read (GET) querytables
-def findForEntity(query_table_id, entity_id, schema_org_class, strategy):
-    """
-    This function responds to a request for /api/evidence/findForEntity
-    with all found evidences for the requested entity
-
-    :return:        searched query table
-    """
-
-    # Data to serve with our API
-    #with open('mock-evidence.json') as gsFile:
-    #    EVIDENCES = json.load(gsFile)
-
-    # Search for query table
-    #return [evidence for evidence in EVIDENCES if evidence['queryTableId'] == query_table_id and evidence['entityId'] == entity_id]
+def determine_pipeline_configuration(strategy):
+    """Determine retrieval and re-ranking configurations of the strategy used by the annotation tool"""
     #model_name = 'finetuned_movie_t5-v1_1-small'
     #model_name = 'finetuned_sbert_bert-base-uncased_mean_{}_new'.format(schema_org_class)
     model_name = 'finetuned_sbert_bert-base-uncased_mean_localbusiness_weight_corner_cases_missing_values_2'
 
     pooling = 'mean'
     similarity = 'cos'
-    print(strategy)
     retrieval_str_conf = {'name': strategy, 'bi-encoder': 'huggingface_bi_encoder', 'model_name': model_name,
                           'pooling': pooling, 'similarity': similarity}
     reranking_str_conf = {'name': 'symbolic_re_ranker', 'similarity_measure': 'jaccard'}
 
-    evidences = run_strategy.run_strategy_to_retrieve_evidence(query_table_id, schema_org_class, 'retrieval',
-                                                               retrieval_str_conf, reranking_str_conf, None, entity_id=entity_id)
+    return retrieval_str_conf, reranking_str_conf, None
+
+
+class EvidenceService:
+    """Retrieve evidences of single entities for the annotation tool
+        - Retrieval pipelines stay initialized per (schema org class, strategy).
+        - Loaded query tables and evidences of recently requested entities are cached for ttl seconds.
+        - Requests are served on the request threads of the webserver."""
+
+    def __init__(self, cache_size=1024, ttl=600):
+        self.pipelines = {}
+        self.pipeline_locks = {}
+        self.lock = threading.Lock()
+        self.evidence_cache = TTLCache(cache_size, ttl)
+        self.query_table_cache = TTLCache(32, ttl)
+
+    def get_pipeline(self, schema_org_class, strategy):
+        key = (schema_org_class, strategy)
+        with self.lock:
+            if key not in self.pipeline_locks:
+                self.pipeline_locks[key] = threading.Lock()
+            pipeline_lock = self.pipeline_locks[key]
+
+        # Other pipelines stay available while the models of this pipeline are loaded
+        with pipeline_lock:
+            if key not in self.pipelines:
+                logging.getLogger().info('Initialize pipeline {} for {}'.format(strategy, schema_org_class))
+                self.pipelines[key] = run_strategy.initialize_pipeline_to_retrieve_evidence(
+                    schema_org_class, *determine_pipeline_configuration(strategy))
+
+        return self.pipelines[key], pipeline_lock
+
+    def warm_up(self, pipelines):
+        """Initialize pipelines before the first request
+            :param pipelines list of (schema org class, strategy)"""
+        for schema_org_class, strategy in pipelines:
+            self.get_pipeline(schema_org_class, strategy)
+
+    def get_query_table(self, query_table_id, schema_org_class):
+        """:return query table and its version (mtime of the file) or None, None if the query table is unknown"""
+        query_table_path = find_query_table_path('retrieval', query_table_id, schema_org_class)
+        if query_table_path is None:
+            return None, None
+
+        # Annotations change the file - a new version is loaded after an update
+        version = os.path.getmtime(query_table_path)
+        query_table = self.query_table_cache.get((query_table_path, version))
+        if query_table is None:
+            query_table = run_strategy.load_query_table_from_path_to_retrieve_evidence(query_table_path)
+            self.query_table_cache.put((query_table_path, version), query_table)
+
+        return query_table, version
 
-    for evidence in evidences:
-        evidence.aggregate_scores_to_similarity_score()
+    def find_evidences(self, query_table_id, entity_id, schema_org_class, strategy):
+        """:return encoded evidences of the entity or None if the query table is unknown"""
+        query_table, version = self.get_query_table(query_table_id, schema_org_class)
+        if query_table is None:
+            return None
 
-    evidences.sort(key=lambda evidence: evidence.similarity_score, reverse=True)
+        key = (query_table_id, version, entity_id, schema_org_class, strategy)
+        evidences = self.evidence_cache.get(key)
+        if evidences is None:
+            pipeline, pipeline_lock = self.get_pipeline(schema_org_class, strategy)
+            # Re-rankers keep caches that are not thread-safe - one request per pipeline at a time
+            with pipeline_lock:
+                evidences = run_strategy.retrieve_evidences_of_entity(query_table, pipeline, entity_id)
 
-    #return run_strategy.run_strategy_to_retrieve_evidence(query_table_id, entity_id, schema_org_class, 'elastic_by_entity_from_multiple_tables')
+            for evidence in evidences:
+                evidence.aggregate_scores_to_similarity_score()
 
-    # Encode evidences
-    evidences = [evidence.to_json(with_evidence_context=True, without_score=False) for evidence in evidences]
+            evidences.sort(key=lambda evidence: evidence.similarity_score, reverse=True)
+
+            # Encode evidences
+            evidences = [evidence.to_json(with_evidence_context=True, without_score=False) for evidence in evidences]
+            self.evidence_cache.put(key, evidences)
+
+        return evidences
+
+
+def determine_warm_pipelines():
+    """Pipelines that are initialized at startup - WARM_PIPELINES=schema_org_class:strategy,..."""
+    warm_pipelines = []
+    for pipeline in os.environ.get('WARM_PIPELINES', '').split(','):
+        if ':' in pipeline:
+            schema_org_class, strategy = pipeline.strip().split(':')
+            warm_pipelines.append((schema_org_class, strategy))
+
+    return warm_pipelines
+
+
+evidence_service = EvidenceService(int(os.environ.get('EVIDENCE_CACHE_SIZE', 1024)),
+                                   int(os.environ.get('EVIDENCE_CACHE_TTL', 600)))
+
+
+def warm_up_evidence_service():
+    evidence_service.warm_up(determine_warm_pipelines())
+
+
+# Create a handler for our read (GET) querytables
+def findForEntity(query_table_id, entity_id, schema_org_class, strategy):
+    """
+    This function responds to a request for /api/evidence/findForEntity
+    with all found evidences for the requested entity
+
+    :return:        searched query table
+    """
+    evidences = evidence_service.find_evidences(query_table_id, entity_id, schema_org_class, strategy)
+    if evidences is None:
+        return 'Query table {} not found'.format(query_table_id), 404
 
-    return evidences
\ No newline at end of file
+    return evidences
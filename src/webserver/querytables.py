@@ -2,7 +2,7 @@ import logging
 from datetime import datetime
 
 
-from src.model.querytable_new import load_query_tables, load_query_table, get_all_query_table_paths, \
+from src.model.querytable_new import load_query_tables, load_query_table, find_query_table_path, \
     load_query_table_from_file, get_schema_org_classes, RetrievalQueryTable, get_gt_tables
 
 
@@ -33,11 +33,11 @@ def get_query_table_by_id(query_table_id):
     """
     # Search for query table
     logger = logging.getLogger()
-    for query_table_path in get_all_query_table_paths('retrieval'):
-        if query_table_path.endswith('_{}.json'.format(query_table_id)):
-            logger.info('Found query table {}!'.format(query_table_id))
-            query_table = load_query_table_from_file(query_table_path)
-            return query_table.to_json(with_evidence_context=True)
+    query_table_path = find_query_table_path('retrieval', query_table_id)
+    if query_table_path is not None:
+        logger.info('Found query table {}!'.format(query_table_id))
+        query_table = load_query_table_from_file(query_table_path)
+        return query_table.to_json(with_evidence_context=True)
 
     return None
 
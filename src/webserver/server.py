@@ -1,9 +1,13 @@
 import logging
+import os
+import threading
 
 from flask import render_template
 import connexion
 from flask_cors import CORS, cross_origin
 
+import evidences
+
 # Create the application instance
 app = connexion.App(__name__, specification_dir='./')
 
@@ -29,4 +33,8 @@ if __name__ == '__main__':
     log_fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     logging.basicConfig(level=logging.INFO, format=log_fmt)
 
+    # Load the models of the configured pipelines once in the serving process - not in the reloader process
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        threading.Thread(target=evidences.warm_up_evidence_service, daemon=True).start()
+
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file